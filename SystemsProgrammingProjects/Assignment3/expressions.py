@@ -0,0 +1,248 @@
+#********************************************************************
+#*** NAME : Ihab Theeb                                             ***
+#*** CLASS : CSC 354                                               ***
+#*** ASSIGNMENT :  Assignment 3 - Expression Engine                ***
+#*** INSTRUCTOR : George Hamer                                     ***
+#********************************************************************
+#*** DESCRIPTION : Compiles assembler expressions made of symbols, ***
+#***               decimal constants (optionally written #n) and   ***
+#***               + - * / ( ) into a postfix program once, caches ***
+#***               it by expression text, and evaluates it against ***
+#***               a symbol lookup while tracking relocatability   ***
+#***               and external references.                        ***
+#********************************************************************
+
+import re
+
+TOKEN_PATTERN = re.compile(r'\s*(?:([A-Za-z_][A-Za-z0-9_]*)|#?(\d+)|([-+*/()]))')
+PRECEDENCE = {'+': 1, '-': 1, '*': 2, '/': 2, 'NEG': 3}
+
+compiled_cache = {}
+
+
+class ExpressionError(ValueError):
+    pass
+
+
+class CompiledExpression:
+    #********************************************************************
+    #*** FUNCTION : __init__                                           ***
+    #********************************************************************
+    #*** DESCRIPTION : Holds the postfix program of one expression and ***
+    #***               the set of symbols it references.               ***
+    #*** INPUT ARGS : text (str), program (tuple), symbols (frozenset) ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def __init__(self, text, program, symbols):
+        self.text = text
+        self.program = program
+        self.symbols = symbols
+
+    def __repr__(self):
+        return f"CompiledExpression({self.text!r})"
+
+
+class ExpressionValue:
+    #********************************************************************
+    #*** FUNCTION : __init__                                           ***
+    #********************************************************************
+    #*** DESCRIPTION : Result of evaluating a compiled expression. The ***
+    #***               reloc count is +1 for each relative term added  ***
+    #***               and -1 for each one subtracted.                 ***
+    #*** INPUT ARGS : value (int), reloc (int), externals (list)       ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def __init__(self, value, reloc, externals):
+        self.value = value
+        self.reloc = reloc
+        self.externals = externals
+
+    @property
+    def relative(self):
+        return self.reloc == 1
+
+    @property
+    def absolute(self):
+        return self.reloc == 0 and not self.externals
+
+
+#********************************************************************
+#*** FUNCTION : tokenize_expression                                ***
+#********************************************************************
+#*** DESCRIPTION : Splits an expression into symbol, number and    ***
+#***               operator tokens, rejecting any other character. ***
+#*** INPUT ARGS : text (str)                                       ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : list of (kind, value) tuples                         ***
+#********************************************************************
+def tokenize_expression(text):
+    tokens = []
+    pos = 0
+    end = len(text.rstrip())
+    while pos < end:
+        match = TOKEN_PATTERN.match(text, pos)
+        if not match:
+            raise ExpressionError(f"Invalid character '{text[pos:].strip()[:1]}' in expression '{text}'")
+        symbol, number, operator = match.groups()
+        if symbol is not None:
+            tokens.append(('SYM', symbol))
+        elif number is not None:
+            tokens.append(('NUM', int(number)))
+        else:
+            tokens.append(('OP', operator))
+        pos = match.end()
+    return tokens
+
+
+#********************************************************************
+#*** FUNCTION : compile_expression                                 ***
+#********************************************************************
+#*** DESCRIPTION : Converts an expression to a postfix program     ***
+#***               with the shunting-yard algorithm. Results are   ***
+#***               cached by expression text.                      ***
+#*** INPUT ARGS : text (str)                                       ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : CompiledExpression                                   ***
+#********************************************************************
+def compile_expression(text):
+    compiled = compiled_cache.get(text)
+    if compiled is not None:
+        return compiled
+
+    program = []
+    operators = []
+    symbols = set()
+    expect_operand = True
+
+    for kind, value in tokenize_expression(text):
+        if kind == 'SYM':
+            if not expect_operand:
+                raise ExpressionError(f"Missing operator before '{value}' in '{text}'")
+            program.append(('SYM', value))
+            symbols.add(value)
+            expect_operand = False
+        elif kind == 'NUM':
+            if not expect_operand:
+                raise ExpressionError(f"Missing operator before '{value}' in '{text}'")
+            program.append(('NUM', value))
+            expect_operand = False
+        elif value == '(':
+            if not expect_operand:
+                raise ExpressionError(f"Missing operator before '(' in '{text}'")
+            operators.append('(')
+        elif value == ')':
+            if expect_operand:
+                raise ExpressionError(f"Missing operand before ')' in '{text}'")
+            while operators and operators[-1] != '(':
+                program.append(('OP', operators.pop()))
+            if not operators:
+                raise ExpressionError(f"Unbalanced ')' in '{text}'")
+            operators.pop()
+        elif expect_operand:
+            if value == '-':
+                operators.append('NEG')
+            elif value != '+':
+                raise ExpressionError(f"Missing operand before '{value}' in '{text}'")
+        else:
+            while (operators and operators[-1] != '(' and
+                   PRECEDENCE[operators[-1]] >= PRECEDENCE[value]):
+                program.append(('OP', operators.pop()))
+            operators.append(value)
+            expect_operand = True
+
+    if expect_operand:
+        raise ExpressionError(f"Incomplete expression '{text}'")
+    while operators:
+        operator = operators.pop()
+        if operator == '(':
+            raise ExpressionError(f"Unbalanced '(' in '{text}'")
+        program.append(('OP', operator))
+
+    compiled = CompiledExpression(text, tuple(program), frozenset(symbols))
+    compiled_cache[text] = compiled
+    return compiled
+
+
+#********************************************************************
+#*** FUNCTION : evaluate_compiled                                  ***
+#********************************************************************
+#*** DESCRIPTION : Runs a postfix program. lookup(name) returns    ***
+#***               (value, relative, external) or None when the    ***
+#***               symbol is undefined. Relative and external      ***
+#***               terms may only be added or subtracted.          ***
+#*** INPUT ARGS : compiled (CompiledExpression), lookup (callable) ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : ExpressionValue                                      ***
+#********************************************************************
+def evaluate_compiled(compiled, lookup):
+    stack = []
+    for kind, value in compiled.program:
+        if kind == 'NUM':
+            stack.append((value, 0, ()))
+        elif kind == 'SYM':
+            info = lookup(value)
+            if info is None:
+                raise ExpressionError(f"Undefined symbol '{value}'")
+            sym_value, relative, external = info
+            if external:
+                stack.append((0, 0, ((value, '+'),)))
+            else:
+                stack.append((sym_value, 1 if relative else 0, ()))
+        elif value == 'NEG':
+            num, reloc, externals = stack.pop()
+            stack.append((-num, -reloc, flip_signs(externals)))
+        else:
+            right_num, right_reloc, right_ext = stack.pop()
+            left_num, left_reloc, left_ext = stack.pop()
+            if value == '+':
+                stack.append((left_num + right_num, left_reloc + right_reloc, left_ext + right_ext))
+            elif value == '-':
+                stack.append((left_num - right_num, left_reloc - right_reloc, left_ext + flip_signs(right_ext)))
+            else:
+                if left_reloc or right_reloc or left_ext or right_ext:
+                    raise ExpressionError(f"Relocatable term used with '{value}' in '{compiled.text}'")
+                if value == '*':
+                    stack.append((left_num * right_num, 0, ()))
+                else:
+                    if right_num == 0:
+                        raise ExpressionError(f"Division by zero in '{compiled.text}'")
+                    quotient = abs(left_num) // abs(right_num)
+                    if (left_num < 0) != (right_num < 0):
+                        quotient = -quotient
+                    stack.append((quotient, 0, ()))
+    num, reloc, externals = stack.pop()
+    return ExpressionValue(num, reloc, list(externals))
+
+
+#********************************************************************
+#*** FUNCTION : flip_signs                                         ***
+#********************************************************************
+#*** DESCRIPTION : Negates the sign of each external reference.    ***
+#*** INPUT ARGS : externals (tuple)                                ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : tuple                                                ***
+#********************************************************************
+def flip_signs(externals):
+    return tuple((sym, '-' if sign == '+' else '+') for sym, sign in externals)
+
+
+#********************************************************************
+#*** FUNCTION : evaluate                                           ***
+#********************************************************************
+#*** DESCRIPTION : Compiles (or fetches from cache) and evaluates  ***
+#***               an expression in one call.                      ***
+#*** INPUT ARGS : text (str), lookup (callable)                    ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : ExpressionValue                                      ***
+#********************************************************************
+def evaluate(text, lookup):
+    return evaluate_compiled(compile_expression(text), lookup)
@@ -0,0 +1,45 @@
+#********************************************************************
+#***  NAME       : Ihab Theeb                                      ***
+#***  CLASS      : CSC 354                                         ***
+#***  ASSIGNMENT : Assignment 3 - Source Line Parser               ***
+#***  INSTRUCTOR : George Hamer                                    ***
+#********************************************************************
+#***  DESCRIPTION : Splits a pass-1 source line into label, opcode, ***
+#***  operand and comment with one precompiled regex. Fields are   ***
+#***  positional: three fields are label/opcode/operand, two are   ***
+#***  label/opcode when the first ends in ':' and opcode/operand   ***
+#***  otherwise, one is an opcode. Comments start at '.'.          ***
+#********************************************************************
+
+import re
+from collections import namedtuple
+
+# code is the comment-free part of the line, as written to the intermediate file
+SourceLine = namedtuple('SourceLine', ['label', 'opcode', 'operand', 'comment', 'code'])
+
+LINE_PATTERN = re.compile(
+    r'\s*(?P<code>'
+    r'(?:(?P<label>[^\s.]*?):?\s+(?=[^\s.]+\s+[^\s.]+\s*(?:\.|$))'
+    r'|(?P<colon_label>[^\s.]*):\s+(?=[^\s.]+\s*(?:\.|$)))?'
+    r'(?P<opcode>[^\s.]+)?(?:\s+(?P<operand>[^\s.]+))?)'
+    r'\s*(?P<comment>\..*)?'
+)
+
+
+#********************************************************************
+#***  FUNCTION    : parse_line
+#********************************************************************
+#***  DESCRIPTION : Parses one source line with the precompiled line regex.
+#***  INPUT ARGS  : line - string: the raw source line
+#***  OUTPUT ARGS : None
+#***  RETURN      : SourceLine, or None if the line has more than three fields
+#********************************************************************
+def parse_line(line):
+    match = LINE_PATTERN.fullmatch(line.rstrip('\r\n'))
+    if match is None:
+        return None
+    label = match.group('label')
+    if label is None:
+        label = match.group('colon_label')
+    return SourceLine(label, match.group('opcode'), match.group('operand'),
+                      match.group('comment'), match.group('code'))
@@ -0,0 +1,148 @@
+#********************************************************************
+#*** NAME : Ihab Theeb                                             ***
+#*** CLASS : CSc 354                                               ***
+#*** ASSIGNMENT :  Assignment 4 - Library Interface                ***
+#*** INSTRUCTOR : George Hamer                                     ***
+#********************************************************************
+#*** DESCRIPTION : Importable entry point to the assembler. It runs***
+#***               both passes on source text held in memory and   ***
+#***               returns the object records, listing, tables and ***
+#***               diagnostics without reading or writing any      ***
+#***               file. The passes keep their state in main's     ***
+#***               module globals, so calls must not overlap in    ***
+#***               threads; use processes for concurrency.         ***
+#***                                                               ***
+#***   import assembler, opcode_loader                             ***
+#***   table = opcode_loader.load_opcode_table('opcodes')          ***
+#***   result = assembler.assemble(text, table)                    ***
+#***   print(result.object_text())                                 ***
+#********************************************************************
+
+import copy
+
+import main
+import opcode_loader
+
+
+class ControlSection:
+    #********************************************************************
+    #*** FUNCTION : __init__                                           ***
+    #********************************************************************
+    #*** DESCRIPTION : Name, placement and tables of one control       ***
+    #***               section (the whole program when there is no     ***
+    #***               CSECT).                                         ***
+    #*** INPUT ARGS : program_name (str), start_address (int),         ***
+    #***              program_length (int), symbol_table (dict),       ***
+    #***              literal_table (dict)                             ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def __init__(self, program_name, start_address, program_length, symbol_table, literal_table):
+        self.program_name = program_name
+        self.start_address = start_address
+        self.program_length = program_length
+        self.symbol_table = symbol_table
+        self.literal_table = literal_table
+
+    def __repr__(self):
+        return f"ControlSection({self.program_name!r}, {len(self.symbol_table)} symbols)"
+
+
+class AssemblyResult:
+    #********************************************************************
+    #*** FUNCTION : __init__                                           ***
+    #********************************************************************
+    #*** DESCRIPTION : Everything one assembly produced. The tables    ***
+    #***               are copies, so later assemblies cannot change   ***
+    #***               them. sections holds one ControlSection per     ***
+    #***               CSECT; program_name, start_address,             ***
+    #***               program_length and the two tables are those of  ***
+    #***               the first section.                              ***
+    #*** INPUT ARGS : object_records (list of str), listing_lines      ***
+    #***              (list of str), diagnostics (list of str),        ***
+    #***              records (list of LineRecord), sections (list of  ***
+    #***              ControlSection)                                  ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def __init__(self, object_records, listing_lines, diagnostics, records, sections):
+        self.object_records = object_records
+        self.listing_lines = listing_lines
+        self.diagnostics = diagnostics
+        self.records = records
+        self.sections = sections
+        first = sections[0]
+        self.symbol_table = first.symbol_table
+        self.literal_table = first.literal_table
+        self.program_name = first.program_name
+        self.start_address = first.start_address
+        self.program_length = first.program_length
+
+    @property
+    def ok(self):
+        return not self.diagnostics
+
+    def object_text(self):
+        return ''.join(record + '\n' for record in self.object_records)
+
+    def listing_text(self):
+        return ''.join(line + '\n' for line in self.listing_lines)
+
+    def __repr__(self):
+        return (f"AssemblyResult({self.program_name!r}, {len(self.records)} lines, "
+                f"{len(self.diagnostics)} diagnostics)")
+
+
+#********************************************************************
+#*** FUNCTION : assemble                                           ***
+#********************************************************************
+#*** DESCRIPTION : Assembles source text in memory. opcode_table   ***
+#***               is a table from opcode_loader.load_opcode_table ***
+#***               or the name of an opcodes file to load (cached  ***
+#***               after the first call). relax promotes format 3  ***
+#***               instructions to format 4 where needed, as with  ***
+#***               main.py --relax, for this call only. An error   ***
+#***               that stops the passes is returned as a          ***
+#***               diagnostic with no object records, and main's   ***
+#***               opcode table and relax mode are put back either ***
+#***               way.                                            ***
+#*** INPUT ARGS : source (str or iterable of str lines),           ***
+#***              opcode_table (mapping or str), relax (bool)      ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : AssemblyResult                                       ***
+#********************************************************************
+def assemble(source, opcode_table='opcodes', relax=False):
+    if isinstance(opcode_table, str):
+        opcode_table = opcode_loader.load_opcode_table(opcode_table)
+    if isinstance(source, str):
+        source = source.splitlines(keepends=True)
+
+    main.reset_assembler_state()
+    saved = (main.relax_mode, main.opcode_table, main.source_parser, main.encoder_table)
+    main.relax_mode = relax
+    try:
+        try:
+            main.use_opcode_table(opcode_table)
+            records = main.pass1_source(source, write_intermediates=False)
+            main.encode_records(records)
+            object_records = main.object_program_records()
+            listing_lines = main.listing_lines()
+        except Exception as error:
+            main.diagnostics.append(f"{type(error).__name__}: {error}")
+            object_records, listing_lines = [], []
+
+        return AssemblyResult(
+            object_records=object_records,
+            listing_lines=listing_lines,
+            diagnostics=list(main.diagnostics),
+            records=list(main.intermediate_lines),
+            sections=[ControlSection(state['program_name'], state['start_address'],
+                                     state['program_length'], copy.deepcopy(state['symbol_table']),
+                                     copy.deepcopy(state['literal_table']))
+                      for state in main.control_sections or [main.section_state()]],
+        )
+    finally:
+        main.relax_mode, main.opcode_table, main.source_parser, main.encoder_table = saved
@@ -0,0 +1,157 @@
+#********************************************************************
+#*** NAME : Ihab Theeb                                             ***
+#*** CLASS : CSc 354                                               ***
+#*** ASSIGNMENT :  Assignment 4 - Assembler Server Client          ***
+#*** INSTRUCTOR : George Hamer                                     ***
+#********************************************************************
+#*** DESCRIPTION : Thin client for assembler_server.py. It sends   ***
+#***               source files over the server's Unix socket and  ***
+#***               writes the returned .obj/.lst next to each      ***
+#***               source, like main.py. It imports nothing from   ***
+#***               the assembler, so a run costs only the Python   ***
+#***               start-up and one round trip.                    ***
+#***                                                               ***
+#***   Protocol: one JSON object per line each way.                ***
+#***     {"source": text, "relax": bool, "listing": bool}          ***
+#***       -> {"ok", "object", "listing", "diagnostics",           ***
+#***           "seconds"}                                          ***
+#***     {"command": "ping" | "stats" | "shutdown"}                ***
+#***   A failed request gets {"ok": false, "error": message}.      ***
+#***                                                               ***
+#***   python assembler_client.py prog1.asm prog2.asm              ***
+#********************************************************************
+
+import argparse
+import json
+import os
+import socket
+import sys
+
+DEFAULT_SOCKET = os.path.join(os.environ.get('XDG_RUNTIME_DIR') or '/tmp',
+                              f"sicxe-assembler-{os.getuid()}.sock")
+
+
+class AssemblerClient:
+    #********************************************************************
+    #*** FUNCTION : __init__                                           ***
+    #********************************************************************
+    #*** DESCRIPTION : Connects to a running server. One connection    ***
+    #***               can carry any number of requests.               ***
+    #*** INPUT ARGS : path (str socket path)                           ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def __init__(self, path=DEFAULT_SOCKET):
+        self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.connection.connect(path)
+        self.reader = self.connection.makefile('r', encoding='utf-8')
+
+    #********************************************************************
+    #*** FUNCTION : request                                            ***
+    #********************************************************************
+    #*** DESCRIPTION : Sends one request and waits for its response.   ***
+    #*** INPUT ARGS : message (dict)                                   ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : dict                                                 ***
+    #********************************************************************
+    def request(self, message):
+        self.connection.sendall(json.dumps(message).encode('utf-8') + b'\n')
+        reply = self.reader.readline()
+        if not reply:
+            raise ConnectionError("assembler server closed the connection")
+        return json.loads(reply)
+
+    def assemble(self, source, relax=False, listing=True):
+        return self.request({'source': source, 'relax': relax, 'listing': listing})
+
+    def close(self):
+        self.reader.close()
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+#********************************************************************
+#*** FUNCTION : write_outputs                                      ***
+#********************************************************************
+#*** DESCRIPTION : Writes a response's object program and listing  ***
+#***               beside the source file.                         ***
+#*** INPUT ARGS : source_filename (str), response (dict)           ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : list of filenames written                            ***
+#********************************************************************
+def write_outputs(source_filename, response):
+    written = []
+    for suffix, key in (('.lst', 'listing'), ('.obj', 'object')):
+        if response.get(key) is None:
+            continue
+        filename = source_filename.replace('.asm', suffix)
+        with open(filename, 'w') as file:
+            file.write(response[key])
+        written.append(filename)
+    return written
+
+
+#********************************************************************
+#*** FUNCTION : main                                               ***
+#********************************************************************
+#*** DESCRIPTION : Command line driver.                            ***
+#*** INPUT ARGS : None                                             ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : int exit status                                      ***
+#********************************************************************
+def main():
+    parser = argparse.ArgumentParser(description="Client for the SIC/XE assembler server")
+    parser.add_argument("sources", nargs="*", metavar="source", help="assembly source files")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET, help="server socket (default: %(default)s)")
+    parser.add_argument("--relax", action="store_true",
+                        help="promote out of reach format 3 instructions to format 4")
+    parser.add_argument("--no-listing", action="store_true", help="do not write the .lst file")
+    parser.add_argument("--stdout", action="store_true",
+                        help="print the object program instead of writing files")
+    command_group = parser.add_mutually_exclusive_group()
+    command_group.add_argument("--ping", action="store_true", help="check that the server is up")
+    command_group.add_argument("--stats", action="store_true", help="print the server's counters")
+    command_group.add_argument("--shutdown", action="store_true", help="stop the server")
+    args = parser.parse_args()
+
+    try:
+        client = AssemblerClient(args.socket)
+    except OSError as error:
+        print(f"ERROR: cannot reach the assembler server at {args.socket}: {error}", file=sys.stderr)
+        return 2
+
+    status = 0
+    with client:
+        for command in ('ping', 'stats', 'shutdown'):
+            if getattr(args, command):
+                print(json.dumps(client.request({'command': command}), indent=2))
+        for source_filename in args.sources:
+            with open(source_filename) as file:
+                response = client.assemble(file.read(), args.relax,
+                                           not (args.no_listing or args.stdout))
+            if 'error' in response:
+                print(f"ERROR: {source_filename}: {response['error']}", file=sys.stderr)
+                status = 1
+                continue
+            if args.stdout:
+                sys.stdout.write(response['object'])
+            else:
+                write_outputs(source_filename, response)
+            for message in response['diagnostics']:
+                print(f"ERROR: {source_filename}: {message}", file=sys.stderr)
+            if not response['ok']:
+                status = 1
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
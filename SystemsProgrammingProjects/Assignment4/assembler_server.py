@@ -0,0 +1,264 @@
+#********************************************************************
+#*** NAME : Ihab Theeb                                             ***
+#*** CLASS : CSc 354                                               ***
+#*** ASSIGNMENT :  Assignment 4 - Assembler Server                 ***
+#*** INSTRUCTOR : George Hamer                                     ***
+#********************************************************************
+#*** DESCRIPTION : Long-running assembler. It loads the opcode     ***
+#***               table and builds the encoders once, then        ***
+#***               assembles requests from a Unix socket (or from  ***
+#***               stdin with --stdio) with assembler.assemble.    ***
+#***               Every request starts from reset assembler state ***
+#***               and the state is cleared again after it, so     ***
+#***               nothing but the opcode table, the encoders and  ***
+#***               the operand/expression caches carries over.     ***
+#***               Each connection gets a thread, but assemblies   ***
+#***               run one at a time under a lock because the      ***
+#***               passes keep their state in main's globals. The  ***
+#***               protocol is described in assembler_client.py.   ***
+#***                                                               ***
+#***   python assembler_server.py [--socket PATH] &                ***
+#***   python assembler_client.py prog.asm                         ***
+#********************************************************************
+
+import argparse
+import json
+import os
+import signal
+import socketserver
+import sys
+import threading
+import time
+
+import assembler
+import assembler_client
+import encoders
+import expressions
+import main
+import opcode_loader
+
+# The operand and expression caches are keyed by text; past this many
+# entries they are cleared so a long-lived server does not grow
+TEXT_CACHE_LIMIT = 100000
+
+
+class AssemblerService:
+    #********************************************************************
+    #*** FUNCTION : __init__                                           ***
+    #********************************************************************
+    #*** DESCRIPTION : Loads the opcode table and builds its encoders. ***
+    #*** INPUT ARGS : opcode_filename (str)                            ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def __init__(self, opcode_filename):
+        self.opcode_table = opcode_loader.load_opcode_table(opcode_filename)
+        encoders.build_encoder_table(self.opcode_table)
+        self.started = time.time()
+        self.counters = {'requests': 0, 'failed': 0, 'lines': 0, 'busy_seconds': 0.0}
+        self.lock = threading.Lock()
+        self.stopping = False
+
+    #********************************************************************
+    #*** FUNCTION : handle                                             ***
+    #********************************************************************
+    #*** DESCRIPTION : Answers one decoded request. An exception in    ***
+    #***               the passes fails that request only.             ***
+    #*** INPUT ARGS : message (dict)                                   ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : dict response                                        ***
+    #********************************************************************
+    def handle(self, message):
+        if not isinstance(message, dict):
+            return {'ok': False, 'error': "request must be a JSON object"}
+        command = message.get('command')
+        if command == 'ping':
+            return {'ok': True, 'version': main.ASSEMBLER_VERSION}
+        if command == 'stats':
+            return dict(self.counters, ok=True, uptime_seconds=time.time() - self.started)
+        if command == 'shutdown':
+            self.stopping = True
+            return {'ok': True}
+        if command is not None:
+            return {'ok': False, 'error': f"unknown command {command!r}"}
+        if not isinstance(message.get('source'), str):
+            return {'ok': False, 'error': "request needs a 'source' string"}
+        return self.assemble(message['source'], bool(message.get('relax')),
+                             message.get('listing', True))
+
+    #********************************************************************
+    #*** FUNCTION : assemble                                           ***
+    #********************************************************************
+    #*** DESCRIPTION : Assembles one source with the warm tables,      ***
+    #***               one request at a time.                          ***
+    #*** INPUT ARGS : source (str), relax (bool), listing (bool)       ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : dict response                                        ***
+    #********************************************************************
+    def assemble(self, source, relax, listing):
+        with self.lock:
+            started = time.perf_counter()
+            self.counters['requests'] += 1
+            try:
+                result = assembler.assemble(source, self.opcode_table, relax=relax)
+                response = {
+                    'ok': result.ok,
+                    'object': result.object_text(),
+                    'listing': result.listing_text() if listing else None,
+                    'diagnostics': result.diagnostics,
+                }
+                self.counters['lines'] += len(result.records)
+            except Exception as error:
+                response = {'ok': False, 'error': f"{type(error).__name__}: {error}"}
+            finally:
+                main.reset_assembler_state()
+                trim_text_caches()
+            if not response['ok']:
+                self.counters['failed'] += 1
+            response['seconds'] = time.perf_counter() - started
+            self.counters['busy_seconds'] += response['seconds']
+        return response
+
+    #********************************************************************
+    #*** FUNCTION : serve_lines                                        ***
+    #********************************************************************
+    #*** DESCRIPTION : Answers newline-delimited JSON requests from a  ***
+    #***               text stream until it ends or a shutdown.        ***
+    #*** INPUT ARGS : reader (text stream), writer (text stream)       ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def serve_lines(self, reader, writer):
+        for line in reader:
+            if not line.strip():
+                continue
+            try:
+                response = self.handle(json.loads(line))
+            except json.JSONDecodeError as error:
+                response = {'ok': False, 'error': f"bad JSON: {error}"}
+            writer.write(json.dumps(response) + '\n')
+            writer.flush()
+            if self.stopping:
+                return
+
+
+#********************************************************************
+#*** FUNCTION : trim_text_caches                                   ***
+#********************************************************************
+#*** DESCRIPTION : Clears the text-keyed operand and expression    ***
+#***               caches once they pass TEXT_CACHE_LIMIT entries. ***
+#*** INPUT ARGS : None                                             ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : None                                                 ***
+#********************************************************************
+def trim_text_caches():
+    for cache in (encoders.operand_forms, encoders.register_pairs, expressions.compiled_cache):
+        if len(cache) > TEXT_CACHE_LIMIT:
+            cache.clear()
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    #********************************************************************
+    #*** FUNCTION : handle                                             ***
+    #********************************************************************
+    #*** DESCRIPTION : Serves one client connection.                   ***
+    #*** INPUT ARGS : None                                             ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def handle(self):
+        lines = (line.decode('utf-8') for line in self.rfile)
+        self.server.service.serve_lines(lines, TextWriter(self.wfile))
+
+
+class TextWriter:
+    #********************************************************************
+    #*** FUNCTION : __init__                                           ***
+    #********************************************************************
+    #*** DESCRIPTION : str writer over a socket's binary file.         ***
+    #*** INPUT ARGS : binary (binary file object)                      ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def __init__(self, binary):
+        self.binary = binary
+
+    def write(self, text):
+        self.binary.write(text.encode('utf-8'))
+
+    def flush(self):
+        self.binary.flush()
+
+
+#********************************************************************
+#*** FUNCTION : serve_socket                                       ***
+#********************************************************************
+#*** DESCRIPTION : Listens on a Unix socket until a shutdown       ***
+#***               request or SIGTERM/SIGINT, then removes it.     ***
+#*** INPUT ARGS : service (AssemblerService), path (str)           ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : None                                                 ***
+#********************************************************************
+def serve_socket(service, path):
+    if os.path.exists(path):
+        try:
+            assembler_client.AssemblerClient(path).close()
+        except OSError:
+            os.unlink(path)
+        else:
+            raise SystemExit(f"ERROR: an assembler server is already listening on {path}")
+
+    def stop(signum, frame):
+        service.stopping = True
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    server = socketserver.ThreadingUnixStreamServer(path, RequestHandler)
+    server.daemon_threads = True
+    server.service = service
+    server.timeout = 0.5
+    os.chmod(path, 0o600)
+    try:
+        while not service.stopping:
+            server.handle_request()
+    finally:
+        server.server_close()
+        os.unlink(path)
+
+
+#********************************************************************
+#*** FUNCTION : run                                                ***
+#********************************************************************
+#*** DESCRIPTION : Command line driver.                            ***
+#*** INPUT ARGS : None                                             ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : None                                                 ***
+#********************************************************************
+def run():
+    parser = argparse.ArgumentParser(description="Persistent SIC/XE assembler server")
+    parser.add_argument("--socket", default=assembler_client.DEFAULT_SOCKET,
+                        help="Unix socket to listen on (default: %(default)s)")
+    parser.add_argument("--stdio", action="store_true",
+                        help="read requests from stdin and answer on stdout instead")
+    parser.add_argument("--opcodes", default="opcodes", help="opcode file (default: %(default)s)")
+    args = parser.parse_args()
+
+    service = AssemblerService(args.opcodes)
+    if args.stdio:
+        service.serve_lines(sys.stdin, sys.stdout)
+    else:
+        print(f"Assembler server listening on {args.socket}", file=sys.stderr)
+        serve_socket(service, args.socket)
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,315 @@
+#********************************************************************
+#*** NAME : Ihab Theeb                                             ***
+#*** CLASS : CSc 354                                               ***
+#*** ASSIGNMENT :  Assignment 4 - Incremental Assembly Cache       ***
+#*** INSTRUCTOR : George Hamer                                     ***
+#********************************************************************
+#*** DESCRIPTION : On-disk cache of assembler outputs keyed by a   ***
+#***               SHA-256 of the source text, the opcodes file,   ***
+#***               the assembler version and the output options.   ***
+#***               Each entry is one pickle holding the output     ***
+#***               files and diagnostics. A hit touches the entry, ***
+#***               so evicting the oldest mtime first is LRU.      ***
+#***               Hit/miss/eviction counts are appended to        ***
+#***               stats.log, one line per event. Appends and the  ***
+#***               rewrite that compacts the log hold an exclusive ***
+#***               lock on stats.lock, so concurrent assemblers do ***
+#***               not lose an update (where fcntl is available).  ***
+#********************************************************************
+
+import hashlib
+import os
+import pickle
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+DEFAULT_CACHE_DIR = '.asmcache'
+DEFAULT_SIZE_LIMIT = 64 * 1024 * 1024
+ENTRY_SUFFIX = '.entry'
+STATS_FILENAME = 'stats.log'
+STATS_LOCK_FILENAME = 'stats.lock'
+STATS_COMPACT_SIZE = 64 * 1024
+
+
+class AssemblyCache:
+    #********************************************************************
+    #*** FUNCTION : __init__                                           ***
+    #********************************************************************
+    #*** DESCRIPTION : Opens (creating if needed) a cache directory.   ***
+    #*** INPUT ARGS : directory (str), size_limit (int bytes)          ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def __init__(self, directory=DEFAULT_CACHE_DIR, size_limit=DEFAULT_SIZE_LIMIT):
+        self.directory = directory
+        self.size_limit = size_limit
+        os.makedirs(directory, exist_ok=True)
+
+    #********************************************************************
+    #*** FUNCTION : make_key                                           ***
+    #********************************************************************
+    #*** DESCRIPTION : Hashes everything the outputs depend on.        ***
+    #*** INPUT ARGS : source_filename (str), opcode_filename (str),    ***
+    #***              version (str), options (tuple of str)            ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : str hex digest                                       ***
+    #********************************************************************
+    def make_key(self, source_filename, opcode_filename, version, options=()):
+        digest = hashlib.sha256()
+        for filename in (source_filename, opcode_filename):
+            with open(filename, 'rb') as file:
+                content = file.read()
+            digest.update(len(content).to_bytes(8, 'little'))
+            digest.update(content)
+        digest.update(version.encode())
+        for option in options:
+            digest.update(b'\0' + option.encode())
+        return digest.hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.directory, key + ENTRY_SUFFIX)
+
+    #********************************************************************
+    #*** FUNCTION : lookup                                             ***
+    #********************************************************************
+    #*** DESCRIPTION : Returns a cached entry and marks it as recently ***
+    #***               used; a missing or unreadable entry is a miss.  ***
+    #*** INPUT ARGS : key (str)                                        ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : dict {'files': {suffix: bytes}, 'diagnostics': list} ***
+    #***          or None                                              ***
+    #********************************************************************
+    def lookup(self, key):
+        path = self.entry_path(key)
+        try:
+            with open(path, 'rb') as file:
+                entry = pickle.load(file)
+            os.utime(path)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+            self.count('misses')
+            return None
+        self.count('hits')
+        return entry
+
+    #********************************************************************
+    #*** FUNCTION : store                                              ***
+    #********************************************************************
+    #*** DESCRIPTION : Saves the output files of one assembly, then    ***
+    #***               evicts old entries over the size limit.         ***
+    #*** INPUT ARGS : key (str), files (dict suffix -> filename),      ***
+    #***              diagnostics (list of str)                        ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def store(self, key, files, diagnostics):
+        contents = {}
+        for suffix, filename in files.items():
+            with open(filename, 'rb') as file:
+                contents[suffix] = file.read()
+        path = self.entry_path(key)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(temp_path, 'wb') as file:
+                pickle.dump({'files': contents, 'diagnostics': list(diagnostics)}, file,
+                            protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, path)
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+        self.evict()
+
+    #********************************************************************
+    #*** FUNCTION : restore                                            ***
+    #********************************************************************
+    #*** DESCRIPTION : Writes a cached entry's files back out.         ***
+    #*** INPUT ARGS : entry (dict), files (dict suffix -> filename)    ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : bool False if the entry lacks one of the files       ***
+    #********************************************************************
+    def restore(self, entry, files):
+        cached = entry.get('files', {})
+        if any(suffix not in cached for suffix in files):
+            return False
+        for suffix, filename in files.items():
+            with open(filename, 'wb') as file:
+                file.write(cached[suffix])
+        return True
+
+    #********************************************************************
+    #*** FUNCTION : entries                                            ***
+    #********************************************************************
+    #*** DESCRIPTION : Lists the entries, least recently used first.   ***
+    #*** INPUT ARGS : None                                             ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : list of (mtime, size, path)                          ***
+    #********************************************************************
+    def entries(self):
+        found = []
+        for name in os.listdir(self.directory):
+            if name.endswith(ENTRY_SUFFIX):
+                path = os.path.join(self.directory, name)
+                try:
+                    status = os.stat(path)
+                except OSError:
+                    continue
+                found.append((status.st_mtime_ns, status.st_size, path))
+        found.sort()
+        return found
+
+    #********************************************************************
+    #*** FUNCTION : evict                                              ***
+    #********************************************************************
+    #*** DESCRIPTION : Removes least recently used entries until the   ***
+    #***               cache fits in its size limit.                   ***
+    #*** INPUT ARGS : None                                             ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : int number of entries removed                        ***
+    #********************************************************************
+    def evict(self):
+        found = self.entries()
+        total = sum(size for _, size, _ in found)
+        removed = 0
+        for _, size, path in found:
+            if total <= self.size_limit:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        if removed:
+            self.count('evictions', removed)
+        return removed
+
+    #********************************************************************
+    #*** FUNCTION : read_stats                                         ***
+    #********************************************************************
+    #*** DESCRIPTION : Sums the counter lines of stats.log.            ***
+    #*** INPUT ARGS : None                                             ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : dict                                                 ***
+    #********************************************************************
+    def read_stats(self):
+        stats = {'hits': 0, 'misses': 0, 'evictions': 0}
+        try:
+            with open(os.path.join(self.directory, STATS_FILENAME), 'r') as file:
+                for line in file:
+                    parts = line.split()
+                    if len(parts) == 2 and parts[1].isdigit():
+                        stats[parts[0]] = stats.get(parts[0], 0) + int(parts[1])
+        except OSError:
+            pass
+        return stats
+
+    #********************************************************************
+    #*** FUNCTION : lock_stats                                         ***
+    #********************************************************************
+    #*** DESCRIPTION : Opens stats.lock and takes an exclusive lock on ***
+    #***               it. The lock file is never replaced, so unlike  ***
+    #***               a lock on stats.log itself it still guards the  ***
+    #***               log after compact_stats swaps in a new file.    ***
+    #*** INPUT ARGS : None                                             ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : int descriptor to pass to unlock_stats               ***
+    #********************************************************************
+    def lock_stats(self):
+        descriptor = os.open(os.path.join(self.directory, STATS_LOCK_FILENAME),
+                             os.O_RDWR | os.O_CREAT, 0o644)
+        if fcntl is not None:
+            try:
+                fcntl.flock(descriptor, fcntl.LOCK_EX)
+            except OSError:
+                os.close(descriptor)
+                raise
+        return descriptor
+
+    def unlock_stats(self, descriptor):
+        os.close(descriptor)
+
+    #********************************************************************
+    #*** FUNCTION : count                                              ***
+    #********************************************************************
+    #*** DESCRIPTION : Appends one counter event to stats.log under    ***
+    #***               the stats lock, and folds the log back into     ***
+    #***               totals once it grows past STATS_COMPACT_SIZE.   ***
+    #*** INPUT ARGS : name (str), amount (int)                         ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def count(self, name, amount=1):
+        path = os.path.join(self.directory, STATS_FILENAME)
+        try:
+            lock = self.lock_stats()
+        except OSError:
+            return
+        try:
+            descriptor = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(descriptor, f"{name} {amount}\n".encode())
+            finally:
+                os.close(descriptor)
+            if os.path.getsize(path) > STATS_COMPACT_SIZE:
+                self.compact_stats(locked=True)
+        except OSError:
+            pass
+        finally:
+            self.unlock_stats(lock)
+
+    #********************************************************************
+    #*** FUNCTION : compact_stats                                      ***
+    #********************************************************************
+    #*** DESCRIPTION : Rewrites stats.log as one line per counter. The ***
+    #***               read and the replace happen under the stats     ***
+    #***               lock, so no append falls between them.          ***
+    #*** INPUT ARGS : locked (bool caller already holds the lock)      ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def compact_stats(self, locked=False):
+        lock = None if locked else self.lock_stats()
+        try:
+            path = os.path.join(self.directory, STATS_FILENAME)
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            stats = self.read_stats()
+            with open(temp_path, 'w') as file:
+                for name, value in stats.items():
+                    file.write(f"{name} {value}\n")
+            os.replace(temp_path, path)
+        finally:
+            if lock is not None:
+                self.unlock_stats(lock)
+
+    #********************************************************************
+    #*** FUNCTION : summary                                            ***
+    #********************************************************************
+    #*** DESCRIPTION : Counters plus current entry count and size.     ***
+    #*** INPUT ARGS : None                                             ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : dict                                                 ***
+    #********************************************************************
+    def summary(self):
+        stats = self.read_stats()
+        found = self.entries()
+        stats['entries'] = len(found)
+        stats['bytes'] = sum(size for _, size, _ in found)
+        stats['limit'] = self.size_limit
+        return stats
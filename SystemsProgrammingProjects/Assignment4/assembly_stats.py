@@ -0,0 +1,134 @@
+#********************************************************************
+#*** NAME : Ihab Theeb                                             ***
+#*** CLASS : CSc 354                                               ***
+#*** ASSIGNMENT :  Assignment 4 - Phase Timing and Counters        ***
+#*** INSTRUCTOR : George Hamer                                     ***
+#********************************************************************
+#*** DESCRIPTION : Wall and CPU time per assembler phase plus      ***
+#***               named counters, printed as a table or JSON for  ***
+#***               --stats. Phases may nest (literal placement runs***
+#***               inside pass 1); a phase's own time excludes the ***
+#***               phases nested in it, so the rows add up to the  ***
+#***               total. CPU time includes finished worker        ***
+#***               processes. main only creates an AssemblyStats   ***
+#***               when --stats is given; otherwise every phase is ***
+#***               the shared NO_PHASE null context.               ***
+#********************************************************************
+
+import contextlib
+import json
+import resource
+import time
+
+NO_PHASE = contextlib.nullcontext()
+
+
+#********************************************************************
+#*** FUNCTION : cpu_time                                           ***
+#********************************************************************
+#*** DESCRIPTION : User + system time of this process and of its   ***
+#***               reaped children (pool workers).                 ***
+#*** INPUT ARGS : None                                             ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : float seconds                                        ***
+#********************************************************************
+def cpu_time():
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+class AssemblyStats:
+    #********************************************************************
+    #*** FUNCTION : __init__                                           ***
+    #********************************************************************
+    #*** DESCRIPTION : Empty phase table and counters.                 ***
+    #*** INPUT ARGS : None                                             ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def __init__(self):
+        self.phases = {}
+        self.counters = {}
+        self.nested = []
+
+    #********************************************************************
+    #*** FUNCTION : phase                                              ***
+    #********************************************************************
+    #*** DESCRIPTION : Context manager timing one phase. Time spent in ***
+    #***               phases nested inside it is charged to those     ***
+    #***               phases only. Repeated phases accumulate.        ***
+    #*** INPUT ARGS : name (str)                                       ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : context manager                                      ***
+    #********************************************************************
+    @contextlib.contextmanager
+    def phase(self, name):
+        inner = [0.0, 0.0]
+        self.nested.append(inner)
+        wall_start = time.perf_counter()
+        cpu_start = cpu_time()
+        try:
+            yield
+        finally:
+            wall = time.perf_counter() - wall_start
+            cpu = cpu_time() - cpu_start
+            self.nested.pop()
+            if self.nested:
+                self.nested[-1][0] += wall
+                self.nested[-1][1] += cpu
+            totals = self.phases.setdefault(name, [0.0, 0.0])
+            totals[0] += wall - inner[0]
+            totals[1] += cpu - inner[1]
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    #********************************************************************
+    #*** FUNCTION : as_dict                                            ***
+    #********************************************************************
+    #*** DESCRIPTION : Phases (in the order first run) and counters.   ***
+    #*** INPUT ARGS : None                                             ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : dict                                                 ***
+    #********************************************************************
+    def as_dict(self):
+        phases = [{'phase': name, 'wall_seconds': wall, 'cpu_seconds': cpu}
+                  for name, (wall, cpu) in self.phases.items()]
+        return {
+            'phases': phases,
+            'total_wall_seconds': sum(wall for wall, _ in self.phases.values()),
+            'total_cpu_seconds': sum(cpu for _, cpu in self.phases.values()),
+            'counters': dict(self.counters),
+        }
+
+    #********************************************************************
+    #*** FUNCTION : report                                             ***
+    #********************************************************************
+    #*** DESCRIPTION : Formats the statistics.                         ***
+    #*** INPUT ARGS : output_format (str 'text' or 'json')             ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : str                                                  ***
+    #********************************************************************
+    def report(self, output_format='text'):
+        data = self.as_dict()
+        if output_format == 'json':
+            return json.dumps(data, indent=2)
+
+        width = max([len('PHASE'), len('total')] + [len(name) for name in self.phases])
+        lines = [f"{'PHASE':<{width}}  {'WALL(ms)':>10} {'CPU(ms)':>10}"]
+        for row in data['phases']:
+            lines.append(f"{row['phase']:<{width}}  {row['wall_seconds'] * 1000:>10.3f} "
+                         f"{row['cpu_seconds'] * 1000:>10.3f}")
+        lines.append(f"{'total':<{width}}  {data['total_wall_seconds'] * 1000:>10.3f} "
+                     f"{data['total_cpu_seconds'] * 1000:>10.3f}")
+        if self.counters:
+            lines.append("")
+            width = max(len(name) for name in self.counters)
+            for name, value in self.counters.items():
+                lines.append(f"{name:<{width}}  {value:>10}")
+        return '\n'.join(lines)
@@ -0,0 +1,469 @@
+#********************************************************************
+#*** NAME : Ihab Theeb                                             ***
+#*** CLASS : CSc 354                                               ***
+#*** ASSIGNMENT :  Assignment 4 - Assembler Benchmark              ***
+#*** INSTRUCTOR : George Hamer                                     ***
+#********************************************************************
+#*** DESCRIPTION : Generates synthetic SIC/XE programs (formats 1  ***
+#***               to 4, literals with LTORG, EQU chains, EXTDEF/  ***
+#***               EXTREF, BASE) and times read_opcode_file, pass1,***
+#***               pass 2 encoding + listing and                   ***
+#***               write_object_program separately. Each size runs ***
+#***               in its own child process so the peak RSS it     ***
+#***               reports belongs to that size alone. Results are ***
+#***               written as JSON for regression tracking.        ***
+#***                                                               ***
+#***   python benchmark.py --sizes 1000 10000 100000 -o bench.json ***
+#***   python benchmark.py --generate 5000 big.asm                 ***
+#***                                                               ***
+#***               --latency instead compares cold main.py runs    ***
+#***               with requests to a warm assembler_server.py.    ***
+#***                                                               ***
+#***   python benchmark.py --latency --runs 20 -o latency.json     ***
+#***                                                               ***
+#***               --encode times only instruction encoding: pass  ***
+#***               1 runs once, then the encoders (built once with ***
+#***               the opcode table) encode every instruction      ***
+#***               --runs times, giving instructions per second.   ***
+#***                                                               ***
+#***   python benchmark.py --encode --sizes 100000 -o encode.json  ***
+#********************************************************************
+
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+OPCODE_FILE = os.path.join(SCRIPT_DIR, 'opcodes')
+DEFAULT_SIZES = [1000, 10000, 100000]
+LATENCY_SIZES = [20, 200, 2000]
+LATENCY_MODES = ['cold', 'client', 'request']
+PHASES = ['read_opcode_file', 'pass1', 'pass2', 'write_object_program']
+
+FORMAT1 = ['FIX', 'FLOAT', 'NORM', 'HIO', 'SIO', 'TIO']
+REGISTER_OPS = ['ADDR', 'SUBR', 'MULR', 'DIVR', 'COMPR', 'RMO']
+SINGLE_REGISTER_OPS = ['CLEAR', 'TIXR']
+SHIFT_OPS = ['SHIFTL', 'SHIFTR']
+REGISTERS = ['A', 'X', 'L', 'B', 'S', 'T', 'F']
+MEMORY_OPS = ['LDA', 'LDX', 'LDT', 'LDS', 'LDCH', 'STA', 'STX', 'STT', 'STCH',
+              'ADD', 'SUB', 'MUL', 'DIV', 'COMP', 'AND', 'OR', 'TIX']
+JUMP_OPS = ['J', 'JEQ', 'JGT', 'JLT', 'JSUB']
+LITERALS = ["=0CEOF", "=0X05", "=0X0A0B", "=C'HELLO'", "=X'F1'", "=0CABC", "=X'00FF'"]
+EXTERNALS = ['EXTA', 'EXTB', 'EXTC']
+BLOCK_LINES = 40
+BLOCKS_PER_POOL = 25
+
+
+#********************************************************************
+#*** FUNCTION : generate_block                                     ***
+#********************************************************************
+#*** DESCRIPTION : One routine: a label, a mix of instructions that***
+#***               stay within PC-relative reach of the routine's  ***
+#***               own labels and data, and the routine's data.    ***
+#*** INPUT ARGS : rng (Random), block (int), lines (int)           ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : list of str                                          ***
+#********************************************************************
+def generate_block(rng, block, lines):
+    prefix = f"B{block}"
+    data = [f"{prefix}W", f"{prefix}V", f"{prefix}C"]
+    labels = [f"{prefix}L0"]
+    out = [f"{labels[0]}:   CLEAR     X"]
+    body = max(1, lines - 5)
+    for i in range(1, body):
+        label = ''
+        if i % 8 == 0:
+            label = f"{prefix}L{i}:"
+            labels.append(label[:-1])
+        choice = rng.random()
+        if choice < 0.05:
+            statement = rng.choice(FORMAT1)
+        elif choice < 0.15:
+            statement = f"{rng.choice(REGISTER_OPS):<9} {rng.choice(REGISTERS)},{rng.choice(REGISTERS)}"
+        elif choice < 0.20:
+            statement = f"{rng.choice(SINGLE_REGISTER_OPS):<9} {rng.choice(REGISTERS)}"
+        elif choice < 0.23:
+            statement = f"{rng.choice(SHIFT_OPS):<9} {rng.choice(REGISTERS)},#{rng.randint(1, 15)}"
+        elif choice < 0.55:
+            operand = rng.choice(data)
+            form = rng.random()
+            if form < 0.15:
+                operand = '#' + operand
+            elif form < 0.25:
+                operand = '@' + operand
+            elif form < 0.40:
+                operand += ',X'
+            statement = f"{rng.choice(MEMORY_OPS):<9} {operand}"
+        elif choice < 0.65:
+            statement = f"{rng.choice(MEMORY_OPS):<9} #{rng.randint(0, 4095)}"
+        elif choice < 0.75:
+            statement = f"{rng.choice(JUMP_OPS):<9} {rng.choice(labels)}"
+        elif choice < 0.83:
+            statement = f"{rng.choice(['LDA', 'LDCH', 'COMP']):<9} {rng.choice(LITERALS)}"
+        elif choice < 0.90:
+            statement = f"+{rng.choice(MEMORY_OPS):<8} TABLE"
+        elif choice < 0.94:
+            statement = f"+JSUB     {rng.choice(EXTERNALS)}"
+        else:
+            statement = f"LDA       TABLE+{rng.randint(0, 1000) * 3}"
+        out.append(f"{label:<10}{statement}")
+    out.append(f"          J         {labels[0]}")
+    out.append(f"{data[0]:<9} WORD      {rng.randint(0, 999)}")
+    out.append(f"{data[1]:<9} WORD      {rng.choice(EXTERNALS)}+{rng.randint(0, 9)}")
+    out.append(f"{data[2]:<9} BYTE      0X{rng.randint(0, 255):02X}")
+    out.append(f"          RESW      #{rng.randint(1, 4)}")
+    return out
+
+
+#********************************************************************
+#*** FUNCTION : generate_source                                    ***
+#********************************************************************
+#*** DESCRIPTION : A program of about the requested line count:    ***
+#***               header with EXTDEF/EXTREF and a forward EQU     ***
+#***               chain, routines with an LTORG every few blocks, ***
+#***               and a BASE-addressed table at the end.          ***
+#*** INPUT ARGS : lines (int), seed (int)                          ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : str                                                  ***
+#********************************************************************
+def generate_source(lines, seed=354):
+    rng = random.Random(seed)
+    out = [
+        "BENCH:    START     #0",
+        "          EXTDEF    MAIN,TABLE",
+        f"          EXTREF    {','.join(EXTERNALS)}",
+        "TOTAL:    EQU       COUNT*WIDTH",
+        "COUNT:    EQU       WIDTH+#4",
+        "WIDTH:    EQU       #3",
+        "MAIN:     LDB       #TABLE",
+        "          BASE      TABLE",
+    ]
+    block = 0
+    while len(out) < lines - 4:
+        block_lines = min(BLOCK_LINES, lines - 4 - len(out))
+        out.extend(generate_block(rng, block, block_lines))
+        block += 1
+        if block % BLOCKS_PER_POOL == 0:
+            out.append("          LTORG")
+    out.append("TABLE:    RESW      #1200")
+    out.append("LIMIT:    EQU       TABLE+TOTAL")
+    out.append("          WORD      LIMIT")
+    out.append("          END       MAIN")
+    return '\n'.join(out) + '\n'
+
+
+#********************************************************************
+#*** FUNCTION : timed                                              ***
+#********************************************************************
+#*** DESCRIPTION : Calls a function and records its wall time.     ***
+#*** INPUT ARGS : phases (dict), name (str), function, *args       ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : phases (gets name -> seconds)                   ***
+#*** RETURN : the function's return value                          ***
+#********************************************************************
+def timed(phases, name, function, *args):
+    started = time.perf_counter()
+    result = function(*args)
+    phases[name] = time.perf_counter() - started
+    return result
+
+
+#********************************************************************
+#*** FUNCTION : run_size                                           ***
+#********************************************************************
+#*** DESCRIPTION : Generates and assembles one program in this     ***
+#***               process, with the intermediate kept in memory.  ***
+#*** INPUT ARGS : lines (int), seed (int), workdir (str)           ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : dict                                                 ***
+#********************************************************************
+def run_size(lines, seed, workdir):
+    sys.path.insert(0, SCRIPT_DIR)
+    import main
+
+    source_filename = os.path.join(workdir, f"bench{lines}.asm")
+    with open(source_filename, 'w') as file:
+        file.write(generate_source(lines, seed))
+    lst_filename = source_filename.replace('.asm', '.lst')
+    obj_filename = source_filename.replace('.asm', '.obj')
+
+    main.intermediate_format = "memory"
+    main.write_text_intermediate = False
+    main.reset_assembler_state()
+
+    phases = {}
+    timed(phases, 'read_opcode_file', main.read_opcode_file, OPCODE_FILE)
+    records = timed(phases, 'pass1', main.pass1, source_filename)
+
+    started = time.perf_counter()
+    main.encode_records(records)
+    with open(lst_filename, 'w') as lst_file:
+        for listing_line in main.listing_lines():
+            lst_file.write(listing_line + "\n")
+    phases['pass2'] = time.perf_counter() - started
+
+    timed(phases, 'write_object_program', main.write_object_program, obj_filename)
+
+    total = sum(phases.values())
+    source_lines = sum(1 for _ in open(source_filename))
+    return {
+        'lines': source_lines,
+        'statements': len(records),
+        'phases': phases,
+        'total_seconds': total,
+        'lines_per_second': source_lines / total if total else None,
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'diagnostics': len(main.diagnostics),
+    }
+
+
+#********************************************************************
+#*** FUNCTION : run_suite                                          ***
+#********************************************************************
+#*** DESCRIPTION : Runs every size in a fresh child process and    ***
+#***               prints one summary line per size.               ***
+#*** INPUT ARGS : sizes (list of int), seed (int)                  ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : dict report                                          ***
+#********************************************************************
+def run_suite(sizes, seed):
+    sys.path.insert(0, SCRIPT_DIR)
+    import main
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for lines in sizes:
+            child = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--child', str(lines),
+                 '--seed', str(seed), '--workdir', workdir],
+                check=True, capture_output=True, text=True)
+            result = json.loads(child.stdout)
+            results.append(result)
+            timings = ' '.join(f"{name}={result['phases'][name]:.3f}s" for name in PHASES)
+            print(f"{result['lines']:>8} lines  {result['lines_per_second']:>10.0f} lines/s  "
+                  f"peak {result['peak_rss_kb'] / 1024:7.1f} MB  {timings}")
+    return {
+        'assembler_version': main.ASSEMBLER_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'results': results,
+    }
+
+
+#********************************************************************
+#*** FUNCTION : latency_summary                                    ***
+#********************************************************************
+#*** DESCRIPTION : Median, 95th percentile and minimum of a list   ***
+#***               of times, in milliseconds.                      ***
+#*** INPUT ARGS : samples (list of float seconds)                  ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : dict                                                 ***
+#********************************************************************
+def latency_summary(samples):
+    ordered = sorted(samples)
+    return {
+        'median_ms': statistics.median(ordered) * 1000,
+        'p95_ms': ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        'min_ms': ordered[0] * 1000,
+    }
+
+
+#********************************************************************
+#*** FUNCTION : run_latency                                        ***
+#********************************************************************
+#*** DESCRIPTION : Times each size three ways: a cold main.py      ***
+#***               process, an assembler_client.py process talking ***
+#***               to a warm server, and a request sent from this  ***
+#***               process over an open connection (the server's   ***
+#***               own cost plus the round trip).                  ***
+#*** INPUT ARGS : sizes (list of int), seed (int), runs (int)      ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : dict report                                          ***
+#********************************************************************
+def run_latency(sizes, seed, runs):
+    sys.path.insert(0, SCRIPT_DIR)
+    import assembler_client
+    import main
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        # main.py reads ./opcodes
+        shutil.copy(OPCODE_FILE, workdir)
+        socket_path = os.path.join(workdir, 'server.sock')
+        server = subprocess.Popen(
+            [sys.executable, os.path.join(SCRIPT_DIR, 'assembler_server.py'),
+             '--socket', socket_path, '--opcodes', OPCODE_FILE],
+            stderr=subprocess.DEVNULL)
+        try:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    client = assembler_client.AssemblerClient(socket_path)
+                    break
+                except OSError:
+                    if time.monotonic() > deadline or server.poll() is not None:
+                        raise RuntimeError("assembler server did not start")
+                    time.sleep(0.05)
+
+            commands = {
+                'cold': [sys.executable, os.path.join(SCRIPT_DIR, 'main.py'), '--no-cache',
+                         '--no-echo', '--int-format', 'memory'],
+                'client': [sys.executable, os.path.join(SCRIPT_DIR, 'assembler_client.py'),
+                           '--socket', socket_path],
+            }
+            with client:
+                for lines in sizes:
+                    source_filename = os.path.join(workdir, f"latency{lines}.asm")
+                    source = generate_source(lines, seed)
+                    with open(source_filename, 'w') as file:
+                        file.write(source)
+                    samples = {mode: [] for mode in LATENCY_MODES}
+                    for _ in range(runs):
+                        for mode, command in commands.items():
+                            started = time.perf_counter()
+                            subprocess.run(command + [source_filename], cwd=workdir, check=True,
+                                           stdout=subprocess.DEVNULL)
+                            samples[mode].append(time.perf_counter() - started)
+                        started = time.perf_counter()
+                        client.assemble(source)
+                        samples['request'].append(time.perf_counter() - started)
+                    result = {'lines': lines, 'runs': runs}
+                    result.update({mode: latency_summary(samples[mode]) for mode in LATENCY_MODES})
+                    results.append(result)
+                    print(f"{lines:>8} lines  " + '  '.join(
+                        f"{mode} {result[mode]['median_ms']:8.1f} ms" for mode in LATENCY_MODES))
+                client.request({'command': 'shutdown'})
+            server.wait(timeout=30)
+        finally:
+            if server.poll() is None:
+                server.terminate()
+                server.wait()
+    return {
+        'assembler_version': main.ASSEMBLER_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'latency': results,
+    }
+
+
+#********************************************************************
+#*** FUNCTION : run_encode                                         ***
+#********************************************************************
+#*** DESCRIPTION : Encode-only timing. For each size the generated ***
+#***               program goes through pass 1 in memory, then the ***
+#***               instruction statements are encoded with         ***
+#***               encode_chunk (the pass 2 unit the --jobs        ***
+#***               workers run) runs times. The best run gives     ***
+#***               instructions per second.                        ***
+#*** INPUT ARGS : sizes (list of int), seed (int), runs (int)      ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : dict report                                          ***
+#********************************************************************
+def run_encode(sizes, seed, runs):
+    sys.path.insert(0, SCRIPT_DIR)
+    import main
+
+    main.read_opcode_file(OPCODE_FILE)
+    results = []
+    for lines in sizes:
+        main.reset_assembler_state()
+        records = main.pass1_source(generate_source(lines, seed).splitlines(keepends=True),
+                                    write_intermediates=False)
+        main.base_register = main.base_address()
+        statements = [(record.opcode, record.operand, record.loc_ctr) for record in records
+                      if record.opcode and record.opcode.lstrip('+') in main.opcode_table]
+        samples = []
+        for _ in range(runs):
+            started = time.perf_counter()
+            main.encode_chunk(statements)
+            samples.append(time.perf_counter() - started)
+        best = min(samples)
+        result = {
+            'lines': lines,
+            'instructions': len(statements),
+            'best_seconds': best,
+            'median_seconds': statistics.median(samples),
+            'instructions_per_second': len(statements) / best if best else None,
+        }
+        results.append(result)
+        print(f"{lines:>8} lines  {len(statements):>8} instructions  "
+              f"{result['instructions_per_second']:>12.0f} instructions/s  "
+              f"(best {best * 1000:.2f} ms, median {result['median_seconds'] * 1000:.2f} ms)")
+    return {
+        'assembler_version': main.ASSEMBLER_VERSION,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'runs': runs,
+        'results': results,
+    }
+
+
+#********************************************************************
+#*** FUNCTION : main                                               ***
+#********************************************************************
+#*** DESCRIPTION : Command line driver.                            ***
+#*** INPUT ARGS : None                                             ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : None                                                 ***
+#********************************************************************
+def main():
+    parser = argparse.ArgumentParser(description="SIC/XE assembler benchmark")
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        help=f"source sizes in lines (default: {DEFAULT_SIZES}, "
+                             f"{LATENCY_SIZES} with --latency)")
+    parser.add_argument('--seed', type=int, default=354, help="generator seed")
+    parser.add_argument('-o', '--output', default='benchmark.json', help="JSON report file")
+    parser.add_argument('--generate', nargs=2, metavar=('LINES', 'FILE'),
+                        help="only write a generated source of LINES lines to FILE")
+    parser.add_argument('--latency', action='store_true',
+                        help="compare cold runs with requests to a warm assembler server")
+    parser.add_argument('--encode', action='store_true',
+                        help="time instruction encoding only (instructions per second)")
+    parser.add_argument('--runs', type=int, default=20,
+                        help="runs per size and mode for --latency and per size for --encode "
+                             "(default: %(default)s)")
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.generate:
+        with open(args.generate[1], 'w') as file:
+            file.write(generate_source(int(args.generate[0]), args.seed))
+        return
+    if args.child is not None:
+        print(json.dumps(run_size(args.child, args.seed, args.workdir)))
+        return
+
+    if args.latency:
+        report = run_latency(args.sizes or LATENCY_SIZES, args.seed, args.runs)
+    elif args.encode:
+        report = run_encode(args.sizes or DEFAULT_SIZES, args.seed, args.runs)
+    else:
+        report = run_suite(args.sizes or DEFAULT_SIZES, args.seed)
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
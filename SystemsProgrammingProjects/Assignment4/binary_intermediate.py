@@ -0,0 +1,324 @@
+#********************************************************************
+#*** NAME : Ihab Theeb                                             ***
+#*** CLASS : CSc 354                                               ***
+#*** ASSIGNMENT :  Assignment 4 - Binary Intermediate File         ***
+#*** INSTRUCTOR : George Hamer                                     ***
+#********************************************************************
+#*** DESCRIPTION : Compact binary alternative to test1.int. The    ***
+#***               file holds a fixed header, one length-prefixed  ***
+#***               record per source line and an indexed trailer   ***
+#***               with the symbol and literal tables. It is read  ***
+#***               through mmap so pass 2 never re-splits text.    ***
+#***                                                               ***
+#***   header  : magic 'SXI1', version, record count, start        ***
+#***             address, program length, trailer offset           ***
+#***   record  : u32 length, u32 line, u32 locctr, u32 size,       ***
+#***             u16 opcode id, then label, opcode, operand,       ***
+#***             source as u16-length prefixed UTF-8 strings       ***
+#***   trailer : symbol count, literal count, u32 offset index     ***
+#***             (symbols sorted by name, then literals), entries  ***
+#********************************************************************
+
+import mmap
+import struct
+
+MAGIC = b'SXI1'
+VERSION = 2
+HEADER = struct.Struct('<4sHHIIIQ')
+RECORD_LENGTH = struct.Struct('<I')
+RECORD_FIXED = struct.Struct('<IIIH')
+STRING_LENGTH = struct.Struct('<H')
+TRAILER_COUNTS = struct.Struct('<II')
+INDEX_ENTRY = struct.Struct('<I')
+SYMBOL_FIXED = struct.Struct('<iB')
+LITERAL_FIXED = struct.Struct('<Hi')
+
+NO_OPCODE = 0xFFFF
+DIRECTIVE_BASE = 0x100
+NO_ADDRESS = -1
+
+SYMBOL_RELATIVE = 0x01
+SYMBOL_EXTERNAL = 0x02
+SYMBOL_EXTDEF = 0x04
+SYMBOL_REFERENCED = 0x08
+
+
+#********************************************************************
+#*** FUNCTION : build_opcode_ids                                   ***
+#********************************************************************
+#*** DESCRIPTION : Maps each mnemonic to a small integer id: its    ***
+#***               index in the opcode table, or DIRECTIVE_BASE     ***
+#***               plus its index for directives.                  ***
+#*** INPUT ARGS : mnemonics (iterable), directives (list)          ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : dict                                                 ***
+#********************************************************************
+def build_opcode_ids(mnemonics, directives):
+    ids = {name: index for index, name in enumerate(mnemonics)}
+    for index, name in enumerate(directives):
+        ids[name] = DIRECTIVE_BASE + index
+    return ids
+
+
+#********************************************************************
+#*** FUNCTION : opcode_id                                          ***
+#********************************************************************
+#*** DESCRIPTION : Looks up the id of an opcode field, ignoring a   ***
+#***               format 4 '+' prefix.                            ***
+#*** INPUT ARGS : opcode (str or None), ids (dict)                 ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : int                                                  ***
+#********************************************************************
+def opcode_id(opcode, ids):
+    if not opcode:
+        return NO_OPCODE
+    return ids.get(opcode[1:] if opcode.startswith('+') else opcode, NO_OPCODE)
+
+
+#********************************************************************
+#*** FUNCTION : pack_string                                        ***
+#********************************************************************
+#*** DESCRIPTION : Encodes an optional string with a u16 length.   ***
+#*** INPUT ARGS : text (str or None)                               ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : bytes                                                ***
+#********************************************************************
+def pack_string(text):
+    data = (text or '').encode('utf-8')
+    return STRING_LENGTH.pack(len(data)) + data
+
+
+#********************************************************************
+#*** FUNCTION : unpack_string                                      ***
+#********************************************************************
+#*** DESCRIPTION : Decodes a u16 length-prefixed string. An empty   ***
+#***               string comes back as None.                      ***
+#*** INPUT ARGS : buffer (bytes-like), offset (int)                ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : (str or None, int next offset)                       ***
+#********************************************************************
+def unpack_string(buffer, offset):
+    (length,) = STRING_LENGTH.unpack_from(buffer, offset)
+    offset += STRING_LENGTH.size
+    text = bytes(buffer[offset:offset + length]).decode('utf-8')
+    return (text or None), offset + length
+
+
+#********************************************************************
+#*** FUNCTION : write_binary_intermediate                          ***
+#********************************************************************
+#*** DESCRIPTION : Writes the pass 1 records and tables as a binary ***
+#***               intermediate file.                              ***
+#*** INPUT ARGS : filename (str), records (list of LineRecord),    ***
+#***              symbol_table (dict), literal_table (dict),       ***
+#***              start_address (int), program_length (int),       ***
+#***              mnemonics (iterable), directives (list)          ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : None                                                 ***
+#********************************************************************
+def write_binary_intermediate(filename, records, symbol_table, literal_table,
+                              start_address, program_length, mnemonics, directives):
+    ids = build_opcode_ids(mnemonics, directives)
+    body = bytearray()
+    for record in records:
+        payload = (RECORD_FIXED.pack(record.line_no, record.loc_ctr, record.size,
+                                     opcode_id(record.opcode, ids)) +
+                   pack_string(record.label) + pack_string(record.opcode) +
+                   pack_string(record.operand) + pack_string(record.source))
+        body += RECORD_LENGTH.pack(len(payload))
+        body += payload
+
+    entries = []
+    for name in sorted(symbol_table):
+        info = symbol_table[name]
+        flags = ((SYMBOL_RELATIVE if info.get('relative') else 0) |
+                 (SYMBOL_EXTERNAL if info.get('external') else 0) |
+                 (SYMBOL_EXTDEF if info.get('extdef') else 0) |
+                 (SYMBOL_REFERENCED if info.get('referenced') else 0))
+        address = NO_ADDRESS if info['address'] is None else info['address']
+        entries.append(pack_string(name) + SYMBOL_FIXED.pack(address, flags))
+    for name, info in literal_table.items():
+        address = NO_ADDRESS if info['address'] is None else info['address']
+        entries.append(pack_string(name) + pack_string(info['operand_value']) +
+                       LITERAL_FIXED.pack(info['length'], address))
+
+    trailer_offset = HEADER.size + len(body)
+    index_start = trailer_offset + TRAILER_COUNTS.size + INDEX_ENTRY.size * len(entries)
+    trailer = bytearray(TRAILER_COUNTS.pack(len(symbol_table), len(literal_table)))
+    offset = index_start
+    for entry in entries:
+        trailer += INDEX_ENTRY.pack(offset)
+        offset += len(entry)
+    for entry in entries:
+        trailer += entry
+
+    header = HEADER.pack(MAGIC, VERSION, 0, len(records), start_address,
+                         program_length, trailer_offset)
+    with open(filename, 'wb') as file:
+        file.write(header)
+        file.write(body)
+        file.write(trailer)
+
+
+class BinaryIntermediateReader:
+    #********************************************************************
+    #*** FUNCTION : __init__                                           ***
+    #********************************************************************
+    #*** DESCRIPTION : Maps a binary intermediate file into memory and ***
+    #***               validates its header.                           ***
+    #*** INPUT ARGS : filename (str)                                   ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def __init__(self, filename):
+        self.file = open(filename, 'rb')
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, _, self.record_count, self.start_address,
+         self.program_length, self.trailer_offset) = HEADER.unpack_from(self.buffer, 0)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"'{filename}' is not a binary intermediate file")
+        self.symbol_count, self.literal_count = TRAILER_COUNTS.unpack_from(self.buffer, self.trailer_offset)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    #********************************************************************
+    #*** FUNCTION : close                                              ***
+    #********************************************************************
+    #*** DESCRIPTION : Releases the memory map and the file handle.    ***
+    #*** INPUT ARGS : None                                             ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def close(self):
+        self.buffer.close()
+        self.file.close()
+
+    #********************************************************************
+    #*** FUNCTION : records                                            ***
+    #********************************************************************
+    #*** DESCRIPTION : Yields each line record in source order.        ***
+    #*** INPUT ARGS : None                                             ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : iterator of (line, locctr, size, opcode id, label,   ***
+    #***          opcode, operand, source) tuples                      ***
+    #********************************************************************
+    def records(self):
+        offset = HEADER.size
+        for _ in range(self.record_count):
+            (length,) = RECORD_LENGTH.unpack_from(self.buffer, offset)
+            offset += RECORD_LENGTH.size
+            end = offset + length
+            line_no, loc_ctr, size, op_id = RECORD_FIXED.unpack_from(self.buffer, offset)
+            position = offset + RECORD_FIXED.size
+            label, position = unpack_string(self.buffer, position)
+            opcode, position = unpack_string(self.buffer, position)
+            operand, position = unpack_string(self.buffer, position)
+            source, position = unpack_string(self.buffer, position)
+            yield line_no, loc_ctr, size, op_id, label, opcode, operand, source
+            offset = end
+
+    #********************************************************************
+    #*** FUNCTION : entry_offset                                       ***
+    #********************************************************************
+    #*** DESCRIPTION : Returns the file offset of trailer entry i.     ***
+    #*** INPUT ARGS : index (int)                                      ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : int                                                  ***
+    #********************************************************************
+    def entry_offset(self, index):
+        position = self.trailer_offset + TRAILER_COUNTS.size + INDEX_ENTRY.size * index
+        return INDEX_ENTRY.unpack_from(self.buffer, position)[0]
+
+    #********************************************************************
+    #*** FUNCTION : symbol_at                                          ***
+    #********************************************************************
+    #*** DESCRIPTION : Decodes symbol entry i of the trailer.          ***
+    #*** INPUT ARGS : index (int)                                      ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : (str name, dict info)                                ***
+    #********************************************************************
+    def symbol_at(self, index):
+        name, position = unpack_string(self.buffer, self.entry_offset(index))
+        address, flags = SYMBOL_FIXED.unpack_from(self.buffer, position)
+        info = {
+            'address': None if address == NO_ADDRESS else address,
+            'relative': bool(flags & SYMBOL_RELATIVE)
+        }
+        if flags & SYMBOL_EXTERNAL:
+            info['external'] = True
+        if flags & SYMBOL_EXTDEF:
+            info['extdef'] = True
+        if flags & SYMBOL_REFERENCED:
+            info['referenced'] = True
+        return name, info
+
+    #********************************************************************
+    #*** FUNCTION : find_symbol                                        ***
+    #********************************************************************
+    #*** DESCRIPTION : Binary-searches the sorted symbol index.        ***
+    #*** INPUT ARGS : name (str)                                       ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : dict info or None                                    ***
+    #********************************************************************
+    def find_symbol(self, name):
+        low, high = 0, self.symbol_count - 1
+        while low <= high:
+            middle = (low + high) // 2
+            entry_name, info = self.symbol_at(middle)
+            if entry_name == name:
+                return info
+            if entry_name < name:
+                low = middle + 1
+            else:
+                high = middle - 1
+        return None
+
+    #********************************************************************
+    #*** FUNCTION : symbols                                            ***
+    #********************************************************************
+    #*** DESCRIPTION : Rebuilds the whole symbol table as a dict.      ***
+    #*** INPUT ARGS : None                                             ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : dict                                                 ***
+    #********************************************************************
+    def symbols(self):
+        return dict(self.symbol_at(i) for i in range(self.symbol_count))
+
+    #********************************************************************
+    #*** FUNCTION : literals                                           ***
+    #********************************************************************
+    #*** DESCRIPTION : Rebuilds the literal table as a dict.           ***
+    #*** INPUT ARGS : None                                             ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : dict                                                 ***
+    #********************************************************************
+    def literals(self):
+        table = {}
+        for i in range(self.symbol_count, self.symbol_count + self.literal_count):
+            name, position = unpack_string(self.buffer, self.entry_offset(i))
+            operand_value, position = unpack_string(self.buffer, position)
+            length, address = LITERAL_FIXED.unpack_from(self.buffer, position)
+            table[name] = {
+                'operand_value': operand_value or '',
+                'length': length,
+                'address': None if address == NO_ADDRESS else address
+            }
+        return table
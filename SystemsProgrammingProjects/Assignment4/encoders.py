@@ -0,0 +1,291 @@
+#********************************************************************
+#*** NAME : Ihab Theeb                                             ***
+#*** CLASS : CSc 354                                               ***
+#*** ASSIGNMENT :  Assignment 4 - Instruction Encoders             ***
+#*** INSTRUCTOR : George Hamer                                     ***
+#********************************************************************
+#*** DESCRIPTION : Builds one specialized encoder per mnemonic and ***
+#***               format when the opcode table is loaded. Each    ***
+#***               encoder has the opcode bits folded in, takes    ***
+#***               the operand, LOCCTR, a target resolver and the  ***
+#***               base register, and returns the instruction as   ***
+#***               an int (None if it cannot be encoded). Operand  ***
+#***               addressing forms are parsed once per operand    ***
+#***               text and cached.                                ***
+#********************************************************************
+
+from collections import namedtuple
+from types import MappingProxyType
+
+REGISTER_NUMBERS = {'A': 0, 'X': 1, 'L': 2, 'B': 3, 'S': 4, 'T': 5, 'F': 6, 'PC': 8, 'SW': 9}
+
+N_I_SIMPLE = 3
+N_I_INDIRECT = 2
+N_I_IMMEDIATE = 1
+X_BIT = 0x8
+B_BIT = 0x4
+P_BIT = 0x2
+E_BIT = 0x1
+
+# size is the instruction length in bytes; encode(operand, loc_ctr,
+# resolve, base) returns the instruction as an int or None
+Encoder = namedtuple('Encoder', ['mnemonic', 'format', 'size', 'encode'])
+
+# ni: addressing bits, x: indexed, target: operand text to resolve,
+# number: target as a decimal constant, immediate: value of a '#n'
+# operand (both None when they do not apply)
+OperandForm = namedtuple('OperandForm', ['ni', 'x', 'target', 'number', 'immediate'])
+
+NO_OPERAND = OperandForm(N_I_SIMPLE, 0, None, 0, None)
+
+operand_forms = {}
+register_pairs = {}
+encoder_tables = {}
+
+
+#********************************************************************
+#*** FUNCTION : parse_operand                                      ***
+#********************************************************************
+#*** DESCRIPTION : Splits a format 3/4 operand into its addressing ***
+#***               bits and target, caching the result by text.    ***
+#*** INPUT ARGS : operand (str or None)                            ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : OperandForm                                          ***
+#********************************************************************
+def parse_operand(operand):
+    if not operand:
+        return NO_OPERAND
+    form = operand_forms.get(operand)
+    if form is not None:
+        return form
+
+    if operand.startswith('#'):
+        ni = N_I_IMMEDIATE
+        target = operand[1:]
+    elif operand.startswith('@'):
+        ni = N_I_INDIRECT
+        target = operand[1:]
+    else:
+        ni = N_I_SIMPLE
+        target = operand
+    x = 0
+    if ',X' in target.upper():
+        x = 1
+        target = target.replace(',X', '').replace(',x', '')
+    target = target.strip()
+
+    number = int(target) if target.isdigit() else None
+    immediate = int(operand[1:]) if ni == N_I_IMMEDIATE and operand[1:].isdigit() else None
+    form = OperandForm(ni, x, target, number, immediate)
+    operand_forms[operand] = form
+    return form
+
+
+#********************************************************************
+#*** FUNCTION : register_value                                     ***
+#********************************************************************
+#*** DESCRIPTION : Number of a register name, or the value of a    ***
+#***               '#n' constant (SHIFTL/SVC style operands).      ***
+#*** INPUT ARGS : text (str)                                       ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : int                                                  ***
+#********************************************************************
+def register_value(text):
+    if text.startswith('#') and text[1:].isdigit():
+        return int(text[1:])
+    return REGISTER_NUMBERS.get(text.strip().upper(), 0)
+
+
+#********************************************************************
+#*** FUNCTION : parse_registers                                    ***
+#********************************************************************
+#*** DESCRIPTION : Splits a format 2 operand into the r1/r2 byte,  ***
+#***               caching the result by text.                     ***
+#*** INPUT ARGS : operand (str)                                    ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : int or None for a malformed operand                  ***
+#********************************************************************
+def parse_registers(operand):
+    pair = register_pairs.get(operand)
+    if pair is not None or operand in register_pairs:
+        return pair
+    operands = operand.replace(' ', '').split(',')
+    if len(operands) == 1:
+        pair = (register_value(operands[0]) & 0xF) << 4
+    elif len(operands) == 2:
+        first = REGISTER_NUMBERS.get(operands[0].upper(), 0)
+        pair = ((first & 0xF) << 4) | (register_value(operands[1]) & 0xF)
+    else:
+        pair = None
+    register_pairs[operand] = pair
+    return pair
+
+
+#********************************************************************
+#*** FUNCTION : make_format1_encoder                               ***
+#********************************************************************
+#*** DESCRIPTION : Format 1 is the opcode byte alone.              ***
+#*** INPUT ARGS : opcode (int)                                     ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : function                                             ***
+#********************************************************************
+def make_format1_encoder(opcode):
+    def encode(operand, loc_ctr, resolve, base):
+        return opcode
+    return encode
+
+
+#********************************************************************
+#*** FUNCTION : make_format2_encoder                               ***
+#********************************************************************
+#*** DESCRIPTION : Format 2 is the opcode byte and two registers.  ***
+#*** INPUT ARGS : opcode (int)                                     ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : function                                             ***
+#********************************************************************
+def make_format2_encoder(opcode):
+    high = opcode << 8
+
+    def encode(operand, loc_ctr, resolve, base):
+        if operand is None:
+            return None
+        pair = parse_registers(operand)
+        if pair is None:
+            return None
+        return high | pair
+    return encode
+
+
+#********************************************************************
+#*** FUNCTION : make_format3_encoder                               ***
+#********************************************************************
+#*** DESCRIPTION : Format 3 tries PC-relative, then base-relative, ***
+#***               then the low 12 bits of the address.            ***
+#*** INPUT ARGS : opcode (int)                                     ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : function                                             ***
+#********************************************************************
+def make_format3_encoder(opcode):
+    high = (opcode & 0xFC) << 16
+
+    def encode(operand, loc_ctr, resolve, base):
+        form = parse_operand(operand)
+        address = form.number
+        if address is None:
+            address = resolve(form.target, loc_ctr)
+            if address is None:
+                return None
+        next_loc = loc_ctr + 3
+        flags = form.x * X_BIT
+
+        if form.immediate is not None:
+            displacement = form.immediate - next_loc
+            if -2048 <= displacement <= 2047:
+                flags |= P_BIT
+                disp = displacement & 0xFFF
+            else:
+                disp = form.immediate & 0xFFF
+        else:
+            displacement = address - next_loc
+            if -2048 <= displacement <= 2047:
+                flags |= P_BIT
+                disp = displacement & 0xFFF
+            elif base is not None and 0 <= address - base <= 4095:
+                flags |= B_BIT
+                disp = address - base
+            else:
+                disp = address & 0xFFF
+        return high | (form.ni << 16) | (flags << 12) | disp
+    return encode
+
+
+#********************************************************************
+#*** FUNCTION : format3_reaches                                    ***
+#********************************************************************
+#*** DESCRIPTION : True if the format 3 encoder can encode the     ***
+#***               operand exactly: PC-relative, base-relative, or ***
+#***               a direct address / '#n' constant of 0 to 4095.  ***
+#***               Otherwise it would keep only the low 12 bits.   ***
+#***               A relative target is never direct: the field    ***
+#***               would get no M record and break on relocation.  ***
+#*** INPUT ARGS : form (OperandForm), address (int), loc_ctr (int),***
+#***              base (int or None), relative (bool) target       ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : bool                                                 ***
+#********************************************************************
+def format3_reaches(form, address, loc_ctr, base, relative=False):
+    if form.immediate is not None:
+        address = form.immediate
+        relative = False
+    elif base is not None and 0 <= address - base <= 4095:
+        return True
+    if -2048 <= address - (loc_ctr + 3) <= 2047:
+        return True
+    return not relative and 0 <= address <= 0xFFF
+
+
+#********************************************************************
+#*** FUNCTION : make_format4_encoder                               ***
+#********************************************************************
+#*** DESCRIPTION : Format 4 carries a 20-bit absolute address.     ***
+#*** INPUT ARGS : opcode (int)                                     ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : function                                             ***
+#********************************************************************
+def make_format4_encoder(opcode):
+    high = (opcode & 0xFC) << 24
+
+    def encode(operand, loc_ctr, resolve, base):
+        form = parse_operand(operand)
+        address = form.number
+        if address is None:
+            address = resolve(form.target, loc_ctr)
+            if address is None:
+                return None
+        flags = form.x * X_BIT | E_BIT
+        return high | (form.ni << 24) | (flags << 20) | (address & 0xFFFFF)
+    return encode
+
+
+ENCODER_FACTORIES = {
+    1: make_format1_encoder,
+    2: make_format2_encoder,
+    3: make_format3_encoder,
+    4: make_format4_encoder,
+}
+
+
+#********************************************************************
+#*** FUNCTION : build_encoder_table                                ***
+#********************************************************************
+#*** DESCRIPTION : Builds (mnemonic, format) -> Encoder for every  ***
+#***               entry of an opcode table. Any mnemonic may be   ***
+#***               written with '+', so each also gets a format 4  ***
+#***               encoder. Tables are built once per opcode table.***
+#*** INPUT ARGS : opcode_table (mapping of mnemonic -> OpcodeInfo) ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : MappingProxyType of (mnemonic, format) -> Encoder    ***
+#********************************************************************
+def build_encoder_table(opcode_table):
+    cached = encoder_tables.get(id(opcode_table))
+    if cached is not None and cached[0] is opcode_table:
+        return cached[1]
+
+    table = {}
+    for mnemonic, info in opcode_table.items():
+        for fmt in {info.format, 4}:
+            factory = ENCODER_FACTORIES.get(fmt)
+            if factory is not None:
+                table[(mnemonic, fmt)] = Encoder(mnemonic, fmt, fmt, factory(info.opcode))
+    table = MappingProxyType(table)
+    encoder_tables[id(opcode_table)] = (opcode_table, table)
+    return table
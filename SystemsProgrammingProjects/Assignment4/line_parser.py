@@ -0,0 +1,124 @@
+#********************************************************************
+#*** NAME : Ihab Theeb                                             ***
+#*** CLASS : CSc 354                                               ***
+#*** ASSIGNMENT :  Assignment 4 - Source Line Parser               ***
+#*** INSTRUCTOR : George Hamer                                     ***
+#********************************************************************
+#*** DESCRIPTION : Splits a SIC/XE source line into label, opcode, ***
+#***               operand and comment with one precompiled regex. ***
+#***               A first field is a label if it ends in ':' or   ***
+#***               is a valid symbol that is not a mnemonic or     ***
+#***               directive (checked case-insensitively inside    ***
+#***               the regex). Comments start at '.' or ';'.       ***
+#********************************************************************
+
+import re
+from collections import namedtuple
+
+# code is the comment-free part of the line, as written to test1.int
+SourceLine = namedtuple('SourceLine', ['label', 'opcode', 'operand', 'comment', 'code'])
+
+BLANK_LINE = SourceLine(None, None, None, None, '')
+
+parser_cache = {}
+
+
+class LineRecord:
+    __slots__ = ('line_no', 'loc_ctr', 'label', 'opcode', 'operand', 'source',
+                 'size', 'object_code')
+
+    #********************************************************************
+    #*** FUNCTION : __init__                                           ***
+    #********************************************************************
+    #*** DESCRIPTION : One parsed statement. Pass 1 creates it and     ***
+    #***               fills in the size; pass 2 fills in the object   ***
+    #***               code; the listing and object writers read it.   ***
+    #***               The source line is never split again.           ***
+    #*** INPUT ARGS : line_no (int), loc_ctr (int), label (str),       ***
+    #***              opcode (str), operand (str), source (str),       ***
+    #***              size (int)                                       ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def __init__(self, line_no, loc_ctr, label, opcode, operand, source, size=0):
+        self.line_no = line_no
+        self.loc_ctr = loc_ctr
+        self.label = label
+        self.opcode = opcode
+        self.operand = operand
+        self.source = source
+        self.size = size
+        self.object_code = b''
+
+    def __repr__(self):
+        return f"LineRecord({self.line_no}, {self.loc_ctr:04X}, {self.source!r})"
+
+
+class LineParser:
+    #********************************************************************
+    #*** FUNCTION : __init__                                           ***
+    #********************************************************************
+    #*** DESCRIPTION : Compiles the line regex for a set of reserved   ***
+    #***               words (mnemonics and directives).               ***
+    #*** INPUT ARGS : reserved (iterable of str)                       ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def __init__(self, reserved):
+        words = '|'.join(re.escape(word) for word in sorted(set(reserved), key=len, reverse=True))
+        not_reserved = rf'(?!(?i:{words})(?=[\s.;]|$))' if words else ''
+        self.pattern = re.compile(
+            r'\s*(?P<code>'
+            r'(?:(?P<colon_label>[^\s.;]*?):(?=[\s.;]|$)'
+            rf'|{not_reserved}(?P<label>[A-Za-z_][A-Za-z0-9_]*)(?=[\s.;]|$))?'
+            r'\s*(?P<opcode>[^\s.;]+)?'
+            r'\s*(?P<operand>[^.;]*?))'
+            r'\s*(?P<comment>[.;].*)?'
+        )
+
+    #********************************************************************
+    #*** FUNCTION : parse                                              ***
+    #********************************************************************
+    #*** DESCRIPTION : Parses one source line. Blank and comment-only  ***
+    #***               lines come back with no label and no opcode.    ***
+    #*** INPUT ARGS : line (str)                                       ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : SourceLine                                           ***
+    #********************************************************************
+    def parse(self, line):
+        match = self.pattern.fullmatch(line.rstrip('\r\n'))
+        if match is None:
+            return BLANK_LINE
+        label = match.group('colon_label')
+        if label is None:
+            label = match.group('label')
+        operand = match.group('operand')
+        if operand:
+            if ' ' in operand or '\t' in operand:
+                operand = ' '.join(operand.split())
+        else:
+            operand = None
+        return SourceLine(label, match.group('opcode'), operand,
+                          match.group('comment'), match.group('code').rstrip())
+
+
+#********************************************************************
+#*** FUNCTION : get_line_parser                                    ***
+#********************************************************************
+#*** DESCRIPTION : Returns a parser for the given reserved words,  ***
+#***               compiling its regex only the first time.        ***
+#*** INPUT ARGS : mnemonics (iterable), directives (iterable)      ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : LineParser                                           ***
+#********************************************************************
+def get_line_parser(mnemonics, directives):
+    key = frozenset(mnemonics) | frozenset(directives)
+    parser = parser_cache.get(key)
+    if parser is None:
+        parser = LineParser(key)
+        parser_cache[key] = parser
+    return parser
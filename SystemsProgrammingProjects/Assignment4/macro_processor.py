@@ -0,0 +1,269 @@
+#********************************************************************
+#*** NAME : Ihab Theeb                                             ***
+#*** CLASS : CSc 354                                               ***
+#*** ASSIGNMENT :  Assignment 4 - Macro Processor                  ***
+#*** INSTRUCTOR : George Hamer                                     ***
+#********************************************************************
+#*** DESCRIPTION : Expands MACRO/MEND definitions in front of pass ***
+#***               1. expand() is a generator over source lines:   ***
+#***               definitions are taken out, each invocation is   ***
+#***               replaced by the macro body with its &parameters ***
+#***               substituted, and every other line passes through***
+#***               unchanged. Labels written $NAME in a body become***
+#***               _M<n>_NAME, unique to each expansion. The       ***
+#***               substituted body is memoized per macro by its   ***
+#***               argument tuple, so only the local labels are    ***
+#***               renamed for a repeated call. Expanded lines go  ***
+#***               through the processor again, so a body may call ***
+#***               or define other macros. Every line keeps the    ***
+#***               number of the source line it came from (the     ***
+#***               call's, for an expansion), so the intermediate  ***
+#***               file and errors refer to the source as written. ***
+#***                                                               ***
+#***   RDBUFF  MACRO  &INDEV,&BUFADR                               ***
+#***   $LOOP   TD     =X'&INDEV'                                   ***
+#***           JEQ    $LOOP                                        ***
+#***           STCH   &BUFADR                                      ***
+#***           MEND                                                ***
+#***           RDBUFF F1,BUFFER                                    ***
+#********************************************************************
+
+import re
+
+import line_parser
+
+MACRO_DIRECTIVES = ('MACRO', 'MEND')
+MAX_EXPANSION_DEPTH = 50
+
+PARAMETER = re.compile(r'&([A-Za-z_][A-Za-z0-9_]*)')
+LOCAL_LABEL = re.compile(r'\s*\$([A-Za-z_][A-Za-z0-9_]*)')
+
+
+class Macro:
+    #********************************************************************
+    #*** FUNCTION : __init__                                           ***
+    #********************************************************************
+    #*** DESCRIPTION : One macro definition. local_pattern matches the ***
+    #***               $labels the body defines (None if there are     ***
+    #***               none); expansions memoizes the substituted body ***
+    #***               by argument tuple.                              ***
+    #*** INPUT ARGS : name (str), parameters (list of str '&NAME'),    ***
+    #***              body (list of str source lines)                  ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def __init__(self, name, parameters, body):
+        self.name = name
+        self.parameters = parameters
+        self.body = body
+        local_labels = sorted({match.group(1) for match in map(LOCAL_LABEL.match, body) if match},
+                              key=len, reverse=True)
+        self.local_pattern = None
+        if local_labels:
+            names = '|'.join(map(re.escape, local_labels))
+            self.local_pattern = re.compile(rf'\$({names})(?![A-Za-z0-9_])')
+        self.expansions = {}
+
+    def __repr__(self):
+        return f"Macro({self.name!r}, {self.parameters}, {len(self.body)} lines)"
+
+
+class MacroProcessor:
+    #********************************************************************
+    #*** FUNCTION : __init__                                           ***
+    #********************************************************************
+    #*** DESCRIPTION : Processor for one source. Errors are appended   ***
+    #***               to diagnostics.                                 ***
+    #*** INPUT ARGS : mnemonics (iterable of str), directives          ***
+    #***              (iterable of str), diagnostics (list)            ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def __init__(self, mnemonics, directives, diagnostics):
+        self.mnemonics = mnemonics
+        self.directives = tuple(directives) + MACRO_DIRECTIVES
+        self.diagnostics = diagnostics
+        self.macros = {}
+        self.expansion_count = 0
+        self.cache_hits = 0
+        self.update_keywords()
+
+    #********************************************************************
+    #*** FUNCTION : update_keywords                                    ***
+    #********************************************************************
+    #*** DESCRIPTION : Rebuilds the line parser (macro names are       ***
+    #***               reserved words, so an invocation parses as an   ***
+    #***               opcode) and the quick search that picks out the ***
+    #***               only lines worth parsing here. Like the pass 1  ***
+    #***               directives, MACRO, MEND and macro names are     ***
+    #***               case-sensitive.                                 ***
+    #*** INPUT ARGS : None                                             ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def update_keywords(self):
+        self.parser = line_parser.get_line_parser(self.mnemonics,
+                                                  self.directives + tuple(self.macros))
+        words = sorted(set(MACRO_DIRECTIVES) | set(self.macros), key=len, reverse=True)
+        self.keyword_search = re.compile(rf"(?:{'|'.join(map(re.escape, words))})(?=[\s.;]|$)").search
+
+    #********************************************************************
+    #*** FUNCTION : expand                                             ***
+    #********************************************************************
+    #*** DESCRIPTION : Source lines with the macros expanded, each     ***
+    #***               with its source line number. Top-level lines    ***
+    #***               are numbered from 1; the lines of an expansion  ***
+    #***               all carry the number of the call.               ***
+    #*** INPUT ARGS : lines (iterable of str), depth (int) nesting of  ***
+    #***              the expansion the lines come from, line_no (int  ***
+    #***              or None) number of the call being expanded       ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : generator of (int, str)                              ***
+    #********************************************************************
+    def expand(self, lines, depth=0, line_no=None):
+        definition = None
+        defined_at = None
+        nesting = 0
+        if line_no is None:
+            numbered = enumerate(lines, 1)
+        else:
+            numbered = ((line_no, line) for line in lines)
+        for number, line in numbered:
+            if not self.keyword_search(line):
+                if definition is None:
+                    yield number, line
+                else:
+                    definition[2].append(line)
+                continue
+            parsed = self.parser.parse(line)
+            opcode = parsed.opcode
+            operand = parsed.operand
+            if opcode in self.macros and operand and operand.split(None, 1)[0] == 'MACRO':
+                # redefinition: the name now parses as an opcode
+                parsed = parsed._replace(label=opcode)
+                opcode, _, operand = operand.partition(' ')
+                operand = operand or None
+
+            if definition is not None:
+                if opcode == 'MACRO':
+                    nesting += 1
+                elif opcode == 'MEND':
+                    nesting -= 1
+                    if nesting == 0:
+                        self.define(*definition)
+                        definition = None
+                        continue
+                definition[2].append(line)
+            elif opcode == 'MACRO':
+                definition = (parsed.label, operand, [])
+                defined_at = number
+                nesting = 1
+            elif opcode == 'MEND':
+                self.diagnostics.append(f"MEND without MACRO (line {number})")
+            elif opcode in self.macros:
+                if depth >= MAX_EXPANSION_DEPTH:
+                    self.diagnostics.append(f"MACRO {opcode}: expansion nested deeper than "
+                                            f"{MAX_EXPANSION_DEPTH} (line {number})")
+                    continue
+                if parsed.label:
+                    yield number, f"{parsed.label}: EQU *\n"
+                body = self.invoke(self.macros[opcode], operand, number)
+                if body:
+                    yield from self.expand(body, depth + 1, number)
+            else:
+                yield number, line
+
+        if definition is not None:
+            self.diagnostics.append(f"MACRO {definition[0]}: no MEND before the end of the source "
+                                    f"(line {defined_at})")
+
+    #********************************************************************
+    #*** FUNCTION : define                                             ***
+    #********************************************************************
+    #*** DESCRIPTION : Enters a finished definition in the macro table.***
+    #*** INPUT ARGS : name (str), prototype (str or None) '&A,&B...',  ***
+    #***              body (list of str)                               ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def define(self, name, prototype, body):
+        if not name:
+            self.diagnostics.append("MACRO without a name")
+            return
+        if not re.fullmatch(r'[A-Za-z_][A-Za-z0-9_]*', name):
+            self.diagnostics.append(f"MACRO {name}: invalid macro name")
+            return
+        parameters = split_arguments(prototype) if prototype else []
+        bad = [parameter for parameter in parameters if not PARAMETER.fullmatch(parameter)]
+        if bad:
+            self.diagnostics.append(f"MACRO {name}: invalid parameter(s) {', '.join(bad)}")
+            return
+        known = name in self.macros
+        self.macros[name] = Macro(name, parameters, body)
+        if not known:
+            self.update_keywords()
+
+    #********************************************************************
+    #*** FUNCTION : invoke                                             ***
+    #********************************************************************
+    #*** DESCRIPTION : Body of one invocation: the memoized substituted***
+    #***               lines, with the $labels renamed for this        ***
+    #***               expansion. Missing arguments are empty.         ***
+    #*** INPUT ARGS : macro (Macro), operand (str or None), line_no    ***
+    #***              (int) of the call, for errors                    ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : list of str, or None after an error                  ***
+    #********************************************************************
+    def invoke(self, macro, operand, line_no):
+        arguments = tuple(split_arguments(operand)) if operand else ()
+        self.expansion_count += 1
+        lines = macro.expansions.get(arguments)
+        if lines is None:
+            if len(arguments) > len(macro.parameters):
+                self.diagnostics.append(f"MACRO {macro.name}: {len(arguments)} arguments given, "
+                                        f"{len(macro.parameters)} expected (line {line_no})")
+                return None
+            values = dict.fromkeys(macro.parameters, '')
+            values.update(zip(macro.parameters, arguments))
+            lines = [PARAMETER.sub(lambda match: values.get(match.group(0), match.group(0)), line)
+                     for line in macro.body]
+            macro.expansions[arguments] = lines
+        else:
+            self.cache_hits += 1
+        if macro.local_pattern is None:
+            return lines
+        prefix = f"_M{self.expansion_count}_"
+        return [macro.local_pattern.sub(lambda match: prefix + match.group(1), line)
+                for line in lines]
+
+
+#********************************************************************
+#*** FUNCTION : split_arguments                                    ***
+#********************************************************************
+#*** DESCRIPTION : Splits a comma separated list, leaving commas   ***
+#***               inside quotes (C'A,B') alone.                   ***
+#*** INPUT ARGS : text (str)                                       ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : list of str                                          ***
+#********************************************************************
+def split_arguments(text):
+    arguments = []
+    current = []
+    quoted = False
+    for char in text:
+        if char == "'":
+            quoted = not quoted
+        elif char == ',' and not quoted:
+            arguments.append(''.join(current).strip())
+            current = []
+            continue
+        current.append(char)
+    arguments.append(''.join(current).strip())
+    return arguments
@@ -12,8 +12,27 @@
 #***               produces a listing file and an object file.     ***
 #********************************************************************
 
+import argparse
+import os
 import sys
 import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+
+import assembly_cache
+import assembly_stats
+import binary_intermediate
+import encoders
+import expressions
+import line_parser
+import macro_processor
+import opcode_loader
+
+# Bump whenever a change alters the .lst/.obj output; it is part of the
+# assembly cache key
+ASSEMBLER_VERSION = "4.14"
 
 # global declarations
 opcode_table = {}
@@ -23,32 +42,107 @@ location_counter = 0
 start_address = 0
 base_register = None
 literal_queue = []
-directives_list = ['START', 'END', 'BYTE', 'WORD', 'RESB', 'RESW', 'BASE', 'EQU', 'EXTDEF', 'EXTREF']
+literal_pools = []
+literal_refs = {}
+directives_list = ['START', 'END', 'BYTE', 'WORD', 'RESB', 'RESW', 'BASE', 'EQU', 'EXTDEF', 'EXTREF', 'LTORG',
+                   'CSECT']
 registers_list = ['A', 'X', 'L', 'B', 'S', 'T', 'F']
+source_parser = line_parser.get_line_parser(opcode_table, directives_list)
+encoder_table = encoders.build_encoder_table(opcode_table)
 intermediate_lines = []
 modification_records = []
 program_name = ""
 program_length_pass1 = 0
+pass1_records = []
+pending_equs = {}
+equ_waiters = {}
+diagnostics = []
+intermediate_filename = "test1.int"
+binary_intermediate_filename = "test1.bin"
+intermediate_format = "text"
+write_text_intermediate = True
+opcode_filename = "opcodes"
+start_processed = False
+worker_jobs = 1
+CHUNKS_PER_JOB = 4
+T_RECORD_LIMIT = 30
+# "full" builds the listing after encoding, "stream" writes each line as
+# it is encoded, "none" writes no .lst
+listing_mode = "full"
+# promote format 3 instructions that cannot reach their target to format 4
+relax_mode = False
+# AssemblyStats while --stats is on; None costs one check per phase
+phase_stats = None
+# one section_state() per control section once a CSECT is seen, in
+# source order; the globals then hold the first section between passes
+control_sections = []
+# section states of a pass 2 pool worker and the one it has installed
+worker_sections = []
+installed_section = None
+
+#********************************************************************
+#*** FUNCTION : timed_phase                                        ***
+#********************************************************************
+#*** DESCRIPTION : Times a phase for --stats; a no-op context when ***
+#***               statistics are off.                             ***
+#*** INPUT ARGS : name (str)                                       ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : context manager                                      ***
+#********************************************************************
+def timed_phase(name):
+    if phase_stats is None:
+        return assembly_stats.NO_PHASE
+    return phase_stats.phase(name)
 
 #********************************************************************
 #*** FUNCTION : read_opcode_file                                   ***
 #********************************************************************
-#*** DESCRIPTION : Reads the opcode file and stores the opcodes     ***
-#***               in a global dictionary for later use.           ***
+#*** DESCRIPTION : Loads the opcode file (through the mtime-checked***
+#***               pickle cache) into the global read-only table   ***
+#***               and builds the per-opcode encoders for it.      ***
 #*** INPUT ARGS : filename (str)                                   ***
 #*** OUTPUT ARGS : None                                            ***
 #*** IN/OUT ARGS : None                                            ***
 #*** RETURN : None                                                 ***
 #********************************************************************
 def read_opcode_file(filename):
-    with open(filename, 'r') as file:
-        for line in file:
-            parts = line.strip().split()
-            if len(parts) >= 3:
-                mnemonic = parts[0]
-                fmt = parts[1]
-                opcode = parts[2]
-                opcode_table[mnemonic] = {'opcode': opcode, 'format': int(fmt)}
+    global opcode_filename
+    opcode_filename = filename
+    use_opcode_table(opcode_loader.load_opcode_table(filename))
+
+#********************************************************************
+#*** FUNCTION : use_opcode_table                                   ***
+#********************************************************************
+#*** DESCRIPTION : Makes an already loaded opcode table current,   ***
+#***               with its line parser and encoders.              ***
+#*** INPUT ARGS : table (mapping of mnemonic -> OpcodeInfo)        ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : None                                                 ***
+#********************************************************************
+def use_opcode_table(table):
+    global opcode_table, source_parser, encoder_table
+    opcode_table = table
+    source_parser = line_parser.get_line_parser(opcode_table, directives_list)
+    encoder_table = encoders.build_encoder_table(opcode_table)
+
+#********************************************************************
+#*** FUNCTION : define_symbol                                       ***
+#********************************************************************
+#*** DESCRIPTION : Enters a symbol's value. An EXTDEF that came     ***
+#***               before the definition keeps its flag.           ***
+#*** INPUT ARGS : name (str), address (int), relative (bool)        ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : None                                                  ***
+#********************************************************************
+def define_symbol(name, address, relative=True):
+    entry={'address': address, 'relative': relative}
+    previous=symbol_table.get(name)
+    if previous is not None and previous.get('extdef'):
+        entry['extdef']=True
+    symbol_table[name]=entry
 
 #********************************************************************
 #*** FUNCTION : handle_start_directive                              ***
@@ -89,15 +183,24 @@ def handle_base_directive(value):
 #********************************************************************
 def handle_byte_directive(value):
     global location_counter
+    location_counter += byte_length(value)
+
+#********************************************************************
+#*** FUNCTION : byte_length                                         ***
+#********************************************************************
+#*** DESCRIPTION : Number of bytes a BYTE operand occupies.        ***
+#*** INPUT ARGS : value (str)                                      ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : int                                                  ***
+#********************************************************************
+def byte_length(value):
     if value.upper().startswith('0X'):
         hex_digits = value[2:]
-        length = len(hex_digits)//2 if len(hex_digits)%2==0 else 0
+        return len(hex_digits)//2 if len(hex_digits)%2==0 else 0
     elif value.upper().startswith('0C'):
-        chars = value[2:]
-        length = len(chars)
-    else:
-        length = 1
-    location_counter += length
+        return len(value[2:])
+    return 1
 
 #********************************************************************
 #*** FUNCTION : handle_word_directive                               ***
@@ -112,6 +215,28 @@ def handle_word_directive():
     global location_counter
     location_counter += 3
 
+#********************************************************************
+#*** FUNCTION : reservation_count                                   ***
+#********************************************************************
+#*** DESCRIPTION : Count of a RESB/RESW operand: a number or an     ***
+#***               absolute expression of symbols defined so far   ***
+#***               (N EQU 3 / X RESW N). Anything else is reported ***
+#***               and reserves nothing.                           ***
+#*** INPUT ARGS : directive (str), value (str)                      ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : int                                                   ***
+#********************************************************************
+def reservation_count(directive, value):
+    count,relative=evaluate_expression(value)
+    if count is None:
+        diagnostics.append(f"{directive} {value}: undefined symbol or invalid expression")
+        return 0
+    if relative or count < 0:
+        diagnostics.append(f"{directive} {value}: count must be absolute and not negative")
+        return 0
+    return count
+
 #********************************************************************
 #*** FUNCTION : handle_resb_directive                               ***
 #********************************************************************
@@ -123,9 +248,7 @@ def handle_word_directive():
 #********************************************************************
 def handle_resb_directive(value):
     global location_counter
-    if value.startswith('#'):
-        value=value[1:]
-    location_counter += int(value)
+    location_counter += reservation_count("RESB", value)
 
 #********************************************************************
 #*** FUNCTION : handle_resw_directive                               ***
@@ -138,15 +261,14 @@ def handle_resb_directive(value):
 #********************************************************************
 def handle_resw_directive(value):
     global location_counter
-    if value.startswith('#'):
-        value=value[1:]
-    increment=3*int(value)
-    location_counter+=increment
+    location_counter+=3*reservation_count("RESW", value)
 
 #********************************************************************
 #*** FUNCTION : handle_equ_directive                                ***
 #********************************************************************
-#*** DESCRIPTION : Handles EQU directive to define symbols.        ***
+#*** DESCRIPTION : Handles EQU directive to define symbols. An EQU  ***
+#***               that uses symbols not defined yet goes on the   ***
+#***               fix-up list until its inputs are defined.       ***
 #*** INPUT ARGS : label (str), value (str)                         ***
 #*** OUTPUT ARGS : None                                            ***
 #*** IN/OUT ARGS : None                                            ***
@@ -154,17 +276,125 @@ def handle_resw_directive(value):
 #********************************************************************
 def handle_equ_directive(label, value):
     if value == '*':
-        symbol_table[label] = {
-            'address': location_counter,
-            'relative': True
-        }
+        define_symbol(label, location_counter)
+        resolve_waiting_equs(label)
+        return
+    try:
+        compiled=expressions.compile_expression(clean_operand(value))
+    except expressions.ExpressionError as e:
+        diagnostics.append(f"EQU {label}: {e}")
+        return
+    missing={sym for sym in compiled.symbols if lookup_defined_symbol(sym) is None}
+    if missing:
+        pending_equs[label]={'expression':value,'waiting':missing}
+        for sym in missing:
+            equ_waiters.setdefault(sym,[]).append(label)
     else:
-        val, is_rel = evaluate_expression(value)
-        if val is not None:
-            symbol_table[label] = {
-                'address': val,
-                'relative': is_rel
-            }
+        define_equ_symbol(label,value)
+
+#********************************************************************
+#*** FUNCTION : store_equ_value                                     ***
+#********************************************************************
+#*** DESCRIPTION : Evaluates an EQU whose inputs are all defined and***
+#***               enters the result in the symbol table.          ***
+#*** INPUT ARGS : label (str), value (str)                          ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : bool (True if the symbol was defined)                 ***
+#********************************************************************
+def store_equ_value(label, value):
+    val, is_rel = evaluate_expression(value)
+    if val is None:
+        diagnostics.append(f"EQU {label}: unable to evaluate '{value}'")
+        return False
+    define_symbol(label, val, is_rel)
+    return True
+
+#********************************************************************
+#*** FUNCTION : define_equ_symbol                                   ***
+#********************************************************************
+#*** DESCRIPTION : Stores an EQU value and releases the EQUs that   ***
+#***               were waiting on it.                             ***
+#*** INPUT ARGS : label (str), value (str)                          ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : None                                                  ***
+#********************************************************************
+def define_equ_symbol(label, value):
+    if store_equ_value(label, value):
+        resolve_waiting_equs(label)
+
+#********************************************************************
+#*** FUNCTION : resolve_waiting_equs                                ***
+#********************************************************************
+#*** DESCRIPTION : Called when a symbol gets an address. Every      ***
+#***               pending EQU waiting on it that has no other     ***
+#***               missing input is evaluated, which may in turn   ***
+#***               release further EQUs.                           ***
+#*** INPUT ARGS : name (str)                                        ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : None                                                  ***
+#********************************************************************
+def resolve_waiting_equs(name):
+    ready=[name]
+    while ready:
+        defined=ready.pop()
+        for label in equ_waiters.pop(defined,()):
+            entry=pending_equs.get(label)
+            if entry is None:
+                continue
+            entry['waiting'].discard(defined)
+            if not entry['waiting']:
+                del pending_equs[label]
+                if store_equ_value(label, entry['expression']):
+                    ready.append(label)
+
+#********************************************************************
+#*** FUNCTION : sweep_pending_equs                                  ***
+#********************************************************************
+#*** DESCRIPTION : Runs at END. Orders the EQUs still on the fix-up ***
+#***               list topologically (Kahn), evaluates those whose***
+#***               inputs exist and reports the rest as depending  ***
+#***               on undefined symbols or as circular.            ***
+#*** INPUT ARGS : None                                              ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : None                                                  ***
+#********************************************************************
+def sweep_pending_equs():
+    equ_waiters.clear()
+    if not pending_equs:
+        return
+    indegree={}
+    dependents={}
+    for label,entry in pending_equs.items():
+        indegree[label]=0
+        for sym in entry['waiting']:
+            if sym in pending_equs:
+                indegree[label]+=1
+                dependents.setdefault(sym,[]).append(label)
+
+    queue=[label for label in pending_equs if indegree[label]==0]
+    failed=set()
+    while queue:
+        label=queue.pop(0)
+        entry=pending_equs.pop(label)
+        undefined=sorted(sym for sym in entry['waiting']
+                         if sym in failed or lookup_defined_symbol(sym) is None)
+        if undefined:
+            failed.add(label)
+            diagnostics.append(f"EQU {label}: undefined symbol(s) {', '.join(undefined)}")
+        elif not store_equ_value(label,entry['expression']):
+            failed.add(label)
+        for dependent in dependents.get(label,()):
+            indegree[dependent]-=1
+            if indegree[dependent]==0:
+                queue.append(dependent)
+
+    if pending_equs:
+        diagnostics.append(f"EQU circular definition among: {', '.join(sorted(pending_equs))}")
+        pending_equs.clear()
 
 #********************************************************************
 #*** FUNCTION : handle_extdef_directive                             ***
@@ -214,13 +444,17 @@ def handle_extref_directive(value):
 #********************************************************************
 #*** FUNCTION : process_literal                                     ***
 #********************************************************************
-#*** DESCRIPTION : Checks and stores literals from operands.        ***
-#*** INPUT ARGS : operand (str)                                     ***
+#*** DESCRIPTION : Checks and stores literals from operands. The    ***
+#***               reference is bound to an earlier pool holding   ***
+#***               the literal if that copy is still in PC-relative***
+#***               reach (any pool for format 4), otherwise to the ***
+#***               next pool placed by LTORG or END.               ***
+#*** INPUT ARGS : operand (str), ref_loc (int), extended (bool)     ***
 #*** OUTPUT ARGS : None                                             ***
 #*** IN/OUT ARGS : None                                             ***
 #*** RETURN : None                                                  ***
 #********************************************************************
-def process_literal(operand):
+def process_literal(operand, ref_loc=None, extended=False):
     if not validate_literal(operand):
         return
     if re.match(r"^=C'[^']+'$", operand, re.IGNORECASE):
@@ -246,27 +480,119 @@ def process_literal(operand):
         literal_table[operand] = {
             'operand_value': operand_value,
             'length': length,
-            'address': None
+            'address': None,
+            'references': 0
         }
-        literal_queue.append(operand)
+    literal_table[operand]['references'] += 1
+
+    pool_no = find_reusable_pool(operand, ref_loc, extended)
+    if pool_no is None:
+        pool_no = len(literal_pools)
+        if operand not in literal_queue:
+            literal_queue.append(operand)
+    if ref_loc is not None:
+        literal_refs[ref_loc] = (operand, pool_no)
+
+#********************************************************************
+#*** FUNCTION : find_reusable_pool                                  ***
+#********************************************************************
+#*** DESCRIPTION : Finds the latest placed pool that holds the      ***
+#***               literal within reach of the referencing line.   ***
+#*** INPUT ARGS : operand (str), ref_loc (int), extended (bool)     ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : int pool index or None                                ***
+#********************************************************************
+def find_reusable_pool(operand, ref_loc, extended):
+    if ref_loc is None:
+        return None
+    for pool_no in range(len(literal_pools) - 1, -1, -1):
+        address = literal_pools[pool_no]['addresses'].get(operand)
+        if address is None:
+            continue
+        if extended or -2048 <= address - (ref_loc + 3) <= 2047:
+            return pool_no
+    return None
 
 #********************************************************************
 #*** FUNCTION : place_literals                                      ***
 #********************************************************************
-#*** DESCRIPTION : Places literals at the end of the program.       ***
+#*** DESCRIPTION : Places the queued literals as a pool at the      ***
+#***               current location (LTORG or end of program).     ***
 #*** INPUT ARGS : None                                              ***
 #*** OUTPUT ARGS : None                                             ***
 #*** IN/OUT ARGS : None                                             ***
-#*** RETURN : None                                                  ***
+#*** RETURN : dict pool or None if nothing was queued               ***
 #********************************************************************
 def place_literals():
     global location_counter
+    if not literal_queue:
+        return None
+    pool = {'address': location_counter, 'addresses': {}, 'size': 0}
     for literal in literal_queue:
         if literal_table[literal]['address'] is None:
             literal_table[literal]['address']=location_counter
-            length=literal_table[literal]['length']
-            location_counter+=length
+        pool['addresses'][literal]=location_counter
+        length=literal_table[literal]['length']
+        location_counter+=length
+    pool['size'] = location_counter - pool['address']
+    literal_pools.append(pool)
     literal_queue.clear()
+    return pool
+
+#********************************************************************
+#*** FUNCTION : emit_literal_pool                                   ***
+#********************************************************************
+#*** DESCRIPTION : Places a pool and adds one '*' line record per   ***
+#***               literal so pass 2 emits its bytes.              ***
+#*** INPUT ARGS : line_counter (int)                                ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : None                                                  ***
+#********************************************************************
+def emit_literal_pool(line_counter):
+    with timed_phase("literal placement"):
+        pool = place_literals()
+        if pool is None:
+            return
+        for literal, address in pool['addresses'].items():
+            pass1_records.append(line_parser.LineRecord(line_counter, address, None, '*', literal,
+                                                        f"*\t{literal}", literal_table[literal]['length']))
+
+#********************************************************************
+#*** FUNCTION : literal_address                                     ***
+#********************************************************************
+#*** DESCRIPTION : Address of the pool copy a line's literal uses.  ***
+#*** INPUT ARGS : operand (str), loc_ctr (int)                      ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : int or None                                           ***
+#********************************************************************
+def literal_address(operand, loc_ctr):
+    ref = literal_refs.get(loc_ctr)
+    if ref is not None and ref[0] == operand and ref[1] < len(literal_pools):
+        return literal_pools[ref[1]]['addresses'].get(operand)
+    if operand in literal_table:
+        return literal_table[operand]['address']
+    return None
+
+#********************************************************************
+#*** FUNCTION : literal_object_code                                 ***
+#********************************************************************
+#*** DESCRIPTION : Object code of a literal's value.                ***
+#*** INPUT ARGS : operand (str)                                     ***
+#*** OUTPUT ARGS : bytes                                            ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : bytes                                                 ***
+#********************************************************************
+def literal_object_code(operand):
+    info = literal_table.get(operand)
+    if info is None:
+        return b''
+    operand_value = info['operand_value']
+    if operand_value.upper().startswith('C'):
+        return char_bytes(operand_value[1:])
+    return hex_bytes(operand_value[1:info['length'] * 2 + 1])
 
 #********************************************************************
 #*** FUNCTION : process_directive                                   ***
@@ -327,6 +653,41 @@ def validate_literal(literal):
 def clean_operand(value):
     return value.lstrip('#@')
 
+#********************************************************************
+#*** FUNCTION : lookup_defined_symbol                               ***
+#********************************************************************
+#*** DESCRIPTION : Symbol lookup for EQU style expressions. Only    ***
+#***               symbols that already have an address resolve.   ***
+#*** INPUT ARGS : name (str)                                        ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : (int, bool, bool) or None                             ***
+#********************************************************************
+def lookup_defined_symbol(name):
+    info=symbol_table.get(name)
+    if info is None or info['address'] is None:
+        return None
+    return info['address'],info['relative'],False
+
+#********************************************************************
+#*** FUNCTION : lookup_operand_symbol                               ***
+#********************************************************************
+#*** DESCRIPTION : Symbol lookup for operand expressions. Unknown   ***
+#***               and EXTREF symbols count as external references,***
+#***               pending symbols count as zero.                  ***
+#*** INPUT ARGS : name (str)                                        ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : (int, bool, bool)                                     ***
+#********************************************************************
+def lookup_operand_symbol(name):
+    info=symbol_table.get(name)
+    if info is None or info.get('external'):
+        return 0,False,True
+    if info['address'] is None:
+        return 0,False,False
+    return info['address'],info['relative'],False
+
 #********************************************************************
 #*** FUNCTION : evaluate_expression                                 ***
 #********************************************************************
@@ -337,25 +698,13 @@ def clean_operand(value):
 #*** RETURN : (value, is_relative)                                  ***
 #********************************************************************
 def evaluate_expression(expression):
-    expression=clean_operand(expression)
-    tokens=re.findall(r'[A-Za-z_][A-Za-z0-9_]*|\d+|[\+\-\*/()]',expression)
-    evaluated_expr=''
-    is_relative=False
-    for token in tokens:
-        if re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', token):
-            if token in symbol_table and symbol_table[token]['address'] is not None:
-                value=symbol_table[token]['address']
-                evaluated_expr+=str(value)
-                is_relative=is_relative or symbol_table[token]['relative']
-            else:
-                return None,False
-        else:
-            evaluated_expr+=token
     try:
-        result=eval(evaluated_expr)
-        return result,is_relative
-    except:
+        result=expressions.evaluate(clean_operand(expression),lookup_defined_symbol)
+    except expressions.ExpressionError:
         return None,False
+    if result.reloc not in (0,1):
+        return None,False
+    return result.value,result.relative
 
 #********************************************************************
 #*** FUNCTION : evaluate_expression_with_externals                  ***
@@ -367,46 +716,11 @@ def evaluate_expression(expression):
 #*** RETURN : (int, bool, list)                                     ***
 #********************************************************************
 def evaluate_expression_with_externals(expression):
-    expression = clean_operand(expression)
-    tokens = re.findall(r'[A-Za-z_][A-Za-z0-9_]*|\d+|[\+\-\*/()]', expression)
-    value_stack = []
-    external_refs = []
-    sign = '+'
-    if tokens and tokens[0] not in ['+', '-']:
-        tokens.insert(0, '+')
-    is_relative = False
-
-    for token in tokens:
-        if token in ['+', '-']:
-            sign = token
-        elif re.match(r'^[A-Za-z_][A-Za-z0-9_]*$', token):
-            if token in symbol_table:
-                sym_info = symbol_table[token]
-                if sym_info.get('external'):
-                    value_stack.append((0, sign))
-                    external_refs.append((token, sign))
-                    is_relative = is_relative or sym_info['relative']
-                else:
-                    if sym_info['address'] is not None:
-                        val = sym_info['address']
-                        value_stack.append((val, sign))
-                        is_relative = is_relative or sym_info['relative']
-                    else:
-                        value_stack.append((0, sign))
-            else:
-                value_stack.append((0, sign))
-                external_refs.append((token, sign))
-        elif token.isdigit():
-            val = int(token)
-            value_stack.append((val, sign))
-
-    evaluated_value = 0
-    for val, s in value_stack:
-        if s == '+':
-            evaluated_value += val
-        else:
-            evaluated_value -= val
-    return evaluated_value, is_relative, external_refs
+    try:
+        result=expressions.evaluate(clean_operand(expression),lookup_operand_symbol)
+    except expressions.ExpressionError:
+        return None,False,[]
+    return result.value,result.reloc!=0,result.externals
 
 #********************************************************************
 #*** FUNCTION : is_valid_symbol                                     ***
@@ -420,540 +734,1421 @@ def evaluate_expression_with_externals(expression):
 def is_valid_symbol(symbol):
     return re.match(r'^[A-Za-z_][A-Za-z0-9_]*$',symbol) is not None
 
+#********************************************************************
+#*** FUNCTION : split_source_line                                   ***
+#********************************************************************
+#*** DESCRIPTION : Splits a source line into label, opcode and      ***
+#***               operand with the precompiled line parser.       ***
+#*** INPUT ARGS : line (str)                                        ***
+#*** OUTPUT ARGS : (label, opcode, operand)                         ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : tuple                                                 ***
+#********************************************************************
+def split_source_line(line):
+    parsed=source_parser.parse(line)
+    return parsed.label,parsed.opcode,parsed.operand
+
 #********************************************************************
 #*** FUNCTION : pass1                                               ***
 #********************************************************************
 #*** DESCRIPTION : Pass 1: Calculates addresses, builds symbol tbl. ***
-#*** INPUT ARGS : filename (str)                                    ***
+#***               Writes the intermediate file(s) the current     ***
+#***               format asks for; memory mode writes none. With  ***
+#***               jobs > 1 the lines are parsed and sized in a    ***
+#***               process pool first.                             ***
+#*** INPUT ARGS : filename (str), jobs (int)                        ***
 #*** OUTPUT ARGS : None                                             ***
 #*** IN/OUT ARGS : None                                             ***
-#*** RETURN : None                                                  ***
+#*** RETURN : list of LineRecord                                    ***
 #********************************************************************
-def pass1(filename):
-    global location_counter, program_name, program_length_pass1
-    start_processed=False
-    with open("test1.int","w") as outfile:
-        outfile.write("")
+def pass1(filename, jobs=1):
     with open(filename,'r') as file:
-        line_counter=1
-        for line in file:
-            line=line.strip()
-            if not line or line.startswith('.') or line.startswith(';'):
-                line_counter+=1
-                continue
-            line=re.split(r'[.;]',line)[0].strip()
-            tokens=line.split()
-            label,opcode,operand=None,None,None
-
-            if tokens:
-                if tokens[0].endswith(':'):
-                    label=tokens[0][:-1]
-                    tokens=tokens[1:]
-                elif is_valid_symbol(tokens[0]) and tokens[0].upper() not in opcode_table and tokens[0].upper() not in directives_list:
-                    label=tokens[0]
-                    tokens=tokens[1:]
-                if tokens:
-                    opcode=tokens[0]
-                    operand=' '.join(tokens[1:]) if len(tokens)>1 else None
-            else:
-                line_counter+=1
-                continue
-            
-            if opcode == "START" and operand and not start_processed:
-                if label:
-                    symbol_table[label] = {
-                        'address': int(operand.replace('#', ''), 16),
-                        'relative': True
-                    }
-                    program_name = label
-                handle_start_directive(operand)
-                start_processed = True
-                with open("test1.int", "a") as outfile:
-                    outfile.write(f"{line_counter:04}\t{location_counter:04X}\t{line}\n")
-                line_counter += 1
-                continue
-
-            if label and opcode != "EQU":
-                symbol_table[label] = {
-                    'address': location_counter,
-                    'relative': True
-                }
-            
-            with open("test1.int", "a") as outfile:
-                outfile.write(f"{line_counter:04}\t{location_counter:04X}\t{line}\n")
-            
-            if opcode == "END":
-                break
-            elif opcode in directives_list:
-                process_directive(label, opcode, operand)
-            elif opcode.startswith('+'):
-                stripped_opcode = opcode[1:]
-                if stripped_opcode in opcode_table:
-                    location_counter += 4
-            elif opcode in opcode_table:
-                fmt = opcode_table[opcode]['format']
-                if fmt == 1:
-                    location_counter += 1
-                elif fmt == 2:
-                    location_counter += 2
-                elif fmt == 3:
-                    location_counter += 3
-
-            if operand and operand.strip().startswith('='):
-                process_literal(operand.strip())
-
-            line_counter += 1
-
-    program_length=location_counter-start_address
-    program_length_pass1 = program_length
-    with open("test1.int","a") as outfile:
-        outfile.write(f"\nProgram Length: {program_length:04X}\n")
-
-    place_literals()
-    write_symbol_table_to_file()
-    write_literal_table_to_file()
+        return pass1_source(file, jobs)
 
 #********************************************************************
-#*** FUNCTION : pass2                                               ***
+#*** FUNCTION : pass1_source                                        ***
 #********************************************************************
-#*** DESCRIPTION : Pass 2: Generates object code and writes files.  ***
-#*** INPUT ARGS : source_filename (str)                             ***
+#*** DESCRIPTION : Runs pass 1 over any iterable of source lines.   ***
+#***               Macros are expanded on the way in, line by line.***
+#***               write_intermediates=False skips test1.int and   ***
+#***               test1.bin whatever the current format.          ***
+#*** INPUT ARGS : lines (iterable of str), jobs (int),              ***
+#***              write_intermediates (bool)                        ***
 #*** OUTPUT ARGS : None                                             ***
 #*** IN/OUT ARGS : None                                             ***
-#*** RETURN : None                                                  ***
+#*** RETURN : list of LineRecord                                    ***
 #********************************************************************
-def pass2(source_filename):
-    global start_address,base_register
-    intermediate_filename="test1.int"
-    lst_filename=source_filename.replace('.asm','.lst')
-    obj_filename=source_filename.replace('.asm','.obj')
-
-    if base_register and isinstance(base_register,tuple) and base_register[0]=='PENDING':
-        symbol_name=base_register[1]
-        if symbol_name in symbol_table and symbol_table[symbol_name]['address'] is not None:
-            base_register=symbol_table[symbol_name]['address']
+def pass1_source(lines, jobs=1, write_intermediates=True):
+    global start_processed
+    start_processed=False
+    pass1_records.clear()
+    literal_pools.clear()
+    literal_refs.clear()
+    pending_equs.clear()
+    equ_waiters.clear()
+    diagnostics.clear()
+    control_sections.clear()
+    macros=macro_processor.MacroProcessor(opcode_table, directives_list, diagnostics)
+    lines=macros.expand(lines)
+    if jobs > 1:
+        line_counter=pass1_parallel(list(lines), jobs)
+    else:
+        line_counter=0
+        for line_counter,raw_line in lines:
+            parsed=source_parser.parse(raw_line)
+            if parsed.label is not None or parsed.opcode is not None:
+                if pass1_statement(line_counter, parsed.label, parsed.opcode,
+                                   parsed.operand, parsed.code):
+                    break
         else:
-            base_register=None
-
-    with open(lst_filename,'w') as lst_file:
-        lst_file.write("")
-    with open(obj_filename,'w') as obj_file:
-        obj_file.write("")
-
-    with open(intermediate_filename,'r') as inter_file:
-        lines=inter_file.readlines()
-
-    content_lines=[]
-    for line in lines:
-        if line.strip()=="Symbol Table:":
-            break
-        content_lines.append(line)
-
-    for line in content_lines:
-        if not line.strip() or line.startswith("---") or line.startswith("Program Length"):
-            continue
-        if re.match(r'^\d{4}\t',line):
-            parts=line.strip().split('\t',2)
-            if len(parts)>=3:
-                loc_ctr=int(parts[1],16)
-                source_line=parts[2]
-                intermediate_lines.append({
-                    'loc_ctr':loc_ctr,
-                    'source_line':source_line,
-                    'object_code':''
-                })
-
-    for idx,line in enumerate(intermediate_lines):
-        loc_ctr=line['loc_ctr']
-        source_line=line['source_line']
-        object_code=''
-
-        tokens=source_line.split()
-        label,opcode,operand=None,None,None
-
-        if tokens:
-            if tokens[0].endswith(':'):
-                label=tokens[0][:-1]
-                tokens=tokens[1:]
-            elif is_valid_symbol(tokens[0]) and tokens[0].upper() not in opcode_table and tokens[0].upper() not in directives_list:
-                label=tokens[0]
-                tokens=tokens[1:]
-            if tokens:
-                opcode=tokens[0]
-                operand=' '.join(tokens[1:]) if len(tokens)>1 else None
-
-        if opcode=="BYTE":
-            object_code=process_byte_operand(operand)
-        elif opcode=="WORD":
-            object_code=process_word_operand(operand, loc_ctr)
-        elif opcode in directives_list:
-            pass
-        elif opcode is not None:
-            if opcode in opcode_table or (opcode.startswith('+') and opcode[1:] in opcode_table):
-                object_code=generate_object_code(opcode,operand,loc_ctr)
-
-        intermediate_lines[idx]['object_code']=object_code
-
-    with open(lst_filename,'a') as lst_file:
-        for line in intermediate_lines:
-            loc_str=f"{line['loc_ctr']:05X}"
-            tokens=line['source_line'].split()
-            lbl,opc,opr='','',''
-            if tokens:
-                if tokens[0].endswith(':'):
-                    lbl=tokens[0][:-1]
-                    tokens=tokens[1:]
-                elif is_valid_symbol(tokens[0]) and tokens[0].upper() not in opcode_table and tokens[0].upper() not in directives_list:
-                    lbl=tokens[0]
-                    tokens=tokens[1:]
-            if tokens:
-                opc=tokens[0].upper()
-                opr=' '.join(tokens[1:]) if len(tokens)>1 else ''
-            obj=line['object_code']
-
-            label_str = (lbl+":") if lbl else ""
-            lst_file.write(f"{int(loc_str,16):05X} {label_str:<8}{opc:<8}{opr:<15}{obj}\n")
-
-        lst_file.write("\nSYMBOL TABLE\n")
-        lst_file.write("SYMBOL VALUE RFLAG MFLAG IOFLAG\n")
-
-        for sym in sorted(symbol_table.keys()):
-            info = symbol_table[sym]
-            val = info['address']
-            if val is None:
-                val_str = "0"
-            else:
-                val_str = f"{val:X}".upper().lstrip('0')
-                if val_str == '':
-                    val_str = '0'
-            rflag = "TRUE" if info['relative'] else "FALSE"
-            mflag = "FALSE"
-            ioflag = "EXTERNAL" if info.get('external') else "INTERNAL"
-            lst_file.write(f"{sym.upper()} {val_str:<4} {rflag:<5} {mflag:<5} {ioflag}\n")
-
-    write_object_program(obj_filename)
-
-#********************************************************************
-#*** FUNCTION : process_byte_operand                                ***
-#********************************************************************
-#*** DESCRIPTION : Processes BYTE operand to produce object code.   ***
-#*** INPUT ARGS : operand (str)                                     ***
-#*** OUTPUT ARGS : str                                              ***
+            line_counter+=1
+
+    finish_pass1(line_counter)
+    if phase_stats is not None and macros.expansion_count:
+        phase_stats.count('macro expansions', macros.expansion_count)
+        phase_stats.count('macro cache hits', macros.cache_hits)
+    if relax_mode:
+        with timed_phase("relaxation"):
+            relax_instruction_formats(line_counter)
+
+    if not write_intermediates:
+        return pass1_records
+    if write_text_intermediate or intermediate_format == "text":
+        write_text_intermediate_file()
+    if intermediate_format == "binary":
+        binary_intermediate.write_binary_intermediate(
+            binary_intermediate_filename, pass1_records, symbol_table, literal_table,
+            start_address, program_length_pass1, opcode_table.keys(), directives_list)
+    return pass1_records
+
+#********************************************************************
+#*** FUNCTION : finish_pass1                                        ***
+#********************************************************************
+#*** DESCRIPTION : End of pass 1: closes the last control section.  ***
+#***               With CSECTs it is saved like the others and the ***
+#***               first section is installed again.               ***
+#*** INPUT ARGS : line_counter (int)                                ***
+#*** OUTPUT ARGS : None                                             ***
 #*** IN/OUT ARGS : None                                             ***
-#*** RETURN : str                                                   ***
+#*** RETURN : None                                                  ***
 #********************************************************************
-def process_byte_operand(operand):
-    if operand.upper().startswith('0X'):
-        hex_digits=operand[2:]
-        return hex_digits.upper()
-    elif operand.upper().startswith('0C'):
-        chars=operand[2:]
-        return ''.join(f"{ord(c):02X}" for c in chars)
-    elif operand.upper().startswith('C\''):
-        chars=operand[2:-1]
-        return ''.join(f"{ord(c):02X}" for c in chars)
-    elif operand.upper().startswith('X\''):
-        hex_digits=operand[2:-1]
-        return hex_digits.upper()
-    return ''
+def finish_pass1(line_counter):
+    close_control_section(line_counter)
+    if control_sections:
+        control_sections.append(section_state())
+        install_section_state(control_sections[0])
 
 #********************************************************************
-#*** FUNCTION : process_word_operand                                ***
+#*** FUNCTION : close_control_section                               ***
 #********************************************************************
-#*** DESCRIPTION : Processes WORD operand and handles extern refs.  ***
-#*** INPUT ARGS : operand (str), loc_ctr (int)                      ***
-#*** OUTPUT ARGS : str                                              ***
+#*** DESCRIPTION : End of a control section (or of the program):    ***
+#***               settles forward EQUs, places the last literal   ***
+#***               pool and records the length.                    ***
+#*** INPUT ARGS : line_counter (int)                                ***
+#*** OUTPUT ARGS : None                                             ***
 #*** IN/OUT ARGS : None                                             ***
-#*** RETURN : str                                                   ***
+#*** RETURN : None                                                  ***
 #********************************************************************
-def process_word_operand(operand, loc_ctr):
-    evaluated_value, is_relative, external_refs = evaluate_expression_with_externals(operand)
-    if evaluated_value is None:
-        return ''
-    obj_code = f"{evaluated_value & 0xFFFFFF:06X}"
-    symbol_tokens = re.findall(r'[A-Za-z_][A-Za-z0-9_]*', operand)
-    for sym in symbol_tokens:
-        sign_char = '+'
-        for (ext_sym, ext_sign) in external_refs:
-            if ext_sym == sym:
-                sign_char = ext_sign
-                break
-        if sym in symbol_table:
-            info = symbol_table[sym]
-            if info.get('external'):
-                modification_records.append(f"M^{loc_ctr:06X}^06{sign_char}{sym.upper()}")
-            else:
-                modification_records.append(f"M^{loc_ctr:06X}^06{sign_char}{program_name.upper()}")
-        else:
-            modification_records.append(f"M^{loc_ctr:06X}^06{sign_char}{sym.upper()}")
-    return obj_code
+def close_control_section(line_counter):
+    global program_length_pass1
+    sweep_pending_equs()
+    emit_literal_pool(line_counter)
+    program_length_pass1=location_counter-start_address
 
 #********************************************************************
-#*** FUNCTION : generate_object_code                                ***
+#*** FUNCTION : begin_control_section                               ***
 #********************************************************************
-#*** DESCRIPTION : Generates object code for instructions.          ***
-#*** INPUT ARGS : opcode (str), operand (str), loc_ctr (int)        ***
-#*** OUTPUT ARGS : str                                              ***
+#*** DESCRIPTION : CSECT: saves the section that ends here and      ***
+#***               starts a new one at LOCCTR 0 with its own       ***
+#***               symbols, EXTDEF/EXTREF lists, literals and BASE.***
+#*** INPUT ARGS : line_counter (int), name (str or None)            ***
+#*** OUTPUT ARGS : None                                             ***
 #*** IN/OUT ARGS : None                                             ***
-#*** RETURN : str                                                   ***
+#*** RETURN : None                                                  ***
 #********************************************************************
-def generate_object_code(opcode, operand, loc_ctr):
-    ni_flag = 0
-    x_flag = 0
-    b_flag = 0
-    p_flag = 0
-    e_flag = 0
-
-    is_format4 = False
-    if opcode.startswith('+'):
-        is_format4 = True
-        opcode = opcode[1:]
-        e_flag = 1
-
-    opcode_info = opcode_table.get(opcode)
-    if not opcode_info:
-        return ''
-    opcode_value = int(opcode_info['opcode'], 16)
-    fmt = opcode_info['format']
-    if is_format4:
-        fmt = 4
-
-    if fmt == 1:
-        return f"{opcode_value:02X}"
-    elif fmt == 2:
-        if operand is None:
-            return ''
-        operands = operand.replace(' ', '').split(',')
-        if len(operands) == 1:
-            op = operands[0]
-            if op.startswith('#') and op[1:].isdigit():
-                val = int(op[1:])
-                reg1 = val
-                reg2 = 0
-            else:
-                reg1 = get_register_number(op)
-                reg2 = 0
-        elif len(operands) == 2:
-            op1, op2 = operands
-            reg1 = get_register_number(op1)
-            if op2.startswith('#') and op2[1:].isdigit():
-                val = int(op2[1:])
-                reg2 = val
-            else:
-                reg2 = get_register_number(op2)
-        return f"{opcode_value:02X}{reg1:X}{reg2:X}"
-
-    address = 0
-    ext_refs = []
-    if operand:
-        if operand.startswith('#'):
-            ni_flag = 1
-            operand_value = operand[1:]
-        elif operand.startswith('@'):
-            ni_flag = 2
-            operand_value = operand[1:]
-        else:
-            ni_flag = 3
-            operand_value = operand
-
-        if ',X' in operand_value.upper():
-            x_flag = 1
-            operand_value = operand_value.replace(',X','').replace(',x','')
-
-        operand_value = operand_value.strip()
-
-        if operand_value.startswith('='):
-            if operand_value in literal_table and literal_table[operand_value]['address'] is not None:
-                address = literal_table[operand_value]['address']
-                ext_refs = []
-            else:
-                return ''
-        else:
-            if operand_value.isdigit():
-                val = int(operand_value)
-                address = val
-                ext_refs = []
-            else:
-                val, is_rel, external_refs = evaluate_expression_with_externals(operand_value)
-                if val is None:
-                    val = 0
-                address = val
-                ext_refs = external_refs
-    else:
-        ni_flag = 3
-        address = 0
-
-    opcode_bin = (opcode_value & 0xFC) | ni_flag
-    first_byte = opcode_bin
-
-    if fmt == 3:
-        next_loc = loc_ctr + 3
-        immediate_numeric = False
-        immediate_value = 0
-        if operand and operand.startswith('#'):
-            imm_part = operand[1:]
-            if imm_part.isdigit():
-                immediate_numeric = True
-                immediate_value = int(imm_part)
-
-        if immediate_numeric:
-            displacement = immediate_value - (next_loc)
-            if -2048 <= displacement <= 2047:
-                p_flag = 1
-                disp = displacement & 0xFFF
-            else:
-                if 0 <= immediate_value <= 4095:
-                    disp = immediate_value & 0xFFF
-                else:
-                    disp = immediate_value & 0xFFF
-        else:
-            displacement = address - next_loc
-            if -2048 <= displacement <= 2047:
-                p_flag = 1
-                disp = displacement & 0xFFF
-            else:
-                if base_register is not None:
-                    displacement = address - base_register
-                    if 0 <= displacement <= 4095:
-                        b_flag = 1
-                        disp = displacement & 0xFFF
-                    else:
-                        disp = address & 0xFFF
-                else:
-                    disp = address & 0xFFF
-
-        xbpe = (x_flag << 3) | (b_flag << 2) | (p_flag << 1) | e_flag
-        return f"{first_byte:02X}{xbpe:01X}{disp:03X}"
+def begin_control_section(line_counter, name):
+    global location_counter, start_address, base_register, program_name
+    close_control_section(line_counter)
+    control_sections.append(section_state())
+    for table in (symbol_table, literal_table, literal_refs, pending_equs, equ_waiters):
+        table.clear()
+    literal_queue.clear()
+    literal_pools.clear()
+    location_counter=0
+    start_address=0
+    base_register=None
+    program_name=name or ''
+    if name:
+        define_symbol(name, 0)
     else:
-        displacement = address
-        xbpe = (x_flag << 3) | (b_flag << 2) | (p_flag << 1) | e_flag
-        addr_20 = displacement & 0xFFFFF
-        return f"{first_byte:02X}{xbpe:01X}{addr_20:05X}"
+        diagnostics.append(f"CSECT without a section name (line {line_counter})")
 
 #********************************************************************
-#*** FUNCTION : get_register_number                                 ***
+#*** FUNCTION : section_state                                       ***
 #********************************************************************
-#*** DESCRIPTION : Gets register number from register name.         ***
-#*** INPUT ARGS : register (str)                                    ***
-#*** OUTPUT ARGS : int                                              ***
+#*** DESCRIPTION : Copy of the per-section globals: name, start,    ***
+#***               length, BASE, symbol and literal tables.        ***
+#*** INPUT ARGS : None                                              ***
+#*** OUTPUT ARGS : None                                             ***
 #*** IN/OUT ARGS : None                                             ***
-#*** RETURN : int                                                   ***
-#********************************************************************
-def get_register_number(register):
-    register=register.strip().upper()
-    register_numbers={
-        'A':0,'X':1,'L':2,'B':3,'S':4,'T':5,'F':6,'PC':8,'SW':9
+#*** RETURN : dict                                                  ***
+#********************************************************************
+def section_state():
+    return {
+        'program_name': program_name,
+        'start_address': start_address,
+        'program_length': program_length_pass1,
+        'base_register': base_register,
+        'symbol_table': dict(symbol_table),
+        'literal_table': dict(literal_table),
+        'literal_pools': list(literal_pools),
+        'literal_refs': dict(literal_refs),
     }
-    return register_numbers.get(register,0)
 
 #********************************************************************
-#*** FUNCTION : write_object_program                                ***
+#*** FUNCTION : install_section_state                               ***
 #********************************************************************
-#*** DESCRIPTION : Writes the object program file (H, T, M, E recs).***
-#*** INPUT ARGS : obj_filename (str)                                ***
+#*** DESCRIPTION : Makes a saved section the current one, with its  ***
+#***               BASE resolved and, after pass 2, its M records. ***
+#***               The state may share tables with the globals     ***
+#***               (a forked worker), so each is copied first.     ***
+#*** INPUT ARGS : state (dict from section_state)                   ***
 #*** OUTPUT ARGS : None                                             ***
 #*** IN/OUT ARGS : None                                             ***
 #*** RETURN : None                                                  ***
 #********************************************************************
-def write_object_program(obj_filename):
-    global start_address, modification_records, program_name, program_length_pass1
-    program_name_local=''
-    for line in intermediate_lines:
-        if 'START' in line['source_line']:
-            tokens=line['source_line'].split()
-            if tokens[0].endswith(':'):
-                program_name_local = tokens[0][:-1]
-            else:
-                program_name_local = tokens[0]
+def install_section_state(state):
+    global base_register, program_name, start_address, program_length_pass1
+    for table,key in ((symbol_table,'symbol_table'),(literal_table,'literal_table'),
+                      (literal_refs,'literal_refs')):
+        contents=dict(state[key])
+        table.clear()
+        table.update(contents)
+    literal_pools[:]=list(state['literal_pools'])
+    modification_records[:]=list(state.get('modification_records',()))
+    program_name=state['program_name']
+    start_address=state['start_address']
+    program_length_pass1=state['program_length']
+    base_register=state['base_register']
+    base_register=base_address()
+
+#********************************************************************
+#*** FUNCTION : section_runs                                        ***
+#********************************************************************
+#*** DESCRIPTION : Splits line records into one run per control     ***
+#***               section; each CSECT line starts a new run (a    ***
+#***               section's literal pool comes before it).        ***
+#*** INPUT ARGS : records (list of LineRecord)                      ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : list of lists of LineRecord                           ***
+#********************************************************************
+def section_runs(records):
+    runs=[[]]
+    for record in records:
+        if record.opcode=='CSECT':
+            runs.append([])
+        runs[-1].append(record)
+    return runs
+
+#********************************************************************
+#*** FUNCTION : relax_instruction_formats                           ***
+#********************************************************************
+#*** DESCRIPTION : Span-dependent instruction sizing. Pass 1 sizes  ***
+#***               every unprefixed instruction as format 3; any   ***
+#***               whose target is out of PC-relative, base-       ***
+#***               relative and direct reach, or is external, gets ***
+#***               a '+' (in its source text too, for test1.int)   ***
+#***               and pass 1 is replayed from the parsed          ***
+#***               statements with the new sizes. Promotions only  ***
+#***               grow, so this stops at a fixed point where every***
+#***               format 3 instruction encodes exactly. The       ***
+#***               diagnostics of the first pass 1 (macro errors   ***
+#***               included) are kept; a replay only repeats them. ***
+#*** INPUT ARGS : line_counter (int) line pass 1 stopped at         ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : int number of instructions promoted                   ***
+#********************************************************************
+def relax_instruction_formats(line_counter):
+    statements=[(line.line_no,line.label,line.opcode,line.operand,line.source)
+                for line in pass1_records if line.opcode!='*']
+    reported=list(diagnostics)
+    promoted=0
+    while True:
+        unreachable=find_unreachable_instructions()
+        if not unreachable:
             break
+        promoted+=len(unreachable)
+        records=[line for line in pass1_records if line.opcode!='*']
+        for index,(record,(line_no,label,opcode,operand,source)) in enumerate(zip(records,statements)):
+            if record in unreachable:
+                source=re.sub(rf'(?<![^\s:]){re.escape(opcode)}(?=\s|$)', '+'+opcode, source, count=1)
+                statements[index]=(line_no,label,'+'+opcode,operand,source)
+        reset_assembler_state()
+        for line_no,label,opcode,operand,source in statements:
+            if pass1_statement(line_no,label,opcode,operand,source):
+                break
+        finish_pass1(line_counter)
+        diagnostics[:]=reported
+    if phase_stats is not None:
+        phase_stats.count('relaxed to format 4', promoted)
+    return promoted
 
-    if not program_name_local:
-        program_name_local = '      '
-
-    header_record = f"H^{program_name_local[:6].upper()}^{start_address:06X}^{program_length_pass1:06X}\n"
+#********************************************************************
+#*** FUNCTION : find_unreachable_instructions                       ***
+#********************************************************************
+#*** DESCRIPTION : Records of the format 3 instructions whose       ***
+#***               operand format 3 cannot encode at the current   ***
+#***               addresses, each checked with its own section's  ***
+#***               symbols and BASE. Records, not line numbers: a  ***
+#***               macro call's lines share one source line.       ***
+#*** INPUT ARGS : None                                              ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : set of LineRecord                                     ***
+#********************************************************************
+def find_unreachable_instructions():
+    if not control_sections:
+        return unreachable_lines(pass1_records)
+    unreachable=set()
+    for state,run in zip(control_sections,section_runs(pass1_records)):
+        install_section_state(state)
+        unreachable|=unreachable_lines(run)
+    install_section_state(control_sections[0])
+    return unreachable
 
-    extdef_list = []
-    extref_list = []
-    for s, info in symbol_table.items():
-        if info.get('extdef'):
-            if info['address'] is not None:
-                extdef_list.append((s, info['address']))
-        if info.get('external') and info.get('referenced'):
-            extref_list.append(s)
+#********************************************************************
+#*** FUNCTION : unreachable_lines                                   ***
+#********************************************************************
+#*** DESCRIPTION : find_unreachable_instructions for the lines of   ***
+#***               the current section.                            ***
+#*** INPUT ARGS : lines (list of LineRecord)                        ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : set of LineRecord                                     ***
+#********************************************************************
+def unreachable_lines(lines):
+    base=base_address()
+    unreachable=set()
+    for line in lines:
+        info=opcode_table.get(line.opcode)
+        if info is None or not info.extendable:
+            continue
+        form=encoders.parse_operand(line.operand)
+        address=form.number
+        relative=False
+        if address is None and form.immediate is None:
+            address,relative,external=relaxation_target(form.target, line.loc_ctr)
+            if external:
+                unreachable.add(line)
+                continue
+            if address is None:
+                continue
+        if not encoders.format3_reaches(form, address, line.loc_ctr, base, relative):
+            unreachable.add(line)
+    return unreachable
 
-    d_record = ''
-    if extdef_list:
+#********************************************************************
+#*** FUNCTION : relaxation_target                                   ***
+#********************************************************************
+#*** DESCRIPTION : Target address of an operand during relaxation.  ***
+#***               Unlike resolve_target_address it reports        ***
+#***               external references instead of reading them as  ***
+#***               zero, and whether the target is relative.       ***
+#*** INPUT ARGS : target (str), loc_ctr (int)                       ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : (int or None, bool relative, bool external)           ***
+#********************************************************************
+def relaxation_target(target, loc_ctr):
+    info=symbol_table.get(target)
+    if info is not None:
+        if info.get('external'):
+            return None,False,True
+        return info['address'],info.get('relative',True),False
+    if target.startswith('='):
+        return literal_address(target, loc_ctr),True,False
+    value,relative,externals=evaluate_expression_with_externals(target)
+    if externals:
+        return None,False,True
+    return value,relative,False
+
+#********************************************************************
+#*** FUNCTION : pass1_statement                                     ***
+#********************************************************************
+#*** DESCRIPTION : Pass 1 work for one statement: defines its label,***
+#***               records it and advances LOCCTR.                 ***
+#*** INPUT ARGS : line_counter (int), label (str), opcode (str),    ***
+#***              operand (str), line (str)                         ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : bool True once END is reached                         ***
+#********************************************************************
+def pass1_statement(line_counter, label, opcode, operand, line):
+    global location_counter, program_name, start_processed
+    if opcode == "START" and operand and not start_processed:
+        if label:
+            define_symbol(label, int(operand.replace('#', ''), 16))
+            program_name = label
+            resolve_waiting_equs(label)
+        handle_start_directive(operand)
+        start_processed = True
+        pass1_records.append(line_parser.LineRecord(line_counter, location_counter,
+                                                    label, opcode, operand, line))
+        return False
+
+    if opcode == "CSECT":
+        begin_control_section(line_counter, label)
+        pass1_records.append(line_parser.LineRecord(line_counter, location_counter,
+                                                    label, opcode, operand, line))
+        return False
+
+    if label and opcode != "EQU":
+        define_symbol(label, location_counter)
+        resolve_waiting_equs(label)
+
+    record = line_parser.LineRecord(line_counter, location_counter, label, opcode, operand, line)
+    pass1_records.append(record)
+
+    line_loc = location_counter
+    if opcode == "END":
+        return True
+    elif opcode == "LTORG":
+        emit_literal_pool(line_counter)
+    elif opcode in directives_list:
+        process_directive(label, opcode, operand)
+    elif opcode.startswith('+'):
+        stripped_opcode = opcode[1:]
+        if stripped_opcode in opcode_table:
+            location_counter += 4
+    elif opcode in opcode_table:
+        location_counter += opcode_table[opcode].sizes[0]
+
+    if opcode != "LTORG":
+        record.size = location_counter - line_loc
+    if operand and operand.strip().startswith('='):
+        process_literal(operand.strip(), line_loc, opcode.startswith('+'))
+    return False
+
+#********************************************************************
+#*** FUNCTION : static_size                                         ***
+#********************************************************************
+#*** DESCRIPTION : Size of a statement that can be known without    ***
+#***               the symbol table or LOCCTR. None marks lines    ***
+#***               that need the serial pass 1 handlers: START,    ***
+#***               END, EQU, BASE, EXTDEF/EXTREF, LTORG and RESB/  ***
+#***               RESW whose operand is not a plain number.       ***
+#*** INPUT ARGS : opcode (str), operand (str)                       ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : int or None                                           ***
+#********************************************************************
+def static_size(opcode, operand):
+    if opcode is None:
+        return None
+    if opcode.startswith('+'):
+        return 4 if opcode[1:] in opcode_table else 0
+    info = opcode_table.get(opcode)
+    if info is not None:
+        return info.sizes[0]
+    if opcode == "WORD":
+        return 3
+    if opcode == "BYTE":
+        return byte_length(operand) if operand else None
+    if opcode in ("RESB", "RESW") and operand:
+        count = operand[1:] if operand.startswith('#') else operand
+        if count.isdigit():
+            return int(count) if opcode == "RESB" else 3 * int(count)
+        return None
+    if opcode in directives_list:
+        return None
+    return 0
+
+#********************************************************************
+#*** FUNCTION : init_pass1_worker                                   ***
+#********************************************************************
+#*** DESCRIPTION : Loads the opcode table (and so the line parser)  ***
+#***               into a pass 1 pool worker.                      ***
+#*** INPUT ARGS : filename (str)                                    ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : None                                                  ***
+#********************************************************************
+def init_pass1_worker(filename):
+    read_opcode_file(filename)
+
+#********************************************************************
+#*** FUNCTION : size_chunk                                          ***
+#********************************************************************
+#*** DESCRIPTION : Pool task: parses a run of source lines and      ***
+#***               gives each statement its offset from the start  ***
+#***               of the chunk (a prefix sum of the static sizes).***
+#*** INPUT ARGS : chunk (list of (line number, str))               ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : (list of statement tuples, total size, bool static)   ***
+#***          statement tuple: (line, label, opcode, operand, code, ***
+#***          offset, size)                                         ***
+#********************************************************************
+def size_chunk(chunk):
+    statements = []
+    offset = 0
+    static = True
+    for line_counter, raw_line in chunk:
+        parsed = source_parser.parse(raw_line)
+        if parsed.label is None and parsed.opcode is None:
+            continue
+        size = static_size(parsed.opcode, parsed.operand)
+        if size is None:
+            static = False
+            size = 0
+        statements.append((line_counter, parsed.label, parsed.opcode, parsed.operand,
+                           parsed.code, offset, size))
+        offset += size
+    return statements, offset, static
+
+#********************************************************************
+#*** FUNCTION : pass1_parallel                                      ***
+#********************************************************************
+#*** DESCRIPTION : Parses and sizes chunks of the source in a pool, ***
+#***               then walks the chunks in order. A chunk of only ***
+#***               static sizes is placed at the running LOCCTR in ***
+#***               one step from its offsets; a chunk holding any  ***
+#***               other line falls back to pass1_statement line   ***
+#***               by line.                                        ***
+#*** INPUT ARGS : raw_lines (list of (line number, str)), jobs (int)***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : int line counter after the last line read             ***
+#********************************************************************
+def pass1_parallel(raw_lines, jobs):
+    global location_counter
+    chunk_size=max(1,-(-len(raw_lines)//(jobs*CHUNKS_PER_JOB)))
+    chunks=[raw_lines[start:start+chunk_size] for start in range(0,len(raw_lines),chunk_size)]
+    with ProcessPoolExecutor(max_workers=jobs,initializer=init_pass1_worker,
+                             initargs=(opcode_filename,)) as pool:
+        for statements,total,static in pool.map(size_chunk,chunks):
+            if static and start_processed:
+                base=location_counter
+                for line_counter,label,opcode,operand,line,offset,size in statements:
+                    loc=base+offset
+                    if label:
+                        define_symbol(label, loc)
+                        resolve_waiting_equs(label)
+                    pass1_records.append(line_parser.LineRecord(line_counter, loc, label, opcode,
+                                                                operand, line, size))
+                    if operand and operand.strip().startswith('='):
+                        process_literal(operand.strip(), loc, opcode.startswith('+'))
+                location_counter=base+total
+                continue
+            for line_counter,label,opcode,operand,line,_,_ in statements:
+                if pass1_statement(line_counter, label, opcode, operand, line):
+                    return line_counter
+    return raw_lines[-1][0]+1 if raw_lines else 1
+
+#********************************************************************
+#*** FUNCTION : write_text_intermediate_file                        ***
+#********************************************************************
+#*** DESCRIPTION : Writes the human readable test1.int: one line    ***
+#***               per record, program length, symbol and literal  ***
+#***               tables (the last three per control section).    ***
+#*** INPUT ARGS : None                                              ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : None                                                  ***
+#********************************************************************
+def write_text_intermediate_file():
+    with open(intermediate_filename,"w") as outfile:
+        for record in pass1_records:
+            outfile.write(f"{record.line_no:04}\t{record.loc_ctr:04X}\t{record.source}\n")
+        if not control_sections:
+            outfile.write(f"\nProgram Length: {program_length_pass1:04X}\n")
+    if not control_sections:
+        write_symbol_table_to_file()
+        write_literal_table_to_file()
+        return
+    for state in control_sections:
+        install_section_state(state)
+        with open(intermediate_filename,"a") as outfile:
+            outfile.write(f"\nControl Section: {program_name.upper()}\t"
+                          f"Length: {program_length_pass1:04X}\n")
+        write_symbol_table_to_file()
+        write_literal_table_to_file()
+    install_section_state(control_sections[0])
+
+#********************************************************************
+#*** FUNCTION : load_text_intermediate                              ***
+#********************************************************************
+#*** DESCRIPTION : Reads the line records back from test1.int. The  ***
+#***               text file has no size column, so each size is   ***
+#***               the distance to the next record's address (to   ***
+#***               the section's end for its last record).         ***
+#*** INPUT ARGS : filename (str)                                    ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : list of LineRecord                                    ***
+#********************************************************************
+def load_text_intermediate(filename):
+    with open(filename,'r') as inter_file:
+        lines=inter_file.readlines()
+
+    content_lines=[]
+    for line in lines:
+        if line.strip()=="Symbol Table:":
+            break
+        content_lines.append(line)
+
+    loaded=[]
+    for line in content_lines:
+        if not line.strip() or line.startswith("---") or line.startswith("Program Length"):
+            continue
+        if re.match(r'^\d+\t',line):
+            parts=line.strip().split('\t',2)
+            if len(parts)>=3:
+                source_line=parts[2]
+                label,opcode,operand=split_source_line(source_line)
+                loaded.append(line_parser.LineRecord(int(parts[0]),int(parts[1],16),
+                                                     label,opcode,operand,source_line))
+    for record,next_record in zip(loaded,loaded[1:]):
+        record.size=next_record.loc_ctr-record.loc_ctr
+    if control_sections:
+        for state,run in zip(control_sections,section_runs(loaded)):
+            run[-1].size=state['start_address']+state['program_length']-run[-1].loc_ctr
+    elif loaded and loaded[-1].opcode=='*':
+        loaded[-1].size=literal_table[loaded[-1].operand]['length']
+    return loaded
+
+#********************************************************************
+#*** FUNCTION : load_binary_intermediate                            ***
+#********************************************************************
+#*** DESCRIPTION : Reads the pre-split line records from the binary ***
+#***               intermediate file through mmap.                 ***
+#*** INPUT ARGS : filename (str)                                    ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : list of LineRecord                                    ***
+#********************************************************************
+def load_binary_intermediate(filename):
+    loaded=[]
+    with binary_intermediate.BinaryIntermediateReader(filename) as reader:
+        for line_no,loc_ctr,size,_,label,opcode,operand,source_line in reader.records():
+            loaded.append(line_parser.LineRecord(line_no,loc_ctr,label,opcode,
+                                                 operand,source_line,size))
+    return loaded
+
+#********************************************************************
+#*** FUNCTION : pass2                                               ***
+#********************************************************************
+#*** DESCRIPTION : Pass 2: Generates object code and writes files.  ***
+#***               Given pass 1's records it skips the intermediate***
+#***               file entirely.                                  ***
+#*** INPUT ARGS : source_filename (str), records (list or None)     ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : None                                                  ***
+#********************************************************************
+def pass2(source_filename, records=None):
+    lst_filename=source_filename.replace('.asm','.lst')
+    obj_filename=source_filename.replace('.asm','.obj')
+
+    if listing_mode != "none":
+        with open(lst_filename,'w') as lst_file:
+            lst_file.write("")
+    with open(obj_filename,'w') as obj_file:
+        obj_file.write("")
+
+    if records is None:
+        with timed_phase("intermediate load"):
+            if intermediate_format == "binary":
+                records=load_binary_intermediate(binary_intermediate_filename)
+            else:
+                records=load_text_intermediate(intermediate_filename)
+    with timed_phase("pass 2 encode"):
+        if listing_mode == "stream":
+            with open(lst_filename,'w') as lst_file:
+                encode_records(records, worker_jobs, lst_file)
+        else:
+            encode_records(records, worker_jobs)
+    if phase_stats is not None:
+        count_statements(phase_stats)
+
+    if listing_mode != "none":
+        with timed_phase("listing write"):
+            with open(lst_filename,'a') as lst_file:
+                lines=symbol_table_listing() if listing_mode == "stream" else listing_lines()
+                for text in lines:
+                    lst_file.write(text+"\n")
+
+    with timed_phase("object write"):
+        write_object_program(obj_filename)
+
+#********************************************************************
+#*** FUNCTION : encode_records                                      ***
+#********************************************************************
+#*** DESCRIPTION : Resolves a pending BASE, takes the line records  ***
+#***               as the intermediate lines and fills in their    ***
+#***               object code. Given a listing file, each line's  ***
+#***               listing entry is written as soon as it is       ***
+#***               encoded (after the merge when jobs > 1 or the   ***
+#***               source has control sections).                   ***
+#*** INPUT ARGS : records (list of LineRecord), jobs (int),         ***
+#***              listing_file (open file or None)                  ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : None                                                  ***
+#********************************************************************
+def encode_records(records, jobs=1, listing_file=None):
+    global base_register
+    base_register=base_address()
+
+    intermediate_lines.extend(records)
+    if control_sections:
+        encode_sections(intermediate_lines, jobs)
+        if listing_file is not None:
+            for line in intermediate_lines:
+                listing_file.write(listing_line(line)+"\n")
+    elif jobs > 1:
+        encode_lines_parallel(intermediate_lines, jobs)
+        if listing_file is not None:
+            for line in intermediate_lines:
+                listing_file.write(listing_line(line)+"\n")
+    elif listing_file is not None:
+        for line in intermediate_lines:
+            line.object_code=encode_statement(line.opcode,line.operand,line.loc_ctr)
+            listing_file.write(listing_line(line)+"\n")
+    else:
+        for line in intermediate_lines:
+            line.object_code=encode_statement(line.opcode,line.operand,line.loc_ctr)
+
+#********************************************************************
+#*** FUNCTION : base_address                                        ***
+#********************************************************************
+#*** DESCRIPTION : Value of the base register: BASE records its     ***
+#***               symbol as ('PENDING', name) until it is looked  ***
+#***               up here.                                        ***
+#*** INPUT ARGS : None                                              ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : int or None                                           ***
+#********************************************************************
+def base_address():
+    if base_register and isinstance(base_register,tuple) and base_register[0]=='PENDING':
+        symbol_name=base_register[1]
+        if symbol_name in symbol_table and symbol_table[symbol_name]['address'] is not None:
+            return symbol_table[symbol_name]['address']
+        return None
+    return base_register
+
+#********************************************************************
+#*** FUNCTION : listing_lines                                       ***
+#********************************************************************
+#*** DESCRIPTION : Builds the assembly listing: one line per record ***
+#***               followed by the symbol table.                   ***
+#*** INPUT ARGS : None                                              ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : list of str                                           ***
+#********************************************************************
+def listing_lines():
+    listing=[listing_line(line) for line in intermediate_lines]
+    listing.extend(symbol_table_listing())
+    return listing
+
+#********************************************************************
+#*** FUNCTION : listing_line                                        ***
+#********************************************************************
+#*** DESCRIPTION : Listing entry of one encoded record.             ***
+#*** INPUT ARGS : line (LineRecord)                                 ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : str                                                   ***
+#********************************************************************
+def listing_line(line):
+    lbl=line.label or ''
+    opc=(line.opcode or '').upper()
+    opr=line.operand or ''
+
+    label_str = (lbl+":") if lbl else ""
+    return f"{line.loc_ctr:05X} {label_str:<8}{opc:<8}{opr:<15}{line.object_code.hex().upper()}"
+
+#********************************************************************
+#*** FUNCTION : symbol_table_listing                                ***
+#********************************************************************
+#*** DESCRIPTION : The sorted symbol table that ends the listing,   ***
+#***               after a blank line; one per control section,    ***
+#***               titled with its name, when there are CSECTs.    ***
+#*** INPUT ARGS : None                                              ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : list of str                                           ***
+#********************************************************************
+def symbol_table_listing():
+    if not control_sections:
+        return symbol_listing("SYMBOL TABLE", symbol_table)
+    listing=[]
+    for state in control_sections:
+        listing.extend(symbol_listing(f"SYMBOL TABLE {state['program_name'].upper()}",
+                                      state['symbol_table']))
+    return listing
+
+#********************************************************************
+#*** FUNCTION : symbol_listing                                      ***
+#********************************************************************
+#*** DESCRIPTION : One titled, sorted symbol table for the listing. ***
+#*** INPUT ARGS : title (str), table (dict)                         ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : list of str                                           ***
+#********************************************************************
+def symbol_listing(title, table):
+    listing=[]
+    listing.append("")
+    listing.append(title)
+    listing.append("SYMBOL VALUE RFLAG MFLAG IOFLAG")
+
+    for sym in sorted(table.keys()):
+        info = table[sym]
+        val = info['address']
+        if val is None:
+            val_str = "0"
+        else:
+            val_str = f"{val:X}".upper().lstrip('0')
+            if val_str == '':
+                val_str = '0'
+        rflag = "TRUE" if info['relative'] else "FALSE"
+        mflag = "FALSE"
+        ioflag = "EXTERNAL" if info.get('external') else "INTERNAL"
+        listing.append(f"{sym.upper()} {val_str:<4} {rflag:<5} {mflag:<5} {ioflag}")
+    return listing
+
+#********************************************************************
+#*** FUNCTION : encode_sections                                     ***
+#********************************************************************
+#*** DESCRIPTION : Pass 2 for a source with control sections. Each  ***
+#***               section is encoded with its own tables and keeps***
+#***               its lines and M records in its state; with      ***
+#***               jobs > 1 the sections (split into chunks that   ***
+#***               never cross a section) are encoded concurrently ***
+#***               in a process pool. The first section is         ***
+#***               installed again at the end.                     ***
+#*** INPUT ARGS : lines (list of LineRecord), jobs (int)            ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : None                                                  ***
+#********************************************************************
+def encode_sections(lines, jobs):
+    runs=section_runs(lines)
+    if jobs > 1:
+        encode_sections_parallel(runs, jobs)
+    else:
+        for state,run in zip(control_sections,runs):
+            install_section_state(state)
+            modification_records.clear()
+            for line in run:
+                line.object_code=encode_statement(line.opcode,line.operand,line.loc_ctr)
+            state['modification_records']=list(modification_records)
+    for state,run in zip(control_sections,runs):
+        state['lines']=run
+    install_section_state(control_sections[0])
+
+#********************************************************************
+#*** FUNCTION : encode_sections_parallel                            ***
+#********************************************************************
+#*** DESCRIPTION : Encodes section chunks in a process pool; every  ***
+#***               worker gets all section states once and         ***
+#***               installs the one each chunk belongs to. Results ***
+#***               come back in source order.                      ***
+#*** INPUT ARGS : runs (list of lists of LineRecord), jobs (int)    ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : None                                                  ***
+#********************************************************************
+def encode_sections_parallel(runs, jobs):
+    total=sum(len(run) for run in runs)
+    chunk_size=max(1,-(-total//(jobs*CHUNKS_PER_JOB)))
+    tasks=[]
+    chunk_lines=[]
+    for index,run in enumerate(runs):
+        for start in range(0,len(run),chunk_size):
+            chunk=run[start:start+chunk_size]
+            tasks.append((index,[(line.opcode,line.operand,line.loc_ctr) for line in chunk]))
+            chunk_lines.append(chunk)
+    for state in control_sections:
+        state['modification_records']=[]
+    with ProcessPoolExecutor(max_workers=jobs,initializer=init_section_worker,
+                             initargs=(opcode_filename,control_sections)) as pool:
+        for (index,_),chunk,(codes,mod_records) in zip(tasks,chunk_lines,
+                                                       pool.map(encode_section_chunk,tasks)):
+            for line,code in zip(chunk,codes):
+                line.object_code=code
+            control_sections[index]['modification_records'].extend(mod_records)
+
+#********************************************************************
+#*** FUNCTION : init_section_worker                                 ***
+#********************************************************************
+#*** DESCRIPTION : Loads the opcode table and every section's state ***
+#***               into a pass 2 pool worker.                      ***
+#*** INPUT ARGS : filename (str), states (list of dict)             ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : None                                                  ***
+#********************************************************************
+def init_section_worker(filename, states):
+    global installed_section
+    read_opcode_file(filename)
+    worker_sections[:]=states
+    installed_section=None
+
+#********************************************************************
+#*** FUNCTION : encode_section_chunk                                ***
+#********************************************************************
+#*** DESCRIPTION : Pool task: installs the chunk's section if the   ***
+#***               worker has another one and encodes the chunk.   ***
+#*** INPUT ARGS : task ((int section index, list of statements))    ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : (list of bytes, list of str)                          ***
+#********************************************************************
+def encode_section_chunk(task):
+    global installed_section
+    index,statements=task
+    if installed_section!=index:
+        install_section_state(worker_sections[index])
+        installed_section=index
+    return encode_chunk(statements)
+
+#********************************************************************
+#*** FUNCTION : encode_statement                                    ***
+#********************************************************************
+#*** DESCRIPTION : Object code for one statement. WORD operands may ***
+#***               append modification records.                    ***
+#*** INPUT ARGS : opcode (str), operand (str), loc_ctr (int)        ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : bytes                                                 ***
+#********************************************************************
+def encode_statement(opcode, operand, loc_ctr):
+    if opcode=='*':
+        return literal_object_code(operand)
+    elif opcode=="BYTE":
+        return process_byte_operand(operand)
+    elif opcode=="WORD":
+        return process_word_operand(operand, loc_ctr)
+    elif opcode in directives_list or opcode is None:
+        return b''
+    elif opcode in opcode_table or (opcode.startswith('+') and opcode[1:] in opcode_table):
+        return generate_object_code(opcode,operand,loc_ctr)
+    return b''
+
+#********************************************************************
+#*** FUNCTION : init_encode_worker                                  ***
+#********************************************************************
+#*** DESCRIPTION : Loads the pass 1 tables into a pool worker so it ***
+#***               encodes exactly like the parent process.        ***
+#*** INPUT ARGS : state (dict)                                      ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : None                                                  ***
+#********************************************************************
+def init_encode_worker(state):
+    read_opcode_file(state['opcode_filename'])
+    install_section_state(state)
+
+#********************************************************************
+#*** FUNCTION : encode_chunk                                        ***
+#********************************************************************
+#*** DESCRIPTION : Pool task: encodes a run of statements and hands ***
+#***               back their object code and the M records they   ***
+#***               produced, in order.                             ***
+#*** INPUT ARGS : statements (list of (opcode, operand, locctr))    ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : (list of bytes, list of str)                          ***
+#********************************************************************
+def encode_chunk(statements):
+    modification_records.clear()
+    codes=[encode_statement(opcode,operand,loc_ctr) for opcode,operand,loc_ctr in statements]
+    return codes, list(modification_records)
+
+#********************************************************************
+#*** FUNCTION : encode_lines_parallel                               ***
+#********************************************************************
+#*** DESCRIPTION : Splits the lines into contiguous chunks, encodes ***
+#***               them in a process pool and merges the object    ***
+#***               code and M records back in source order, so the ***
+#***               output matches a serial run.                    ***
+#*** INPUT ARGS : lines (list of LineRecord), jobs (int)            ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : None                                                  ***
+#********************************************************************
+def encode_lines_parallel(lines, jobs):
+    state=section_state()
+    state['opcode_filename']=opcode_filename
+    chunk_size=max(1,-(-len(lines)//(jobs*CHUNKS_PER_JOB)))
+    chunks=[[(line.opcode,line.operand,line.loc_ctr) for line in lines[start:start+chunk_size]]
+            for start in range(0,len(lines),chunk_size)]
+    position=0
+    with ProcessPoolExecutor(max_workers=jobs,initializer=init_encode_worker,initargs=(state,)) as pool:
+        for codes,mod_records in pool.map(encode_chunk,chunks):
+            for code in codes:
+                lines[position].object_code=code
+                position+=1
+            modification_records.extend(mod_records)
+
+#********************************************************************
+#*** FUNCTION : process_byte_operand                                ***
+#********************************************************************
+#*** DESCRIPTION : Processes BYTE operand to produce object code.   ***
+#*** INPUT ARGS : operand (str)                                     ***
+#*** OUTPUT ARGS : bytes                                            ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : bytes                                                 ***
+#********************************************************************
+def process_byte_operand(operand):
+    if operand.upper().startswith('0X'):
+        return hex_bytes(operand[2:])
+    elif operand.upper().startswith('0C'):
+        return char_bytes(operand[2:])
+    elif operand.upper().startswith('C\''):
+        return char_bytes(operand[2:-1])
+    elif operand.upper().startswith('X\''):
+        return hex_bytes(operand[2:-1])
+    return b''
+
+#********************************************************************
+#*** FUNCTION : hex_bytes                                           ***
+#********************************************************************
+#*** DESCRIPTION : Converts hex digits to bytes. An odd digit count ***
+#***               or a non-hex digit gives no bytes, matching the ***
+#***               zero length pass 1 assigns.                     ***
+#*** INPUT ARGS : digits (str)                                      ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : bytes                                                 ***
+#********************************************************************
+def hex_bytes(digits):
+    try:
+        return bytes.fromhex(digits)
+    except ValueError:
+        return b''
+
+#********************************************************************
+#*** FUNCTION : char_bytes                                          ***
+#********************************************************************
+#*** DESCRIPTION : Converts character constant text to one byte per ***
+#***               character.                                      ***
+#*** INPUT ARGS : chars (str)                                       ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : bytes                                                 ***
+#********************************************************************
+def char_bytes(chars):
+    return chars.encode('latin-1', errors='replace')
+
+#********************************************************************
+#*** FUNCTION : process_word_operand                                ***
+#********************************************************************
+#*** DESCRIPTION : Processes WORD operand and handles extern refs.  ***
+#***               The program name is added or subtracted once per***
+#***               net relative term (A-B needs no M record, -A    ***
+#***               needs a '-' one); each external reference gets  ***
+#***               its own record with its sign.                   ***
+#*** INPUT ARGS : operand (str), loc_ctr (int)                      ***
+#*** OUTPUT ARGS : bytes                                            ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : bytes                                                 ***
+#********************************************************************
+def process_word_operand(operand, loc_ctr):
+    try:
+        result = expressions.evaluate(clean_operand(operand), lookup_operand_symbol)
+    except expressions.ExpressionError:
+        return b''
+    obj_code = (result.value & 0xFFFFFF).to_bytes(3, 'big')
+    add_modification_records(loc_ctr, "06", result.reloc, result.externals)
+    return obj_code
+
+#********************************************************************
+#*** FUNCTION : add_modification_records                            ***
+#********************************************************************
+#*** DESCRIPTION : M records for one field: the program (section)   ***
+#***               name once per net relative term, with its sign, ***
+#***               and one per external reference. The name is cut ***
+#***               to 6 characters, as in the H record.            ***
+#*** INPUT ARGS : address (int), length (str half-bytes), reloc     ***
+#***              (int), externals (list of (symbol, sign))         ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : None                                                  ***
+#********************************************************************
+def add_modification_records(address, length, reloc, externals):
+    sign_char = '+' if reloc > 0 else '-'
+    section = program_name[:6].upper()
+    for _ in range(abs(reloc)):
+        modification_records.append(f"M^{address:06X}^{length}{sign_char}{section}")
+    for sym, ext_sign in externals:
+        modification_records.append(f"M^{address:06X}^{length}{ext_sign}{sym.upper()}")
+
+#********************************************************************
+#*** FUNCTION : format4_modification_records                        ***
+#********************************************************************
+#*** DESCRIPTION : M records for the 20-bit address field of a      ***
+#***               format 4 instruction whose target is relative   ***
+#***               (a symbol, expression or literal) or external.  ***
+#***               Constants need none.                            ***
+#*** INPUT ARGS : operand (str), loc_ctr (int)                      ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : None                                                  ***
+#********************************************************************
+def format4_modification_records(operand, loc_ctr):
+    target = encoders.parse_operand(operand).target
+    if not target or target.isdigit():
+        return
+    if target.startswith('='):
+        add_modification_records(loc_ctr + 1, "05", 1, ())
+        return
+    try:
+        result = expressions.evaluate(clean_operand(target), lookup_operand_symbol)
+    except expressions.ExpressionError:
+        return
+    add_modification_records(loc_ctr + 1, "05", result.reloc, result.externals)
+
+#********************************************************************
+#*** FUNCTION : resolve_target_address                              ***
+#********************************************************************
+#*** DESCRIPTION : Address an instruction operand refers to: its    ***
+#***               literal's pool copy or the expression's value   ***
+#***               (0 when it cannot be evaluated). A lone symbol  ***
+#***               is looked up directly.                          ***
+#*** INPUT ARGS : target (str), loc_ctr (int)                       ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : int, or None for an unplaced literal                  ***
+#********************************************************************
+def resolve_target_address(target, loc_ctr):
+    info = symbol_table.get(target)
+    if info is not None:
+        if info.get('external') or info['address'] is None:
+            return 0
+        return info['address']
+    if target.startswith('='):
+        return literal_address(target, loc_ctr)
+    val, _, _ = evaluate_expression_with_externals(target)
+    if val is None:
+        return 0
+    return val
+
+#********************************************************************
+#*** FUNCTION : generate_object_code                                ***
+#********************************************************************
+#*** DESCRIPTION : Generates object code for instructions through   ***
+#***               the encoder built for the mnemonic and format.  ***
+#***               Format 4 may append modification records.       ***
+#*** INPUT ARGS : opcode (str), operand (str), loc_ctr (int)        ***
+#*** OUTPUT ARGS : bytes                                            ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : bytes                                                 ***
+#********************************************************************
+def generate_object_code(opcode, operand, loc_ctr):
+    if opcode.startswith('+'):
+        encoder = encoder_table.get((opcode[1:], 4))
+    else:
+        opcode_info = opcode_table.get(opcode)
+        encoder = opcode_info and encoder_table.get((opcode, opcode_info.format))
+    if not encoder:
+        return b''
+    code = encoder.encode(operand, loc_ctr, resolve_target_address, base_register)
+    if code is None:
+        return b''
+    if encoder.format == 4:
+        format4_modification_records(operand, loc_ctr)
+    return code.to_bytes(encoder.size, 'big')
+
+#********************************************************************
+#*** FUNCTION : hex_fields                                          ***
+#********************************************************************
+#*** DESCRIPTION : Formats object code chunks as '^' separated hex  ***
+#***               for a T record.                                 ***
+#*** INPUT ARGS : chunks (list of bytes)                            ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : str                                                   ***
+#********************************************************************
+def hex_fields(chunks):
+    return '^'.join(chunk.hex().upper() for chunk in chunks)
+
+#********************************************************************
+#*** FUNCTION : object_program_records                              ***
+#********************************************************************
+#*** DESCRIPTION : Builds the object program (H, D, R, T, M, E      ***
+#***               records) from the encoded lines.                ***
+#*** INPUT ARGS : None                                              ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : list of str, one record per entry                     ***
+#********************************************************************
+def object_program_records():
+    if control_sections:
+        return section_object_records()
+    program_name_local=''
+    for line in intermediate_lines:
+        if line.opcode=='START':
+            program_name_local=line.label or ''
+            break
+
+    records = [header_record(program_name_local)]
+    records.extend(definition_records())
+    records.extend(text_records(intermediate_lines))
+    records.extend(compact_modification_records(modification_records))
+    records.append(f"E^{start_address:06X}")
+    return records
+
+#********************************************************************
+#*** FUNCTION : section_object_records                              ***
+#********************************************************************
+#*** DESCRIPTION : H, D, R, T, M and E records of every control     ***
+#***               section, concatenated in source order. Only the ***
+#***               first section's E record has a start address.   ***
+#*** INPUT ARGS : None                                              ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : list of str                                           ***
+#********************************************************************
+def section_object_records():
+    records=[]
+    for number,state in enumerate(control_sections):
+        install_section_state(state)
+        records.append(header_record(program_name))
+        records.extend(definition_records())
+        records.extend(text_records(state['lines']))
+        records.extend(compact_modification_records(modification_records))
+        records.append(f"E^{start_address:06X}" if number==0 else "E")
+    install_section_state(control_sections[0])
+    return records
+
+#********************************************************************
+#*** FUNCTION : header_record                                       ***
+#********************************************************************
+#*** DESCRIPTION : The H record: name, start address and length.    ***
+#*** INPUT ARGS : name (str)                                        ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : str                                                   ***
+#********************************************************************
+def header_record(name):
+    if not name:
+        name = '      '
+    return f"H^{name[:6].upper()}^{start_address:06X}^{program_length_pass1:06X}"
+
+#********************************************************************
+#*** FUNCTION : definition_records                                  ***
+#********************************************************************
+#*** DESCRIPTION : The D record of defined EXTDEF symbols and the R ***
+#***               record of referenced EXTREF symbols, if any.    ***
+#*** INPUT ARGS : None                                              ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : list of str                                           ***
+#********************************************************************
+def definition_records():
+    records = []
+    extdef_list = []
+    extref_list = []
+    for s, info in symbol_table.items():
+        if info.get('extdef'):
+            if info['address'] is not None:
+                extdef_list.append((s, info['address']))
+        if info.get('external') and info.get('referenced'):
+            extref_list.append(s)
+
+    if extdef_list:
         d_record = "D"
         for (sym, addr) in extdef_list:
             d_record += f"^{sym.upper()}^{addr:06X}"
-        d_record += "\n"
+        records.append(d_record)
 
-    r_record = ''
     if extref_list:
         r_record = 'R'
         for sym in extref_list:
             r_record += f"^{sym.upper()}"
-        r_record += "\n"
+        records.append(r_record)
+    return records
 
-    text_records = []
-    current_record_codes = []
-    current_start = None
-    current_length = 0
-
-    for line in intermediate_lines:
-        loc = line['loc_ctr']
-        obj = line['object_code']
-        if obj:
-            if current_start is None:
-                current_start = loc
-                current_record_codes = []
-                current_length = 0
-            obj_len = len(obj) // 2
-            if current_length + obj_len > 30:
-                record_data = '^'.join(current_record_codes)
-                text_records.append(f"T^{current_start:06X}^{current_length:02X}^{record_data}\n")
-                current_start = loc
-                current_record_codes = [obj]
-                current_length = obj_len
-            else:
-                current_record_codes.append(obj)
-                current_length += obj_len
-        else:
-            if current_start is not None:
-                record_data = '^'.join(current_record_codes)
-                text_records.append(f"T^{current_start:06X}^{current_length:02X}^{record_data}\n")
-                current_start = None
-                current_length = 0
-                current_record_codes = []
-
-    if current_start is not None:
-        record_data = '^'.join(current_record_codes)
-        text_records.append(f"T^{current_start:06X}^{current_length:02X}^{record_data}\n")
-
-    formatted_mod_records = ''
-    for mod in modification_records:
-        match = re.match(r'M([0-9A-Fa-f]{6})([0-9A-Fa-f]{2})([\+\-].+)', mod)
-        if match:
-            addr_hex = match.group(1)
-            length_hex = match.group(2)
-            symbol_part = match.group(3)
-            formatted_mod_records += f"M^{addr_hex}^{length_hex}{symbol_part}\n"
-        else:
-            formatted_mod_records += mod + '\n'
+#********************************************************************
+#*** FUNCTION : text_records                                        ***
+#********************************************************************
+#*** DESCRIPTION : Packs object code into T records. A record ends  ***
+#***               only at a real address gap (RESB/RESW, or a     ***
+#***               literal pool elsewhere) or when it is full;     ***
+#***               lines without code that take no space (BASE,    ***
+#***               EQU, EXTDEF...) do not break it. Records are    ***
+#***               filled to T_RECORD_LIMIT bytes, so an           ***
+#***               instruction may continue in the next record.    ***
+#*** INPUT ARGS : lines (list of LineRecord)                        ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : list of str                                           ***
+#********************************************************************
+def text_records(lines):
+    packer = TextRecordPacker()
+    records = []
+    for line in lines:
+        if line.object_code:
+            packer.add(line.loc_ctr, line.object_code, records)
+    packer.flush(records)
+    return records
+
+class TextRecordPacker:
+    #********************************************************************
+    #*** FUNCTION : __init__                                            ***
+    #********************************************************************
+    #*** DESCRIPTION : Incremental T record builder used by            ***
+    #***               text_records and by the streaming assembler.    ***
+    #*** INPUT ARGS : None                                              ***
+    #*** OUTPUT ARGS : None                                             ***
+    #*** IN/OUT ARGS : None                                             ***
+    #*** RETURN : None                                                  ***
+    #********************************************************************
+    def __init__(self):
+        self.chunks = []
+        self.start = None
+        self.length = 0
+
+    #********************************************************************
+    #*** FUNCTION : add                                                 ***
+    #********************************************************************
+    #*** DESCRIPTION : Adds one line's code at its address, appending  ***
+    #***               each record this completes to finished.         ***
+    #*** INPUT ARGS : loc (int), obj (bytes)                            ***
+    #*** OUTPUT ARGS : None                                             ***
+    #*** IN/OUT ARGS : finished (list of str)                           ***
+    #*** RETURN : None                                                  ***
+    #********************************************************************
+    def add(self, loc, obj, finished):
+        if self.start is not None and loc != self.start + self.length:
+            self.flush(finished)
+        while obj:
+            if self.start is None:
+                self.start = loc
+                self.chunks = []
+                self.length = 0
+            piece = obj[:T_RECORD_LIMIT - self.length]
+            self.chunks.append(piece)
+            self.length += len(piece)
+            loc += len(piece)
+            obj = obj[len(piece):]
+            if self.length == T_RECORD_LIMIT:
+                self.flush(finished)
+
+    #********************************************************************
+    #*** FUNCTION : flush                                               ***
+    #********************************************************************
+    #*** DESCRIPTION : Ends the open record, if any.                    ***
+    #*** INPUT ARGS : None                                              ***
+    #*** OUTPUT ARGS : None                                             ***
+    #*** IN/OUT ARGS : finished (list of str)                           ***
+    #*** RETURN : None                                                  ***
+    #********************************************************************
+    def flush(self, finished):
+        if self.start is not None:
+            finished.append(f"T^{self.start:06X}^{self.length:02X}^{hex_fields(self.chunks)}")
+            self.start = None
+
+#********************************************************************
+#*** FUNCTION : compact_modification_records                        ***
+#********************************************************************
+#*** DESCRIPTION : Merges M records for the same address, length    ***
+#***               and symbol into their net count (a +X and a -X  ***
+#***               cancel), then sorts them by address. A net count***
+#***               above one stays as that many records, since the ***
+#***               loader must apply each.                         ***
+#*** INPUT ARGS : mods (list of str)                                ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : list of str                                           ***
+#********************************************************************
+def compact_modification_records(mods):
+    net = {}
+    other = []
+    for mod in mods:
+        match = re.fullmatch(r'M\^?([0-9A-Fa-f]{6})\^?([0-9A-Fa-f]{2})([\+\-])(.+)', mod)
+        if match is None:
+            other.append(mod)
+            continue
+        key = (int(match.group(1), 16), match.group(2).upper(), match.group(4))
+        net[key] = net.get(key, 0) + (1 if match.group(3) == '+' else -1)
 
-    end_record = f"E^{start_address:06X}\n"
+    records = []
+    for (address, length, symbol), count in sorted(net.items(), key=lambda item: item[0][0]):
+        sign = '+' if count > 0 else '-'
+        records.extend([f"M^{address:06X}^{length}{sign}{symbol}"] * abs(count))
+    return records + other
 
+#********************************************************************
+#*** FUNCTION : write_object_program                                ***
+#********************************************************************
+#*** DESCRIPTION : Writes the object program file (H, T, M, E recs).***
+#*** INPUT ARGS : obj_filename (str)                                ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : None                                                  ***
+#********************************************************************
+def write_object_program(obj_filename):
+    records = object_program_records()
     with open(obj_filename, 'w') as obj_file:
-        obj_file.write(header_record)
-        if d_record:
-            obj_file.write(d_record)
-        if r_record:
-            obj_file.write(r_record)
-        for t_rec in text_records:
-            obj_file.write(t_rec)
-        if formatted_mod_records:
-            obj_file.write(formatted_mod_records)
-        obj_file.write(end_record)
+        for record in records:
+            obj_file.write(record + "\n")
+    if phase_stats is not None:
+        phase_stats.count('text records', sum(1 for record in records if record[0] == 'T'))
+        phase_stats.count('modification records', sum(1 for record in records if record[0] == 'M'))
+
+#********************************************************************
+#*** FUNCTION : write_memory_image                                  ***
+#********************************************************************
+#*** DESCRIPTION : Writes the program as a raw memory image from    ***
+#***               the start address, with reserved space zeroed.  ***
+#***               Control sections follow one another, unrelocated***
+#***               (each one's addresses start from 0).            ***
+#*** INPUT ARGS : image_filename (str)                              ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : None                                                  ***
+#********************************************************************
+def write_memory_image(image_filename):
+    if control_sections:
+        image = bytearray()
+        for state in control_sections:
+            image += memory_image(state['lines'], state['start_address'], state['program_length'])
+    else:
+        image = memory_image(intermediate_lines, start_address, program_length_pass1)
+    with open(image_filename, 'wb') as image_file:
+        image_file.write(image)
+
+#********************************************************************
+#*** FUNCTION : memory_image                                        ***
+#********************************************************************
+#*** DESCRIPTION : One program or section as raw bytes from its     ***
+#***               start address.                                  ***
+#*** INPUT ARGS : lines (list of LineRecord), start (int),          ***
+#***              length (int)                                      ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : bytearray                                             ***
+#********************************************************************
+def memory_image(lines, start, length):
+    image = bytearray(length)
+    for line in lines:
+        obj = line.object_code
+        if obj:
+            offset = line.loc_ctr - start
+            if offset < 0:
+                continue
+            if offset + len(obj) > len(image):
+                image.extend(bytes(offset + len(obj) - len(image)))
+            image[offset:offset + len(obj)] = obj
+    return image
 
 #********************************************************************
 #*** FUNCTION : write_symbol_table_to_file                          ***
@@ -965,7 +2160,7 @@ def write_object_program(obj_filename):
 #*** RETURN : None                                                  ***
 #********************************************************************
 def write_symbol_table_to_file():
-    with open("test1.int","a") as file:
+    with open(intermediate_filename,"a") as file:
         file.write("\nSymbol Table:\nSYMBOL\tValue\tRFLAG\tMFLAG\tIOFLAG\n")
         for symbol,info in symbol_table.items():
             rflag='TRUE' if info['relative'] else 'FALSE'
@@ -987,17 +2182,45 @@ def write_symbol_table_to_file():
 #*** RETURN : None                                                  ***
 #********************************************************************
 def write_literal_table_to_file():
-    with open("test1.int","a") as file:
+    with open(intermediate_filename,"a") as file:
         file.write("\nLiteral Table:\nLITERAL\tVALUE\tLENGTH\tADDRESS\n")
-        for literal,info in literal_table.items():
-            operand_value=info['operand_value']
-            if operand_value.upper().startswith('C'):
-                chars=operand_value[1:]
-                val_str=''.join(f"{ord(c):02X}" for c in chars)
-                file.write(f"=C'{chars}'\t{val_str}\t{info['length']}\t{info['address']:X}\n")
-            elif operand_value.upper().startswith('X'):
-                val_str=operand_value[1:].upper()
-                file.write(f"=X'{val_str}'\t{val_str}\t{info['length']}\t{info['address']:X}\n")
+        for pool in literal_pools:
+            for literal,address in pool['addresses'].items():
+                info=literal_table[literal]
+                operand_value=info['operand_value']
+                if operand_value.upper().startswith('C'):
+                    chars=operand_value[1:]
+                    val_str=''.join(f"{ord(c):02X}" for c in chars)
+                    file.write(f"=C'{chars}'\t{val_str}\t{info['length']}\t{address:X}\n")
+                elif operand_value.upper().startswith('X'):
+                    val_str=operand_value[1:].upper()
+                    file.write(f"=X'{val_str}'\t{val_str}\t{info['length']}\t{address:X}\n")
+    write_literal_pool_report()
+
+#********************************************************************
+#*** FUNCTION : write_literal_pool_report                           ***
+#********************************************************************
+#*** DESCRIPTION : Writes pool sizes and per-literal reference      ***
+#***               counts to the intermediate file.                ***
+#*** INPUT ARGS : None                                              ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : None                                                  ***
+#********************************************************************
+def write_literal_pool_report():
+    if not literal_pools:
+        return
+    references={}
+    for operand,pool_no in literal_refs.values():
+        references[(operand,pool_no)]=references.get((operand,pool_no),0)+1
+    with open(intermediate_filename,"a") as file:
+        file.write("\nLiteral Pools:\nPOOL\tADDRESS\tSIZE\tLITERALS\n")
+        for pool_no,pool in enumerate(literal_pools):
+            file.write(f"{pool_no+1}\t{pool['address']:X}\t{pool['size']}\t{len(pool['addresses'])}\n")
+        file.write("LITERAL\tPOOL\tADDRESS\tREFERENCES\n")
+        for pool_no,pool in enumerate(literal_pools):
+            for literal,address in pool['addresses'].items():
+                file.write(f"{literal}\t{pool_no+1}\t{address:X}\t{references.get((literal,pool_no),0)}\n")
 
 #********************************************************************
 #*** FUNCTION : print_pass_outputs                                  ***
@@ -1008,22 +2231,28 @@ def write_literal_table_to_file():
 #*** IN/OUT ARGS : None                                             ***
 #*** RETURN : None                                                  ***
 #********************************************************************
-def print_pass_outputs(source_filename):
-    print("\n--- test1.int Contents (After Pass 1) ---")
-    with open("test1.int","r") as f:
-        print(f.read())
-    print("--- End of test1.int ---")
+def print_pass_outputs(source_filename, show_intermediate=True):
+    if not show_intermediate:
+        print("\n(intermediate file not rebuilt: outputs restored from the assembly cache)")
+    elif write_text_intermediate or intermediate_format == "text":
+        print(f"\n--- {intermediate_filename} Contents (After Pass 1) ---")
+        with open(intermediate_filename,"r") as f:
+            print(f.read())
+        print(f"--- End of {intermediate_filename} ---")
+    elif intermediate_format == "binary":
+        print(f"\n--- {binary_intermediate_filename} (binary, {len(pass1_records)} records) ---")
 
     lst_filename = source_filename.replace('.asm', '.lst')
     obj_filename = source_filename.replace('.asm', '.obj')
 
-    print(f"\n--- {lst_filename} Contents (After Pass 2) ---")
-    try:
-        with open(lst_filename,'r') as lst_file:
-            print(lst_file.read())
-    except FileNotFoundError:
-        print("No .lst file found.")
-    print(f"--- End of {lst_filename} ---")
+    if listing_mode != "none":
+        print(f"\n--- {lst_filename} Contents (After Pass 2) ---")
+        try:
+            with open(lst_filename,'r') as lst_file:
+                print(lst_file.read())
+        except FileNotFoundError:
+            print("No .lst file found.")
+        print(f"--- End of {lst_filename} ---")
 
     print(f"\n--- {obj_filename} Contents (After Pass 2) ---")
     try:
@@ -1033,6 +2262,196 @@ def print_pass_outputs(source_filename):
         print("No .obj file found.")
     print(f"--- End of {obj_filename} ---")
 
+#********************************************************************
+#*** FUNCTION : reset_assembler_state                               ***
+#********************************************************************
+#*** DESCRIPTION : Clears everything one assembly leaves in the     ***
+#***               module globals so the next file starts fresh.   ***
+#*** INPUT ARGS : None                                              ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : None                                                  ***
+#********************************************************************
+def reset_assembler_state():
+    global location_counter, start_address, base_register, program_name
+    global program_length_pass1, start_processed
+    for table in (symbol_table, literal_table, literal_refs, pending_equs, equ_waiters):
+        table.clear()
+    for items in (literal_queue, literal_pools, intermediate_lines, modification_records,
+                  pass1_records, diagnostics, control_sections):
+        items.clear()
+    location_counter = 0
+    start_address = 0
+    base_register = None
+    program_name = ""
+    program_length_pass1 = 0
+    start_processed = False
+
+#********************************************************************
+#*** FUNCTION : output_filenames                                    ***
+#********************************************************************
+#*** DESCRIPTION : Output files of one source, by suffix. The      ***
+#***               intermediate files are outputs too, so a cache  ***
+#***               hit leaves them matching the restored program.  ***
+#*** INPUT ARGS : source_filename (str), image (bool),              ***
+#***              listing (bool)                                    ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : dict suffix -> filename                               ***
+#********************************************************************
+def output_filenames(source_filename, image=False, listing=True):
+    outputs={}
+    if listing:
+        outputs['.lst']=source_filename.replace('.asm','.lst')
+    outputs['.obj']=source_filename.replace('.asm','.obj')
+    if image:
+        outputs['.img']=source_filename.replace('.asm','.img')
+    if write_text_intermediate or intermediate_format == "text":
+        outputs['.int']=intermediate_filename
+    if intermediate_format == "binary":
+        outputs['.bin']=binary_intermediate_filename
+    return outputs
+
+#********************************************************************
+#*** FUNCTION : run_assembly                                        ***
+#********************************************************************
+#*** DESCRIPTION : Restores a file's outputs from the cache, or     ***
+#***               runs both passes and stores them.               ***
+#*** INPUT ARGS : source_filename (str), outputs (dict),            ***
+#***              cache (AssemblyCache or None), jobs (int)         ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : (list of diagnostics, bool restored from cache)       ***
+#********************************************************************
+def run_assembly(source_filename, outputs, cache, jobs=1):
+    key=None
+    if cache is not None:
+        with timed_phase("cache lookup"):
+            options=tuple(outputs)+(("relax",) if relax_mode else ())
+            key=cache.make_key(source_filename, opcode_filename, ASSEMBLER_VERSION, options)
+            entry=cache.lookup(key)
+            restored=entry is not None and cache.restore(entry, outputs)
+        if restored:
+            return entry['diagnostics'], True
+
+    with timed_phase("opcode load"):
+        read_opcode_file(opcode_filename)
+    with timed_phase("pass 1"):
+        records=pass1(source_filename, jobs)
+    pass2(source_filename, records if intermediate_format == "memory" else None)
+    if '.img' in outputs:
+        with timed_phase("image write"):
+            write_memory_image(outputs['.img'])
+    if cache is not None:
+        with timed_phase("cache store"):
+            cache.store(key, outputs, diagnostics)
+    return list(diagnostics), False
+
+#********************************************************************
+#*** FUNCTION : count_statements                                    ***
+#********************************************************************
+#*** DESCRIPTION : Adds the --stats line counters, read from the    ***
+#***               finished line records: source lines, statements,***
+#***               instructions by format and literals.            ***
+#*** INPUT ARGS : stats (AssemblyStats)                             ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : stats                                            ***
+#*** RETURN : None                                                  ***
+#********************************************************************
+def count_statements(stats):
+    formats={1: 0, 2: 0, 3: 0, 4: 0}
+    pool_entries=0
+    for line in intermediate_lines:
+        opcode=line.opcode
+        if opcode=='*':
+            pool_entries+=1
+        elif opcode.startswith('+'):
+            formats[4]+=1
+        elif opcode in opcode_table:
+            formats[opcode_table[opcode].format]+=1
+    stats.count('source lines', intermediate_lines[-1].line_no if intermediate_lines else 0)
+    stats.count('statements', len(intermediate_lines)-pool_entries)
+    for fmt,count in formats.items():
+        stats.count(f'format {fmt} instructions', count)
+    literals=len(literal_table)
+    if control_sections:
+        literals=sum(len(state['literal_table']) for state in control_sections)
+    stats.count('literals', literals)
+    stats.count('literal pool entries', pool_entries)
+    if control_sections:
+        stats.count('control sections', len(control_sections))
+
+#********************************************************************
+#*** FUNCTION : assemble_job                                        ***
+#********************************************************************
+#*** DESCRIPTION : Batch task: assembles one file with fresh state  ***
+#***               and its own <stem>.int / <stem>.bin, so jobs in ***
+#***               the same directory never share test1.int.       ***
+#*** INPUT ARGS : source_filename (str), image (bool), int_format  ***
+#***              (str), text_int (bool), cache_dir (str or None),  ***
+#***              cache_size (int bytes), listing (str mode),       ***
+#***              relax (bool)                                      ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : (source, status, records, seconds, messages)          ***
+#********************************************************************
+def assemble_job(source_filename, image=False, int_format="text", text_int=False,
+                 cache_dir=None, cache_size=assembly_cache.DEFAULT_SIZE_LIMIT, listing="full",
+                 relax=False):
+    global intermediate_filename, binary_intermediate_filename
+    global intermediate_format, write_text_intermediate, worker_jobs, listing_mode, relax_mode
+    reset_assembler_state()
+    relax_mode=relax
+    intermediate_format=int_format
+    write_text_intermediate=int_format=="text" or text_int
+    listing_mode=listing
+    worker_jobs=1
+    stem=os.path.splitext(source_filename)[0]
+    intermediate_filename=stem+".int"
+    binary_intermediate_filename=stem+".bin"
+    started=time.perf_counter()
+    try:
+        cache=assembly_cache.AssemblyCache(cache_dir, cache_size) if cache_dir else None
+        outputs=output_filenames(source_filename, image, listing != "none")
+        messages,restored=run_assembly(source_filename, outputs, cache)
+        status="cached" if restored else "ok"
+    except Exception as e:
+        messages=[f"{type(e).__name__}: {e}"]
+        status="failed"
+    return source_filename, status, len(pass1_records), time.perf_counter()-started, messages
+
+#********************************************************************
+#*** FUNCTION : run_batch                                           ***
+#********************************************************************
+#*** DESCRIPTION : Assembles many files in a process pool and       ***
+#***               prints a summary table in input order.          ***
+#*** INPUT ARGS : source_filenames (list), jobs (int), plus the    ***
+#***              assemble_job keyword options                      ***
+#*** OUTPUT ARGS : None                                             ***
+#*** IN/OUT ARGS : None                                             ***
+#*** RETURN : list of job result tuples                             ***
+#********************************************************************
+def run_batch(source_filenames, jobs, **options):
+    started=time.perf_counter()
+    count=len(source_filenames)
+    with ProcessPoolExecutor(max_workers=max(1,jobs)) as pool:
+        results=list(pool.map(partial(assemble_job, **options), source_filenames))
+    wall=time.perf_counter()-started
+
+    width=max([len("FILE")]+[len(name) for name in source_filenames])
+    print(f"{'FILE':<{width}}  {'STATUS':<7} {'LINES':>7} {'TIME(s)':>9} {'ERRORS':>6}")
+    for name,status,records,seconds,messages in results:
+        lines=records if status!="cached" else "-"
+        print(f"{name:<{width}}  {status:<7} {lines:>7} {seconds:>9.3f} {len(messages):>6}")
+    failed=sum(1 for result in results if result[1]=="failed")
+    busy=sum(result[3] for result in results)
+    print(f"\n{count} files, {failed} failed, wall {wall:.3f} s, "
+          f"sum of job times {busy:.3f} s, {max(1,jobs)} workers")
+    for name,_,_,_,messages in results:
+        for message in messages:
+            print(f"ERROR: {name}: {message}")
+    return results
+
 #********************************************************************
 #*** FUNCTION : main                                                ***
 #********************************************************************
@@ -1043,16 +2462,97 @@ def print_pass_outputs(source_filename):
 #*** RETURN : None                                                  ***
 #********************************************************************
 def main():
-    with open("test1.int","w") as outfile:
-        outfile.write("")
-    if len(sys.argv)>1:
-        source_filename=sys.argv[1]
+    global intermediate_format, write_text_intermediate, worker_jobs, phase_stats, listing_mode
+    global relax_mode
+    parser=argparse.ArgumentParser(description="Two-pass SIC/XE assembler")
+    parser.add_argument("sources",nargs="*",metavar="source",
+                        help="assembly source file(s); several files are assembled as a batch "
+                             "(prompted for if omitted)")
+    parser.add_argument("--int-format",choices=["text","binary","memory"],default="text",
+                        help="how pass 1 hands its records to pass 2: test1.int, test1.bin, "
+                             "or in memory with no intermediate file (default: text)")
+    parser.add_argument("--text-int",action="store_true",
+                        help="with --int-format binary or memory, also write the readable test1.int")
+    parser.add_argument("--jobs",type=int,default=1,
+                        help="worker processes: with one source, for pass 1 sizing and pass 2 "
+                             "encoding; with several, for assembling files concurrently "
+                             "(default: 1, serial)")
+    parser.add_argument("--image",action="store_true",
+                        help="also write the assembled bytes as a raw memory image (<source>.img)")
+    parser.add_argument("--relax",action="store_true",
+                        help="use format 4 automatically where a format 3 instruction cannot "
+                             "reach its target (or the target is external), iterating to a "
+                             "fixed point")
+    listing_group=parser.add_mutually_exclusive_group()
+    listing_group.add_argument("--no-listing",action="store_true",
+                               help="do not write the .lst listing")
+    listing_group.add_argument("--stream-listing",action="store_true",
+                               help="write each listing line as pass 2 encodes it instead of "
+                                    "building the whole listing afterwards")
+    parser.add_argument("--no-echo",action="store_true",
+                        help="do not print the intermediate, listing and object files")
+    parser.add_argument("--no-cache",action="store_true",
+                        help="always assemble, without reading or updating the assembly cache")
+    parser.add_argument("--cache-dir",default=assembly_cache.DEFAULT_CACHE_DIR,
+                        help=f"assembly cache directory (default: {assembly_cache.DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-size",type=int,default=assembly_cache.DEFAULT_SIZE_LIMIT//(1024*1024),
+                        help="assembly cache size limit in MB; least recently used entries are "
+                             "evicted beyond it (default: %(default)s)")
+    parser.add_argument("--cache-stats",action="store_true",
+                        help="print the assembly cache hit/miss/eviction counts and size")
+    parser.add_argument("--stats",action="store_true",
+                        help="report wall and CPU time per phase and line/record counters "
+                             "(single source only)")
+    parser.add_argument("--stats-format",choices=["text","json"],default="text",
+                        help="--stats report as a table or JSON (default: text)")
+    parser.add_argument("--stats-file",
+                        help="write the --stats report to this file instead of standard output")
+    args=parser.parse_args()
+    intermediate_format=args.int_format
+    write_text_intermediate=args.int_format=="text" or args.text_int
+    worker_jobs=max(1,args.jobs)
+    relax_mode=args.relax
+    if args.no_listing:
+        listing_mode="none"
+    elif args.stream_listing:
+        listing_mode="stream"
+    cache_dir=None if args.no_cache else args.cache_dir
+    cache_size=args.cache_size*1024*1024
+
+    if len(args.sources)>1:
+        if args.stats:
+            print("--stats reports on a single source; it is not collected for batches")
+        run_batch(args.sources, worker_jobs, image=args.image, int_format=args.int_format,
+                  text_int=args.text_int, cache_dir=cache_dir, cache_size=cache_size,
+                  listing=listing_mode, relax=relax_mode)
+        cache=assembly_cache.AssemblyCache(cache_dir, cache_size) if cache_dir else None
     else:
-        source_filename=input("Enter source file name: ")
-    read_opcode_file("opcodes")
-    pass1(source_filename)
-    pass2(source_filename)
-    print_pass_outputs(source_filename)
+        if args.sources:
+            source_filename=args.sources[0]
+        else:
+            source_filename=input("Enter source file name: ")
+        outputs=output_filenames(source_filename, args.image, listing_mode != "none")
+        cache=assembly_cache.AssemblyCache(cache_dir, cache_size) if cache_dir else None
+        if args.stats:
+            phase_stats=assembly_stats.AssemblyStats()
+        messages,restored=run_assembly(source_filename, outputs, cache, worker_jobs)
+        if restored:
+            print(f"Cache hit: restored {', '.join(outputs.values())} without assembling")
+        if not args.no_echo:
+            print_pass_outputs(source_filename, show_intermediate=not restored)
+        for message in messages:
+            print(f"ERROR: {message}")
+        if phase_stats is not None:
+            if args.stats_file:
+                with open(args.stats_file,'w') as stats_file:
+                    stats_file.write(phase_stats.report(args.stats_format)+"\n")
+            else:
+                print(f"\n{phase_stats.report(args.stats_format)}")
+
+    if args.cache_stats and cache is not None:
+        stats=cache.summary()
+        print(f"\nCache: {stats['hits']} hits, {stats['misses']} misses, {stats['evictions']} evictions, "
+              f"{stats['entries']} entries, {stats['bytes']} of {stats['limit']} bytes")
 
 if __name__=="__main__":
     main()
@@ -0,0 +1,144 @@
+#********************************************************************
+#*** NAME : Ihab Theeb                                             ***
+#*** CLASS : CSc 354                                               ***
+#*** ASSIGNMENT :  Assignment 4 - Cached Opcode Table              ***
+#*** INSTRUCTOR : George Hamer                                     ***
+#********************************************************************
+#*** DESCRIPTION : Loads the opcodes file into a read-only table   ***
+#***               of OpcodeInfo entries with the opcode already   ***
+#***               converted to an int, the instruction sizes and  ***
+#***               a format 3/4 flag. The parsed table is pickled  ***
+#***               next to the opcodes file and reused until the   ***
+#***               file's mtime or size changes.                   ***
+#********************************************************************
+
+import os
+import pickle
+from collections import namedtuple
+from types import MappingProxyType
+
+# Column order of the opcodes file: mnemonic, format, opcode
+MNEMONIC_COLUMN = 0
+FORMAT_COLUMN = 1
+OPCODE_COLUMN = 2
+CACHE_SUFFIX = '.cache'
+CACHE_VERSION = 1
+
+# sizes lists every length the instruction may take; extendable is True
+# for format 3 instructions, which become format 4 with a '+' prefix
+OpcodeInfo = namedtuple('OpcodeInfo', ['mnemonic', 'opcode', 'format', 'sizes', 'extendable'])
+
+loaded_tables = {}
+
+
+#********************************************************************
+#*** FUNCTION : make_entry                                         ***
+#********************************************************************
+#*** DESCRIPTION : Builds the OpcodeInfo for one mnemonic.         ***
+#*** INPUT ARGS : mnemonic (str), opcode (int), fmt (int)          ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : OpcodeInfo                                           ***
+#********************************************************************
+def make_entry(mnemonic, opcode, fmt):
+    extendable = fmt == 3
+    sizes = (3, 4) if extendable else (fmt,)
+    return OpcodeInfo(mnemonic, opcode, fmt, sizes, extendable)
+
+
+#********************************************************************
+#*** FUNCTION : parse_opcode_file                                  ***
+#********************************************************************
+#*** DESCRIPTION : Parses the opcodes text file into a list of     ***
+#***               (mnemonic, opcode, format) tuples.              ***
+#*** INPUT ARGS : filename (str)                                   ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : list                                                 ***
+#********************************************************************
+def parse_opcode_file(filename):
+    rows = []
+    with open(filename, 'r') as file:
+        for line in file:
+            parts = line.split()
+            if len(parts) >= 3:
+                rows.append((parts[MNEMONIC_COLUMN], int(parts[OPCODE_COLUMN], 16),
+                             int(parts[FORMAT_COLUMN])))
+    return rows
+
+
+#********************************************************************
+#*** FUNCTION : read_cache                                         ***
+#********************************************************************
+#*** DESCRIPTION : Returns the cached rows if the cache file was   ***
+#***               built from the same version of the opcodes file.***
+#*** INPUT ARGS : cache_filename (str), stamp (tuple)              ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : list or None                                         ***
+#********************************************************************
+def read_cache(cache_filename, stamp):
+    try:
+        with open(cache_filename, 'rb') as file:
+            cached = pickle.load(file)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ValueError):
+        return None
+    if not isinstance(cached, dict) or cached.get('stamp') != stamp:
+        return None
+    return cached.get('rows')
+
+
+#********************************************************************
+#*** FUNCTION : write_cache                                        ***
+#********************************************************************
+#*** DESCRIPTION : Pickles the parsed rows next to the opcodes     ***
+#***               file. A read-only directory just skips caching. ***
+#*** INPUT ARGS : cache_filename (str), stamp (tuple), rows (list) ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : None                                                 ***
+#********************************************************************
+def write_cache(cache_filename, stamp, rows):
+    temp_filename = f"{cache_filename}.{os.getpid()}.tmp"
+    try:
+        with open(temp_filename, 'wb') as file:
+            pickle.dump({'stamp': stamp, 'rows': rows}, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_filename, cache_filename)
+    except OSError:
+        try:
+            os.remove(temp_filename)
+        except OSError:
+            pass
+
+
+#********************************************************************
+#*** FUNCTION : load_opcode_table                                  ***
+#********************************************************************
+#*** DESCRIPTION : Returns the read-only opcode table for a file,  ***
+#***               using the in-process copy, then the pickle      ***
+#***               cache, and parsing the text file only when both ***
+#***               are stale.                                      ***
+#*** INPUT ARGS : filename (str), use_cache (bool)                 ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : MappingProxyType of mnemonic -> OpcodeInfo           ***
+#********************************************************************
+def load_opcode_table(filename, use_cache=True):
+    status = os.stat(filename)
+    stamp = (CACHE_VERSION, status.st_mtime_ns, status.st_size)
+    key = (os.path.abspath(filename), stamp)
+    table = loaded_tables.get(key)
+    if table is not None and use_cache:
+        return table
+
+    cache_filename = filename + CACHE_SUFFIX
+    rows = read_cache(cache_filename, stamp) if use_cache else None
+    if rows is None:
+        rows = parse_opcode_file(filename)
+        if use_cache:
+            write_cache(cache_filename, stamp, rows)
+
+    table = MappingProxyType({mnemonic: make_entry(mnemonic, opcode, fmt)
+                              for mnemonic, opcode, fmt in rows})
+    loaded_tables[key] = table
+    return table
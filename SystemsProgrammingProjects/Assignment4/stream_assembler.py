@@ -0,0 +1,405 @@
+#********************************************************************
+#*** NAME : Ihab Theeb                                             ***
+#*** CLASS : CSc 354                                               ***
+#*** ASSIGNMENT :  Assignment 4 - Streaming Assembler              ***
+#*** INSTRUCTOR : George Hamer                                     ***
+#********************************************************************
+#*** DESCRIPTION : One-pass assembly from a stream of source lines ***
+#***               to object records. Each statement goes through  ***
+#***               main's pass 1 code and is encoded at once if    ***
+#***               every symbol it needs is defined; otherwise it  ***
+#***               is held back until they are (literals until     ***
+#***               their pool is placed). Line records are dropped ***
+#***               once encoded, so memory holds only the symbol   ***
+#***               and literal tables, the held lines and the M    ***
+#***               records. T records are written as their bytes   ***
+#***               become final; late lines form their own T       ***
+#***               records. The H record is written first and its  ***
+#***               length patched at the end when the output is    ***
+#***               seekable; on a pipe it goes in the trailer with ***
+#***               D, R and the sorted M records, before E.        ***
+#***               A BASE applies from where it appears. Macros    ***
+#***               are expanded on the way in.                     ***
+#***                                                               ***
+#***   python stream_assembler.py < prog.asm > prog.obj            ***
+#***   generator | python stream_assembler.py -o prog.obj          ***
+#********************************************************************
+
+import argparse
+import fcntl
+import io
+import os
+import sys
+
+import encoders
+import expressions
+import macro_processor
+import main
+import opcode_loader
+
+LITERAL_WAIT = '='
+
+
+#********************************************************************
+#*** FUNCTION : patchable                                          ***
+#********************************************************************
+#*** DESCRIPTION : True if the H record can be rewritten in place: ***
+#***               the output is seekable and not in append mode   ***
+#***               (appends would land at the end).                ***
+#*** INPUT ARGS : output (text file)                               ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : bool                                                 ***
+#********************************************************************
+def patchable(output):
+    try:
+        if not output.seekable():
+            return False
+        return not fcntl.fcntl(output.fileno(), fcntl.F_GETFL) & os.O_APPEND
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        return False
+
+
+class StreamAssembler:
+    #********************************************************************
+    #*** FUNCTION : __init__                                           ***
+    #********************************************************************
+    #*** DESCRIPTION : Starts a fresh assembly writing to output.      ***
+    #*** INPUT ARGS : output (text file), opcode_table (mapping)       ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def __init__(self, output, opcode_table):
+        main.reset_assembler_state()
+        main.use_opcode_table(opcode_table)
+        self.output = output
+        self.seekable = patchable(output)
+        self.header_offset = None
+        self.packer = main.TextRecordPacker()
+        self.late_packer = main.TextRecordPacker()
+        self.held = {}
+        self.held_literals = []
+        self.held_count = 0
+        self.peak_held = 0
+        self.mods = []
+        self.line_counter = 0
+        self.records_written = 0
+        self.done = False
+
+    #********************************************************************
+    #*** FUNCTION : feed                                               ***
+    #********************************************************************
+    #*** DESCRIPTION : Assembles one source line. Lines after END are  ***
+    #***               ignored. A CSECT is reported and ends the       ***
+    #***               assembly there.                                 ***
+    #*** INPUT ARGS : raw_line (str), line_no (int or None) its source***
+    #***              line number (default: the next one)              ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def feed(self, raw_line, line_no=None):
+        if self.done:
+            return
+        self.line_counter = self.line_counter + 1 if line_no is None else line_no
+        parsed = main.source_parser.parse(raw_line)
+        if parsed.label is None and parsed.opcode is None:
+            return
+        if parsed.opcode == 'CSECT':
+            main.diagnostics.append(f"CSECT (line {self.line_counter}) is not supported when "
+                                    f"streaming; assemble control sections with main.py")
+            self.done = True
+            self.finish()
+            return
+        equs_waiting = parsed.opcode == 'EQU' or bool(main.pending_equs)
+        self.done = main.pass1_statement(self.line_counter, parsed.label, parsed.opcode,
+                                         parsed.operand, parsed.code)
+        self.drain()
+        if equs_waiting:
+            self.release_defined()
+        elif parsed.label in self.held:
+            self.release(parsed.label)
+        if self.done:
+            self.finish()
+
+    #********************************************************************
+    #*** FUNCTION : drain                                              ***
+    #********************************************************************
+    #*** DESCRIPTION : Takes the line records pass 1 just made and     ***
+    #***               encodes or holds each one. A new literal pool   ***
+    #***               releases the lines waiting for literals.        ***
+    #*** INPUT ARGS : None                                             ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def drain(self):
+        records = list(main.pass1_records)
+        main.pass1_records.clear()
+        pool_placed = False
+        for record in records:
+            if record.opcode == '*':
+                pool_placed = True
+                self.emit(record, self.packer)
+            else:
+                self.submit(record, self.packer)
+        if pool_placed and self.held_literals:
+            waiting = self.held_literals
+            self.held_literals = []
+            self.held_count -= len(waiting)
+            for record in waiting:
+                self.submit(record, self.late_packer)
+
+    #********************************************************************
+    #*** FUNCTION : submit                                             ***
+    #********************************************************************
+    #*** DESCRIPTION : Encodes a line now or holds it on the first     ***
+    #***               thing it is still waiting for.                  ***
+    #*** INPUT ARGS : record (LineRecord), packer (TextRecordPacker)   ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def submit(self, record, packer):
+        waiting_for = self.waiting_for(record)
+        if waiting_for is None:
+            self.emit(record, packer)
+            return
+        if waiting_for == LITERAL_WAIT:
+            self.held_literals.append(record)
+        else:
+            self.held.setdefault(waiting_for, []).append(record)
+        self.held_count += 1
+        self.peak_held = max(self.peak_held, self.held_count)
+
+    #********************************************************************
+    #*** FUNCTION : waiting_for                                        ***
+    #********************************************************************
+    #*** DESCRIPTION : What a line's object code still depends on: an  ***
+    #***               undefined symbol of its operand, the BASE       ***
+    #***               symbol for a format 3 instruction that is out   ***
+    #***               of PC-relative reach, or LITERAL_WAIT for an    ***
+    #***               unplaced literal.                               ***
+    #*** INPUT ARGS : record (LineRecord)                              ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : str or None when it can be encoded now               ***
+    #********************************************************************
+    def waiting_for(self, record):
+        opcode = record.opcode
+        operand = record.operand
+        if not operand or opcode in ('*', 'BYTE'):
+            return None
+        if opcode == 'WORD':
+            expression = operand
+        else:
+            info = main.opcode_table.get(opcode.lstrip('+'))
+            if info is None or (info.format != 3 and not opcode.startswith('+')):
+                return None
+            form = encoders.parse_operand(operand)
+            if form.number is not None or form.immediate is not None:
+                return None
+            if form.target.startswith('='):
+                ref = main.literal_refs.get(record.loc_ctr)
+                if ref is not None and ref[0] == form.target and ref[1] >= len(main.literal_pools):
+                    return LITERAL_WAIT
+                if main.literal_address(form.target, record.loc_ctr) is None:
+                    return LITERAL_WAIT
+                return None
+            expression = form.target
+        try:
+            compiled = expressions.compile_expression(main.clean_operand(expression))
+        except expressions.ExpressionError:
+            return None
+        for symbol in compiled.symbols:
+            info = main.symbol_table.get(symbol)
+            if info is None or (info['address'] is None and not info.get('external')):
+                return symbol
+        if opcode == 'WORD' or opcode.startswith('+') or not isinstance(main.base_register, tuple):
+            return None
+        if main.base_address() is None:
+            address = main.resolve_target_address(form.target, record.loc_ctr)
+            if not -2048 <= address - (record.loc_ctr + 3) <= 2047:
+                return main.base_register[1]
+        return None
+
+    #********************************************************************
+    #*** FUNCTION : emit                                               ***
+    #********************************************************************
+    #*** DESCRIPTION : Encodes a line and adds its code to a T record. ***
+    #*** INPUT ARGS : record (LineRecord), packer (TextRecordPacker)   ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def emit(self, record, packer):
+        pending_base = main.base_register if isinstance(main.base_register, tuple) else None
+        if pending_base is not None:
+            main.base_register = main.base_address()
+        code = main.encode_statement(record.opcode, record.operand, record.loc_ctr)
+        if pending_base is not None and main.base_register is None:
+            main.base_register = pending_base
+        main.literal_refs.pop(record.loc_ctr, None)
+        if main.modification_records:
+            self.mods.extend(main.modification_records)
+            main.modification_records.clear()
+        if code:
+            finished = []
+            packer.add(record.loc_ctr, code, finished)
+            self.write(finished)
+
+    #********************************************************************
+    #*** FUNCTION : release                                            ***
+    #********************************************************************
+    #*** DESCRIPTION : Resubmits the lines held on a symbol.           ***
+    #*** INPUT ARGS : symbol (str)                                     ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def release(self, symbol):
+        waiting = self.held.pop(symbol, ())
+        self.held_count -= len(waiting)
+        for record in waiting:
+            self.submit(record, self.late_packer)
+
+    #********************************************************************
+    #*** FUNCTION : release_defined                                    ***
+    #********************************************************************
+    #*** DESCRIPTION : Releases every held symbol that now has a value ***
+    #***               (an EQU may define several at once).            ***
+    #*** INPUT ARGS : None                                             ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def release_defined(self):
+        for symbol in list(self.held):
+            info = main.symbol_table.get(symbol)
+            if info is not None and (info['address'] is not None or info.get('external')):
+                self.release(symbol)
+        if isinstance(main.base_register, tuple) and main.base_register[1] in self.held:
+            if main.base_address() is not None:
+                self.release(main.base_register[1])
+
+    #********************************************************************
+    #*** FUNCTION : finish                                             ***
+    #********************************************************************
+    #*** DESCRIPTION : End of source: places the last literal pool,    ***
+    #***               encodes what is still held (undefined symbols   ***
+    #***               then assemble as in pass 2), and writes the     ***
+    #***               trailer and E record.                           ***
+    #*** INPUT ARGS : None                                             ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def finish(self):
+        self.done = True
+        main.finish_pass1(self.line_counter)
+        self.drain()
+        self.release_defined()
+        leftover = self.held_literals + [record for records in self.held.values()
+                                         for record in records]
+        self.held = {}
+        self.held_literals = []
+        self.held_count = 0
+        finished = []
+        self.packer.flush(finished)
+        for record in sorted(leftover, key=lambda line: line.loc_ctr):
+            self.emit(record, self.late_packer)
+        self.late_packer.flush(finished)
+        self.write(finished)
+
+        trailer = [] if self.seekable else [main.header_record(main.program_name)]
+        trailer.extend(main.definition_records())
+        trailer.extend(main.compact_modification_records(self.mods))
+        trailer.append(f"E^{main.start_address:06X}")
+        self.write(trailer)
+        if self.header_offset is not None:
+            end = self.output.tell()
+            self.output.seek(self.header_offset)
+            self.output.write(main.header_record(main.program_name))
+            self.output.seek(end)
+        self.output.flush()
+
+    #********************************************************************
+    #*** FUNCTION : write                                              ***
+    #********************************************************************
+    #*** DESCRIPTION : Writes finished records. On seekable output the ***
+    #***               H record goes first with a placeholder length   ***
+    #***               (fixed width, patched by finish).               ***
+    #*** INPUT ARGS : records (list of str)                            ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def write(self, records):
+        if not records:
+            return
+        if self.seekable and self.header_offset is None:
+            self.header_offset = self.output.tell()
+            self.output.write(main.header_record(main.program_name) + "\n")
+        for record in records:
+            self.output.write(record + "\n")
+        self.records_written += len(records)
+
+
+#********************************************************************
+#*** FUNCTION : assemble_stream                                    ***
+#********************************************************************
+#*** DESCRIPTION : Assembles every line of source into output.     ***
+#*** INPUT ARGS : source (iterable of str), output (text file),    ***
+#***              opcode_table (mapping)                           ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : StreamAssembler (diagnostics are in main.diagnostics)***
+#********************************************************************
+def assemble_stream(source, output, opcode_table):
+    assembler = StreamAssembler(output, opcode_table)
+    macros = macro_processor.MacroProcessor(main.opcode_table, main.directives_list,
+                                            main.diagnostics)
+    for line_no, raw_line in macros.expand(source):
+        assembler.feed(raw_line, line_no)
+        if assembler.done:
+            break
+    if not assembler.done:
+        assembler.finish()
+    return assembler
+
+
+#********************************************************************
+#*** FUNCTION : run                                                ***
+#********************************************************************
+#*** DESCRIPTION : Command line driver: stdin to stdout or a file. ***
+#***               Errors go to stderr.                            ***
+#*** INPUT ARGS : None                                             ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : int exit status                                      ***
+#********************************************************************
+def run():
+    parser = argparse.ArgumentParser(description="Streaming SIC/XE assembler (stdin to object records)")
+    parser.add_argument("-o", "--output", help="object file (default: standard output)")
+    parser.add_argument("--opcodes", default="opcodes", help="opcode file (default: %(default)s)")
+    parser.add_argument("--verbose", action="store_true",
+                        help="report lines, records written and the most lines held at once")
+    args = parser.parse_args()
+
+    table = opcode_loader.load_opcode_table(args.opcodes)
+    if args.output:
+        with open(args.output, 'w') as output:
+            assembler = assemble_stream(sys.stdin, output, table)
+    else:
+        assembler = assemble_stream(sys.stdin, sys.stdout, table)
+    for message in main.diagnostics:
+        print(f"ERROR: {message}", file=sys.stderr)
+    if args.verbose:
+        print(f"{assembler.line_counter} lines, {assembler.records_written} records, "
+              f"at most {assembler.peak_held} lines held", file=sys.stderr)
+    return 1 if main.diagnostics else 0
+
+
+if __name__ == "__main__":
+    sys.exit(run())
@@ -0,0 +1,495 @@
+#********************************************************************
+#*** NAME : Ihab Theeb                                             ***
+#*** CLASS : CSc 354                                               ***
+#*** ASSIGNMENT :  Assignment 4 - Assembler Tests                  ***
+#*** INSTRUCTOR : George Hamer                                     ***
+#********************************************************************
+#*** DESCRIPTION : Regression tests. Each test assembles a small   ***
+#***               source with main.py in a scratch directory (the ***
+#***               assembler writes its outputs beside the source) ***
+#***               and checks the files it produces.               ***
+#***                                                               ***
+#***   python -m unittest test_assembler                           ***
+#********************************************************************
+
+import concurrent.futures
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+import assembler
+import assembler_client
+import assembly_cache
+import benchmark
+import binary_intermediate
+import macro_processor
+import main
+import opcode_loader
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MAIN = os.path.join(HERE, 'main.py')
+STREAM = os.path.join(HERE, 'stream_assembler.py')
+SERVER = os.path.join(HERE, 'assembler_server.py')
+
+#********************************************************************
+#*** FUNCTION : count_events                                       ***
+#********************************************************************
+#*** DESCRIPTION : Worker for the stats test: records hits with a  ***
+#***               tiny compaction threshold so appends race the   ***
+#***               rewrites of stats.log.                          ***
+#*** INPUT ARGS : directory (str), events (int)                    ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : None                                                 ***
+#********************************************************************
+def count_events(directory, events):
+    assembly_cache.STATS_COMPACT_SIZE = 64
+    cache = assembly_cache.AssemblyCache(directory)
+    for _ in range(events):
+        cache.count('hits')
+
+
+EXTDEF_BEFORE_LABELS = """\
+PROG    START   0
+        EXTDEF  ALPHA,BETA
+        EXTREF  GAMMA
+FIRST   LDA     ALPHA
+        STA     BETA
+        +JSUB   GAMMA
+        RSUB
+ALPHA   WORD    5
+BETA    RESW    1
+        END     FIRST
+"""
+
+FORWARD_REFERENCES = """\
+SUM     START   1000
+FIRST   LDX     #0
+        LDA     #0
+        +LDB    #TABLE2
+        BASE    TABLE2
+LOOP    ADD     TABLE,X
+        ADD     TABLE2,X
+        TIX     COUNT
+        JLT     LOOP
+        STA     TOTAL
+        LDA     =C'EOF'
+        LDT     =X'05'
+        RSUB
+COUNT   WORD    10
+TABLE   RESW    20
+        LTORG
+TABLE2  RESW    2000
+TOTAL   RESW    1
+        END     FIRST
+"""
+
+READ_MACRO = """\
+PROG    START   0
+RDBUFF  MACRO   &INDEV,&BUFADR
+$LOOP   TD      =X'&INDEV'
+        JEQ     $LOOP
+        STCH    &BUFADR
+        MEND
+FIRST   RDBUFF  F1,BUF
+        RDBUFF  F1,BUF
+        RDBUFF  05,BUF
+BUF     RESB    3
+        END     FIRST
+"""
+
+READ_EXPANDED = """\
+PROG    START   0
+FIRST   TD      =X'F1'
+        JEQ     FIRST
+        STCH    BUF
+SECOND  TD      =X'F1'
+        JEQ     SECOND
+        STCH    BUF
+THIRD   TD      =X'05'
+        JEQ     THIRD
+        STCH    BUF
+BUF     RESB    3
+        END     FIRST
+"""
+
+CONTROL_SECTIONS = """\
+COPY    START   0
+        EXTDEF  BUFFER,LENGTH
+        EXTREF  RDREC2
+FIRST   STL     RETADR
+        +JSUB   RDREC2
+        LDA     LENGTH
+        J       FIRST
+RETADR  RESW    1
+LENGTH  RESW    1
+BUFFER  RESB    16
+RDREC2  CSECT
+        EXTDEF  RDREC2,LOOP
+        EXTREF  BUFFER,LENGTH
+        CLEAR   X
+LOOP    +STCH   BUFFER
+        TIXR    T
+        JLT     LOOP
+        +STX    LENGTH
+        RSUB
+        END     FIRST
+"""
+
+
+#********************************************************************
+#*** FUNCTION : load_object                                        ***
+#********************************************************************
+#*** DESCRIPTION : Loads an object program the way a loader would, ***
+#***               so programs whose T records are split or ordered***
+#***               differently still compare equal.                ***
+#*** INPUT ARGS : text (str object program)                        ***
+#*** OUTPUT ARGS : None                                            ***
+#*** IN/OUT ARGS : None                                            ***
+#*** RETURN : (str H record, dict address -> byte, sorted list of  ***
+#***          M records, str E record)                             ***
+#********************************************************************
+def load_object(text):
+    header, memory, modifications, end = None, {}, [], None
+    for record in text.splitlines():
+        fields = record.split('^')
+        if fields[0] == 'H':
+            header = record
+        elif fields[0] == 'T':
+            code = ''.join(fields[3:])
+            address = int(fields[1], 16)
+            for index in range(0, len(code), 2):
+                memory[address + index // 2] = code[index:index + 2]
+        elif fields[0] == 'M':
+            modifications.append(record)
+        elif fields[0] == 'E':
+            end = record
+    return header, memory, sorted(modifications), end
+
+
+class AssemblerTestCase(unittest.TestCase):
+    #********************************************************************
+    #*** FUNCTION : setUp                                              ***
+    #********************************************************************
+    #*** DESCRIPTION : Scratch directory with a copy of the opcodes.   ***
+    #*** INPUT ARGS : None                                             ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : None                                                 ***
+    #********************************************************************
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        shutil.copy(os.path.join(HERE, 'opcodes'), self.directory)
+
+    #********************************************************************
+    #*** FUNCTION : assemble                                           ***
+    #********************************************************************
+    #*** DESCRIPTION : Runs main.py on source and returns its object   ***
+    #***               program and console output.                     ***
+    #*** INPUT ARGS : source (str), options (str command line options) ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : (str object program, str output)                     ***
+    #********************************************************************
+    def assemble(self, source, *options):
+        path = os.path.join(self.directory, 'prog.asm')
+        with open(path, 'w') as file:
+            file.write(source)
+        run = subprocess.run([sys.executable, MAIN, '--no-cache', '--no-echo', *options, 'prog.asm'],
+                             cwd=self.directory, capture_output=True, text=True)
+        with open(os.path.join(self.directory, 'prog.obj')) as file:
+            return file.read(), run.stdout + run.stderr
+
+
+class ParallelPassTest(AssemblerTestCase):
+    def test_extdef_before_labels_matches_serial(self):
+        serial, _ = self.assemble(EXTDEF_BEFORE_LABELS)
+        self.assertIn("D^ALPHA^00000D^BETA^000010\n", serial)
+        for jobs in ('2', '3'):
+            parallel, _ = self.assemble(EXTDEF_BEFORE_LABELS, '--jobs', jobs)
+            self.assertEqual(parallel, serial)
+
+    def test_control_sections_match_serial(self):
+        serial, _ = self.assemble(CONTROL_SECTIONS)
+        self.assertIn("D^BUFFER^000013^LENGTH^000010\n", serial)
+        self.assertIn("D^RDREC2^000000^LOOP^000002\n", serial)
+        for jobs in ('2', '3'):
+            parallel, _ = self.assemble(CONTROL_SECTIONS, '--jobs', jobs)
+            self.assertEqual(parallel, serial)
+
+    def test_expression_sized_reservations(self):
+        source = ("PROG  START 0\n"
+                  "N     EQU   3\n"
+                  "FIRST LDA   X\n"
+                  "X     RESW  N\n"
+                  "Y     RESB  N*2+1\n"
+                  "V     RESB  NOPE\n"
+                  "      WORD  5\n"
+                  "      END   FIRST\n")
+        serial, output = self.assemble(source)
+        self.assertIn("H^PROG^000000^000016\n", serial)
+        self.assertIn("T^000013^03^000005\n", serial)
+        self.assertIn("RESB NOPE: undefined symbol or invalid expression", output)
+        parallel, output = self.assemble(source, '--jobs', '2')
+        self.assertEqual(parallel, serial)
+        self.assertIn("RESB NOPE: undefined symbol or invalid expression", output)
+
+
+class ObjectProgramTest(AssemblerTestCase):
+    def test_modification_records_use_header_name(self):
+        program, _ = self.assemble("LONGNAME START 0\n"
+                                   "FIRST    +LDA  VALUE\n"
+                                   "VALUE    WORD  FIRST\n"
+                                   "         END   FIRST\n")
+        self.assertIn("H^LONGNA^", program)
+        self.assertIn("M^000001^05+LONGNA\n", program)
+        self.assertIn("M^000004^06+LONGNA\n", program)
+
+
+class RelaxTest(AssemblerTestCase):
+    def test_diagnostics_before_relaxation_are_kept(self):
+        source = ("PROG  START 0\n"
+                  "      MEND\n"
+                  "X     EQU   NOPE\n"
+                  "FIRST LDA   #5000\n"
+                  "      END   FIRST\n")
+        _, output = self.assemble(source, '--relax')
+        self.assertEqual(output.count("MEND without MACRO"), 1)
+        self.assertEqual(output.count("EQU X: undefined symbol(s) NOPE"), 1)
+
+    def test_relative_targets_are_not_direct(self):
+        source = ("PROG  START 0\n"
+                  "FIRST LDA   FAR\n"
+                  "      RESB  4000\n"
+                  "FAR   WORD  1\n"
+                  "ABS   EQU   100\n"
+                  "      LDA   ABS\n"
+                  "      J     FIRST\n"
+                  "      END   FIRST\n")
+        program, _ = self.assemble(source, '--relax')
+        self.assertIn("T^000000^04^03100FA4\n", program)
+        self.assertIn("^030064^3F100000\n", program)
+        self.assertIn("M^000001^05+PROG\n", program)
+        self.assertIn("M^000FAB^05+PROG\n", program)
+
+
+class MacroTest(AssemblerTestCase):
+    def test_expansion_substitutes_and_memoizes(self):
+        diagnostics = []
+        macros = macro_processor.MacroProcessor(opcode_loader.load_opcode_table(
+            os.path.join(HERE, 'opcodes')), main.directives_list, diagnostics)
+        lines = list(macros.expand(READ_MACRO.splitlines(keepends=True)))
+        self.assertEqual(diagnostics, [])
+        self.assertIn((7, "_M1_LOOP   TD      =X'F1'\n"), lines)
+        self.assertIn((8, "        JEQ     _M2_LOOP\n"), lines)
+        self.assertIn((9, "_M3_LOOP   TD      =X'05'\n"), lines)
+        self.assertEqual(sum(line.split()[-1:] == ['BUF'] for _, line in lines), 3)
+        self.assertEqual((macros.expansion_count, macros.cache_hits), (3, 1))
+
+    def test_expanded_program_matches_hand_expansion(self):
+        program, output = self.assemble(READ_MACRO)
+        self.assertNotIn("ERROR", output)
+        expected, _ = self.assemble(READ_EXPANDED)
+        self.assertEqual(program, expected)
+
+    def test_source_line_numbers_survive_expansion(self):
+        source = ("PROG    START   0\n"
+                  "INC     MACRO   &A\n"
+                  "        LDA     &A\n"
+                  "        STA     &A\n"
+                  "        MEND\n"
+                  "FIRST   INC     VAL\n"
+                  "        MEND\n"
+                  "VAL     WORD    0\n"
+                  "        END     FIRST\n")
+        _, output = self.assemble(source)
+        self.assertIn("MEND without MACRO (line 7)", output)
+        with open(os.path.join(self.directory, 'test1.int')) as file:
+            numbers = [line.split('\t')[0] for line in file if line[:4].isdigit()]
+        self.assertEqual(numbers, ['0001', '0006', '0006', '0006', '0008', '0009'])
+
+
+class BinaryIntermediateTest(AssemblerTestCase):
+    def test_reader_matches_pass1(self):
+        text_program, _ = self.assemble(FORWARD_REFERENCES)
+        program, _ = self.assemble(FORWARD_REFERENCES, '--int-format', 'binary', '--text-int')
+        self.assertEqual(program, text_program)
+        result = assembler.assemble(FORWARD_REFERENCES, os.path.join(HERE, 'opcodes'))
+        path = os.path.join(self.directory, 'test1.bin')
+        with binary_intermediate.BinaryIntermediateReader(path) as reader:
+            self.assertEqual((reader.start_address, reader.program_length),
+                             (result.start_address, 0x17D8))
+            records = [(line_no, loc_ctr, size, label, opcode, operand, source)
+                       for line_no, loc_ctr, size, _, label, opcode, operand, source
+                       in reader.records()]
+            self.assertEqual(records, [(record.line_no, record.loc_ctr, record.size, record.label,
+                                        record.opcode, record.operand, record.source)
+                                       for record in result.records])
+            self.assertEqual(reader.symbols(), result.symbol_table)
+            self.assertEqual(reader.find_symbol('LOOP'), {'address': 0x100A, 'relative': True})
+            self.assertIsNone(reader.find_symbol('NOPE'))
+            literals = reader.literals()
+            self.assertEqual(sorted(literals), ["=C'EOF'", "=X'05'"])
+            self.assertEqual(literals["=X'05'"], {'operand_value': 'X05', 'length': 1,
+                                                  'address': 0x1064})
+        with self.assertRaises(ValueError):
+            binary_intermediate.BinaryIntermediateReader(os.path.join(self.directory, 'test1.int'))
+
+
+class StreamTest(AssemblerTestCase):
+    def test_stream_loads_like_main(self):
+        program, _ = self.assemble(FORWARD_REFERENCES)
+        expected = load_object(program)
+        self.assertIn("M^001007^05+SUM", expected[2])
+        piped = subprocess.run([sys.executable, STREAM], input=FORWARD_REFERENCES,
+                               cwd=self.directory, capture_output=True, text=True)
+        self.assertEqual(piped.stderr, "")
+        self.assertEqual(load_object(piped.stdout), expected)
+        subprocess.run([sys.executable, STREAM, '-o', 'stream.obj'], input=FORWARD_REFERENCES,
+                       cwd=self.directory, capture_output=True, text=True)
+        with open(os.path.join(self.directory, 'stream.obj')) as file:
+            patched = file.read()
+        self.assertTrue(patched.startswith(expected[0] + "\n"))
+        self.assertEqual(load_object(patched), expected)
+
+
+class ServerTest(AssemblerTestCase):
+    def test_client_round_trip(self):
+        path = os.path.join(self.directory, 'server.sock')
+        server = subprocess.Popen([sys.executable, SERVER, '--socket', path],
+                                  cwd=self.directory, stderr=subprocess.DEVNULL)
+        self.addCleanup(server.wait, 10)
+        self.addCleanup(server.kill)
+        deadline = time.monotonic() + 10
+        while not os.path.exists(path):
+            self.assertLess(time.monotonic(), deadline, "server did not start")
+            time.sleep(0.05)
+
+        expected, _ = self.assemble(CONTROL_SECTIONS)
+        with assembler_client.AssemblerClient(path) as client:
+            self.assertTrue(client.request({'command': 'ping'})['ok'])
+            for _ in range(2):
+                response = client.assemble(CONTROL_SECTIONS)
+                self.assertTrue(response['ok'])
+                self.assertEqual(response['object'], expected)
+            failed = client.assemble("PROG START ZZ\n     END\n")
+            self.assertFalse(failed['ok'])
+            self.assertIn("ValueError", failed['diagnostics'][-1])
+            self.assertEqual(client.assemble(CONTROL_SECTIONS, listing=False)['listing'], None)
+            self.assertEqual(client.request({'command': 'stats'})['requests'], 4)
+            self.assertTrue(client.request({'command': 'shutdown'})['ok'])
+        self.assertEqual(server.wait(10), 0)
+        self.assertFalse(os.path.exists(path))
+
+
+class CacheTest(AssemblerTestCase):
+    #********************************************************************
+    #*** FUNCTION : run_cached                                         ***
+    #********************************************************************
+    #*** DESCRIPTION : Runs main.py with the cache in the scratch      ***
+    #***               directory and returns its console output.       ***
+    #*** INPUT ARGS : filename (str), options (str command line       ***
+    #***              options)                                         ***
+    #*** OUTPUT ARGS : None                                            ***
+    #*** IN/OUT ARGS : None                                            ***
+    #*** RETURN : str output                                           ***
+    #********************************************************************
+    def run_cached(self, filename, *options):
+        run = subprocess.run([sys.executable, MAIN, '--no-echo', *options, filename],
+                             cwd=self.directory, capture_output=True, text=True)
+        return run.stdout + run.stderr
+
+    def read(self, filename, mode='r'):
+        with open(os.path.join(self.directory, filename), mode) as file:
+            return file.read()
+
+    def test_hit_restores_intermediate_file(self):
+        for filename, source in (('one.asm', EXTDEF_BEFORE_LABELS), ('two.asm', CONTROL_SECTIONS)):
+            with open(os.path.join(self.directory, filename), 'w') as file:
+                file.write(source)
+        for suffix, options in (('.int', ()), ('.bin', ('--int-format', 'binary'))):
+            self.run_cached('one.asm', *options)
+            first = self.read('test1' + suffix, 'rb')
+            self.run_cached('two.asm', *options)
+            self.assertNotEqual(self.read('test1' + suffix, 'rb'), first)
+            output = self.run_cached('one.asm', *options)
+            self.assertIn("Cache hit", output)
+            self.assertEqual(self.read('test1' + suffix, 'rb'), first)
+
+
+    def test_hit_touches_and_eviction_drops_least_recent(self):
+        cache = assembly_cache.AssemblyCache(os.path.join(self.directory, '.asmcache'))
+        output = os.path.join(self.directory, 'out.obj')
+        for key in ('a', 'b'):
+            with open(output, 'w') as file:
+                file.write(key * 100)
+            cache.store(key, {'.obj': output}, [f"from {key}"])
+        os.utime(cache.entry_path('a'), (1000, 1000))
+        os.utime(cache.entry_path('b'), (2000, 2000))
+        entry = cache.lookup('a')
+        self.assertEqual(entry['diagnostics'], ["from a"])
+        self.assertTrue(cache.restore(entry, {'.obj': output}))
+        self.assertEqual(self.read('out.obj'), 'a' * 100)
+        self.assertFalse(cache.restore(entry, {'.obj': output, '.lst': output}))
+
+        cache.size_limit = sum(size for _, size, _ in cache.entries()) + 10
+        with open(output, 'w') as file:
+            file.write('c' * 100)
+        cache.store('c', {'.obj': output}, ["from c"])
+        self.assertIsNone(cache.lookup('b'))
+        self.assertIsNotNone(cache.lookup('a'))
+        self.assertIsNotNone(cache.lookup('c'))
+        stats = cache.summary()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions'], stats['entries']),
+                         (3, 1, 1, 2))
+
+    def test_concurrent_counts_are_not_lost(self):
+        directory = os.path.join(self.directory, '.asmcache')
+        with concurrent.futures.ProcessPoolExecutor(4) as pool:
+            for future in [pool.submit(count_events, directory, 200) for _ in range(4)]:
+                future.result()
+        stats = assembly_cache.AssemblyCache(directory).read_stats()
+        self.assertEqual(stats['hits'], 800)
+
+
+class LibraryTest(unittest.TestCase):
+    def test_relax_is_restored(self):
+        main.relax_mode = False
+        assembler.assemble(EXTDEF_BEFORE_LABELS, os.path.join(HERE, 'opcodes'), relax=True)
+        self.assertFalse(main.relax_mode)
+
+    def test_errors_become_diagnostics(self):
+        table = main.opcode_table
+        result = assembler.assemble("PROG START ZZ\n     END\n", os.path.join(HERE, 'opcodes'),
+                                    relax=True)
+        self.assertFalse(result.ok)
+        self.assertIn("ValueError", result.diagnostics[-1])
+        self.assertEqual(result.object_records, [])
+        self.assertIs(main.opcode_table, table)
+        self.assertFalse(main.relax_mode)
+
+    def test_control_sections_are_returned(self):
+        result = assembler.assemble(CONTROL_SECTIONS, os.path.join(HERE, 'opcodes'))
+        self.assertEqual([section.program_name for section in result.sections], ['COPY', 'RDREC2'])
+        copy_section, rdrec_section = result.sections
+        self.assertEqual(copy_section.program_length, 0x23)
+        self.assertEqual(rdrec_section.symbol_table['LOOP']['address'], 2)
+        self.assertNotIn('LOOP', copy_section.symbol_table)
+        self.assertIs(result.symbol_table, copy_section.symbol_table)
+
+
+class BenchmarkTest(unittest.TestCase):
+    def test_encode_mode_reports_instruction_rate(self):
+        report = benchmark.run_encode([300], 354, 2)
+        result = report['results'][0]
+        self.assertGreater(result['instructions'], 200)
+        self.assertGreater(result['instructions_per_second'], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()